@@ -1,11 +1,29 @@
 from fastapi import FastAPI, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
 import os
-from typing import Optional
+import sys
+from typing import Optional, Dict
+from collections import OrderedDict
 import asyncio
+import logging
+import re
+import time
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared.auth import (
+    IDENTITY_HEADER, IDENTITY_SECRET, IDENTITY_SIGNATURE_HEADER, decode_token, sign_identity, token_cache
+)
+from shared.http_cache import etag_matches
+from shared.media import MediaFiles
+from shared.ratelimit import RateLimit, client_ip, rate_limiter
+
+# Configuración de logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="CineMagic Gateway", version="1.0.0")
 
@@ -16,6 +34,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cursor de la siguiente página (keyset) y cabeceras de subidas reanudables (tus)
+    expose_headers=["X-Next-Cursor", "Location", "Upload-Offset", "Upload-Length", "Tus-Resumable"],
 )
 
 # Configuración de servicios (cambio con los nombres de los contenedores)
@@ -27,9 +47,290 @@ SERVICES = {
     "tickets": "http://tickets_service:8005"
 }
 
+# Configuración del pool de conexiones hacia los microservicios
+POOL_MAX_CONNECTIONS = int(os.getenv("GATEWAY_POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.getenv("GATEWAY_POOL_MAX_KEEPALIVE", "20"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("GATEWAY_POOL_KEEPALIVE_EXPIRY", "30"))
+POOL_HTTP2 = os.getenv("GATEWAY_POOL_HTTP2", "false").lower() == "true"
+UPSTREAM_TIMEOUT = float(os.getenv("GATEWAY_UPSTREAM_TIMEOUT", "30"))
+
+# Reenvío en streaming: los cuerpos pasan tal cual sin almacenarse ni re-serializarse
+STREAMING_PROXY = os.getenv("GATEWAY_STREAMING_PROXY", "true").lower() == "true"
+
+# Límites por IP de cliente para login, registro y renovación ("cantidad/segundos"; vacío o 0 desactiva)
+LOGIN_RATE_LIMIT = RateLimit.parse("gateway_login_ip", os.getenv("GATEWAY_RATE_LIMIT_LOGIN", "30/60"))
+REGISTER_RATE_LIMIT = RateLimit.parse("gateway_register_ip", os.getenv("GATEWAY_RATE_LIMIT_REGISTER", "10/3600"))
+REFRESH_RATE_LIMIT = RateLimit.parse("gateway_refresh_ip", os.getenv("GATEWAY_RATE_LIMIT_REFRESH", "60/60"))
+AUTH_RATE_LIMITS = {
+    "login": LOGIN_RATE_LIMIT,
+    "register": REGISTER_RATE_LIMIT,
+    "refresh": REFRESH_RATE_LIMIT,
+}
+
+# Cabeceras de conexión que no deben reenviarse entre saltos
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade"
+}
+
+class UpstreamPool:
+    """Cliente HTTP persistente por microservicio con métricas de uso"""
+
+    def __init__(self, name: str, base_url: str):
+        self.name = name
+        self.base_url = base_url
+        self.client: Optional[httpx.AsyncClient] = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.total_requests = 0
+        self.total_errors = 0
+        self.total_time = 0.0
+
+    def open(self):
+        """Crear el cliente con límites de conexiones y keep-alive"""
+        http2 = POOL_HTTP2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("Paquete h2 no instalado, se usará HTTP/1.1 con keep-alive")
+                http2 = False
+
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                keepalive_expiry=POOL_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(UPSTREAM_TIMEOUT, connect=5.0, pool=5.0)
+        )
+
+    async def close(self):
+        """Cerrar el cliente y sus conexiones"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _begin(self) -> float:
+        """Registrar el inicio de una petición"""
+        if self.client is None:
+            self.open()
+
+        self.in_flight += 1
+        self.total_requests += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        return time.perf_counter()
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Enviar petición usando el pool y registrar métricas"""
+        start = self._begin()
+        try:
+            return await self.client.request(method, path, **kwargs)
+        except httpx.RequestError:
+            self.total_errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.total_time += time.perf_counter() - start
+
+    async def stream(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Enviar petición sin leer el cuerpo de la respuesta
+
+        La conexión queda ocupada hasta llamar a `release` con la respuesta.
+        """
+        start = self._begin()
+        try:
+            request = self.client.build_request(method, path, **kwargs)
+            return await self.client.send(request, stream=True)
+        except Exception as e:
+            if isinstance(e, httpx.RequestError):
+                self.total_errors += 1
+            self.in_flight -= 1
+            raise
+        finally:
+            self.total_time += time.perf_counter() - start
+
+    async def release(self, response: httpx.Response):
+        """Cerrar una respuesta en streaming y devolver la conexión al pool"""
+        try:
+            await response.aclose()
+        finally:
+            self.in_flight -= 1
+
+    def connection_stats(self) -> Dict[str, int]:
+        """Conexiones abiertas y ociosas según el pool de httpcore"""
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = sum(1 for conn in connections if getattr(conn, "is_idle", lambda: False)())
+        return {"open": len(connections), "idle": idle, "active": len(connections) - idle}
+
+    def metrics(self) -> dict:
+        """Métricas de utilización del pool"""
+        return {
+            "url": self.base_url,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "total_requests": self.total_requests,
+            "total_errors": self.total_errors,
+            "avg_latency_ms": round(self.total_time / self.total_requests * 1000, 3) if self.total_requests else 0.0,
+            "connections": self.connection_stats(),
+            "max_connections": POOL_MAX_CONNECTIONS,
+            "utilization": round(self.in_flight / POOL_MAX_CONNECTIONS, 3)
+        }
+
+# Micro-caché de respuestas GET con coalescencia de peticiones concurrentes
+MICROCACHE_ENABLED = os.getenv("GATEWAY_MICROCACHE", "true").lower() == "true"
+MICROCACHE_MAX_ENTRIES = int(os.getenv("GATEWAY_MICROCACHE_MAX_ENTRIES", "1000"))
+
+class MicroCacheRoute:
+    """Ruta de un microservicio con micro-caché (ttl y ventana stale en segundos)"""
+
+    def __init__(self, service: str, pattern: str, ttl: float, stale: float):
+        self.service = service
+        self.pattern = re.compile(pattern)
+        self.ttl = ttl
+        self.stale = stale
+
+# Rutas con micro-caché (opt-in). Solo rutas públicas: la petición al
+# microservicio se hace sin Authorization ni cookies
+MICROCACHE_ROUTES = [
+    MicroCacheRoute("theaters", r"/showtimes(/\d+)?", ttl=1.0, stale=5.0),
+    MicroCacheRoute("theaters", r"/showtimes/\d+/(seats|seatmap)", ttl=0.5, stale=1.0),
+    MicroCacheRoute("movies", r"/(\d+)?", ttl=2.0, stale=10.0),
+    MicroCacheRoute("products", r"/", ttl=2.0, stale=10.0),
+]
+
+class CachedResponse:
+    """Respuesta completa de un microservicio guardada en la micro-caché"""
+
+    def __init__(self, status_code: int, headers: dict, body: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.stored_at = time.monotonic()
+
+    @property
+    def cacheable(self) -> bool:
+        cache_control = self.headers.get("cache-control", "").lower()
+        return self.status_code == 200 and "private" not in cache_control and "no-store" not in cache_control
+
+class MicroCache:
+    """Micro-caché con single-flight y stale-while-revalidate
+
+    Las peticiones idénticas que llegan mientras otra está en curso esperan
+    esa misma llamada al microservicio (coalescidas). Una entrada vencida
+    pero dentro de la ventana `stale` se sirve de inmediato y se refresca en
+    segundo plano.
+    """
+
+    def __init__(self, routes: list, max_entries: int):
+        self.routes = routes
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.coalesced = 0
+        self.forwarded = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    def route_for(self, service: str, path: str) -> Optional[MicroCacheRoute]:
+        for route in self.routes:
+            if route.service == service and route.pattern.fullmatch(path):
+                return route
+        return None
+
+    async def get(self, key: str, route: MicroCacheRoute, fetch) -> tuple:
+        """Devolver (respuesta, estado) donde estado es HIT, STALE, COALESCED o MISS"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.stored_at
+            if age < route.ttl:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry, "HIT"
+            if age < route.ttl + route.stale:
+                self.stale_hits += 1
+                if key not in self.in_flight:
+                    self.refreshes += 1
+                    self._start(key, fetch)
+                return entry, "STALE"
+
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            state = "COALESCED"
+        else:
+            task = self._start(key, fetch)
+            state = "MISS"
+        # shield: si el cliente que originó la llamada se desconecta, los demás siguen esperándola
+        return await asyncio.shield(task), state
+
+    def _start(self, key: str, fetch) -> asyncio.Task:
+        async def run():
+            self.forwarded += 1
+            try:
+                response = await fetch()
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self.in_flight.pop(key, None)
+            if response.cacheable:
+                self.entries[key] = response
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            return response
+
+        task = asyncio.create_task(run())
+        # Marcar la excepción como leída aunque nadie espere un refresco en segundo plano
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self.in_flight[key] = task
+        return task
+
+    def metrics(self) -> dict:
+        served = self.hits + self.stale_hits + self.coalesced
+        return {
+            "enabled": MICROCACHE_ENABLED,
+            "entries": len(self.entries),
+            "in_flight": len(self.in_flight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "coalesced": self.coalesced,
+            "forwarded": self.forwarded,
+            "background_refreshes": self.refreshes,
+            "errors": self.errors,
+            "served_without_upstream_call_ratio": round(served / (served + self.forwarded), 4) if served + self.forwarded else None
+        }
+
+microcache = MicroCache(MICROCACHE_ROUTES, MICROCACHE_MAX_ENTRIES)
+
+# Un pool por microservicio, vivo durante toda la vida del gateway
+upstream_pools: Dict[str, UpstreamPool] = {
+    name: UpstreamPool(name, url) for name, url in SERVICES.items()
+}
+
+@app.on_event("startup")
+async def open_upstream_pools():
+    """Abrir los pools de conexiones al iniciar el gateway"""
+    for pool in upstream_pools.values():
+        pool.open()
+    logger.info(f"Pools de conexiones abiertos para {len(upstream_pools)} servicios")
+
+@app.on_event("shutdown")
+async def close_upstream_pools():
+    """Cerrar los pools de conexiones al detener el gateway"""
+    for pool in upstream_pools.values():
+        await pool.close()
+
 # Montar archivos estáticos
 app.mount("/static", StaticFiles(directory="static"), name="static")
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Pósters y trailers: rangos para saltar en el video, ETag y caché inmutable
+app.mount("/uploads", MediaFiles(directory="uploads"), name="uploads")
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
@@ -42,70 +343,223 @@ async def health_check():
     """Verificar estado de todos los servicios"""
     health_status = {}
     
-    async with httpx.AsyncClient() as client:
-        for service_name, service_url in SERVICES.items():
-            try:
-                response = await client.get(f"{service_url}/health", timeout=5.0)
-                health_status[service_name] = {
-                    "status": "healthy" if response.status_code == 200 else "unhealthy",
-                    "url": service_url
-                }
-            except Exception as e:
-                health_status[service_name] = {
-                    "status": "unhealthy",
-                    "error": str(e),
-                    "url": service_url
-                }
+    for service_name, service_url in SERVICES.items():
+        try:
+            response = await upstream_pools[service_name].request("GET", "/health", timeout=5.0)
+            health_status[service_name] = {
+                "status": "healthy" if response.status_code == 200 else "unhealthy",
+                "url": service_url
+            }
+        except Exception as e:
+            health_status[service_name] = {
+                "status": "unhealthy",
+                "error": str(e),
+                "url": service_url
+            }
     
     return {"gateway": "healthy", "services": health_status}
 
+@app.get("/metrics/pools")
+async def pool_metrics():
+    """Métricas de utilización de los pools de conexiones"""
+    return {name: pool.metrics() for name, pool in upstream_pools.items()}
+
+@app.get("/metrics/microcache")
+async def microcache_metrics():
+    """Métricas de la micro-caché: peticiones coalescidas vs. reenviadas"""
+    return microcache.metrics()
+
+@app.get("/metrics/auth")
+async def auth_metrics():
+    """Métricas de autenticación del gateway: caché de tokens y límites de login"""
+    return {
+        "identity_headers": bool(IDENTITY_SECRET),
+        "token_cache": token_cache.metrics(),
+        "rate_limits": rate_limiter.metrics(LOGIN_RATE_LIMIT, REGISTER_RATE_LIMIT, REFRESH_RATE_LIMIT)
+    }
+
+def add_identity_headers(headers: dict):
+    """Reemplazar las cabeceras de identidad por las firmadas por el gateway
+
+    Las que manda el cliente siempre se quitan. Si el token es válido se
+    agregan las firmadas y los servicios no vuelven a decodificar el JWT;
+    si no, el servicio responde el 401 como siempre.
+    """
+    headers.pop(IDENTITY_HEADER.lower(), None)
+    headers.pop(IDENTITY_SIGNATURE_HEADER.lower(), None)
+    # Mismo criterio que HTTPBearer para obtener el token
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    if not IDENTITY_SECRET or scheme.lower() != "bearer" or not token:
+        return
+    try:
+        headers.update(sign_identity(decode_token(token), token))
+    except HTTPException:
+        pass
+
 async def forward_request(service: str, path: str, method: str, request: Request):
     """Reenviar peticiones a los microservicios"""
     if service not in SERVICES:
         raise HTTPException(status_code=404, detail="Service not found")
     
-    service_url = SERVICES[service]
-    url = f"{service_url}{path}"
+    pool = upstream_pools[service]
     
     headers = dict(request.headers)
     headers.pop("host", None)
+    # IP del cliente para los límites por IP de los microservicios
+    if request.client:
+        forwarded = headers.get("x-forwarded-for")
+        headers["x-forwarded-for"] = f"{forwarded}, {request.client.host}" if forwarded else request.client.host
+    
+    if MICROCACHE_ENABLED and method == "GET":
+        route = microcache.route_for(service, path)
+        if route is not None:
+            return await microcached_request(pool, route, service, path, request)
+    
+    add_identity_headers(headers)
+    
+    if STREAMING_PROXY:
+        return await stream_request(pool, path, method, request, headers)
     
     body = await request.body()
     
-    async with httpx.AsyncClient() as client:
+    try:
+        response = await pool.request(
+            method,
+            path,
+            headers=headers,
+            content=body,
+            params=request.query_params
+        )
+        # Si el microservicio devolvió un error lo reenviamos al cliente
+        if response.status_code >= 400:
+            raise upstream_error(response)
+
+        # Si la respuesta no tiene contenido, devolvemos la respuesta vacía
+        if response.status_code == 204:
+            return Response(status_code=204)
+
+        # 304: el cliente ya tiene la versión vigente; se reenvían los validadores
+        if response.status_code == 304:
+            return Response(status_code=304, headers=passthrough_headers(response))
+
+        # Si todo está bien, devolvemos el contenido tal cual, con ETag y Cache-Control
+        return Response(
+            content=response.content,
+            status_code=response.status_code,
+            headers=passthrough_headers(response, exclude={"content-length", "content-encoding"})
+        )
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
+
+def upstream_error(response: httpx.Response) -> HTTPException:
+    """Convertir una respuesta de error del microservicio en HTTPException"""
+    try:
+        detail = response.json()
+    except Exception:
+        detail = {"detail": response.text or "Error desconocido del servicio"}
+    return HTTPException(status_code=response.status_code, detail=detail)
+
+def passthrough_headers(response: httpx.Response, exclude: set = frozenset()) -> dict:
+    """Cabeceras de la respuesta del microservicio que se reenvían al cliente
+
+    Se conservan ETag, Cache-Control, Last-Modified, Vary, etc.; solo se
+    quitan las de conexión (hop-by-hop) y las indicadas en `exclude`.
+    """
+    return {
+        key: value for key, value in response.headers.items()
+        if key.lower() not in HOP_BY_HOP_HEADERS and key.lower() not in exclude
+    }
+
+async def microcached_request(pool: UpstreamPool, route: MicroCacheRoute, service: str, path: str, request: Request):
+    """Responder un GET desde la micro-caché o con una única llamada compartida"""
+    query = str(request.query_params)
+    key = f"{service}:{path}?{query}"
+    
+    # Petición anónima y sin validadores: el resultado se comparte entre clientes
+    upstream_headers = {
+        name: value for name, value in request.headers.items()
+        if name.lower() not in ("host", "authorization", "cookie", "if-none-match", "if-modified-since",
+                                IDENTITY_HEADER.lower(), IDENTITY_SIGNATURE_HEADER.lower())
+    }
+    
+    async def fetch() -> CachedResponse:
+        response = await pool.request("GET", path, headers=upstream_headers, params=request.query_params)
+        return CachedResponse(
+            response.status_code,
+            passthrough_headers(response, exclude={"content-length", "content-encoding"}),
+            response.content
+        )
+    
+    try:
+        cached, state = await microcache.get(key, route, fetch)
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
+    
+    if cached.status_code >= 400:
+        raise upstream_error(httpx.Response(cached.status_code, content=cached.body))
+    
+    headers = dict(cached.headers)
+    headers["X-Cache"] = state
+    headers["Age"] = str(int(time.monotonic() - cached.stored_at))
+    
+    if_none_match = request.headers.get("if-none-match")
+    etag = cached.headers.get("etag")
+    if if_none_match and etag and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={
+            name: value for name, value in headers.items()
+            if name.lower() in ("etag", "cache-control", "x-cache", "age")
+        })
+    
+    return Response(content=cached.body, status_code=cached.status_code, headers=headers)
+
+async def stream_request(pool: UpstreamPool, path: str, method: str, request: Request, headers: dict):
+    """Reenviar petición y respuesta en streaming, sin almacenar los cuerpos"""
+    has_body = "content-length" in headers or "transfer-encoding" in headers
+    
+    try:
+        response = await pool.stream(
+            method,
+            path,
+            headers=headers,
+            content=request.stream() if has_body else None,
+            params=request.query_params
+        )
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
+    
+    # Los errores son pequeños: se leen completos para mantener el mismo formato
+    if response.status_code >= 400:
         try:
-            response = await client.request(
-                method=method,
-                url=url,
-                headers=headers,
-                content=body,
-                params=request.query_params,
-                timeout=30.0
-            )
-            # Si el microservicio devolvió un error lo reenviamos al cliente
-            if response.status_code >= 400:
-                try:
-                    detail = response.json()
-                except Exception:
-                    detail = {"detail": response.text or "Error desconocido del servicio"}
-                raise HTTPException(status_code=response.status_code, detail=detail)
-
-            # Si la respuesta no tiene contenido, devolvemos la respuesta vacía
-            if response.status_code == 204:
-                return Response(status_code=204)
-
-            # Si todo está bien, devolvemos el contenido
-            return response.json() if response.headers.get("content-type", "").startswith("application/json") else response.text
-        except httpx.RequestError as e:
-            raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
+            await response.aread()
+        finally:
+            await pool.release(response)
+        raise upstream_error(response)
+    
+    if response.status_code == 204:
+        await pool.release(response)
+        return Response(status_code=204)
+    
+    if response.status_code == 304:
+        await pool.release(response)
+        return Response(status_code=304, headers=passthrough_headers(response))
+    
+    return StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        headers=passthrough_headers(response),
+        background=BackgroundTask(pool.release, response)
+    )
 
 # Rutas del servicio de autenticación
 @app.api_route("/api/auth/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
 async def auth_proxy(path: str, request: Request):
+    # Se corta aquí una ráfaga de intentos antes de ocupar conexiones del servicio y la base
+    if request.method == "POST" and path in AUTH_RATE_LIMITS:
+        await rate_limiter.enforce(AUTH_RATE_LIMITS[path], client_ip(request))
     return await forward_request("auth", f"/{path}", request.method, request)
 
-# Rutas del servicio de películas
-@app.api_route("/api/movies/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+# Rutas del servicio de películas (HEAD y PATCH para las subidas reanudables)
+@app.api_route("/api/movies/{path:path}", methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE"])
 async def movies_proxy(path: str, request: Request):
     return await forward_request("movies", f"/{path}", request.method, request)
 
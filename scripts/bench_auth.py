@@ -0,0 +1,119 @@
+"""Micro-benchmark de la dependencia de autenticación (shared/auth.py)
+
+Mide el costo por llamada de `verify_token` tal como lo ejecuta FastAPI
+(con una Request ASGI sintética) en tres caminos:
+
+- jwt: decodificación completa con python-jose en cada llamada (caché vacía)
+- cache: el token ya fue verificado en este proceso
+- identidad: cabeceras firmadas por el gateway (requiere AUTH_IDENTITY_SECRET).
+  Cuesta más que un acierto de caché, pero evita la primera decodificación
+  en cada proceso de cada servicio y no guarda estado.
+
+Con `--tokens` mayor que AUTH_TOKEN_CACHE_SIZE se ve el efecto de los
+desalojos de la LRU:
+
+    AUTH_IDENTITY_SECRET=bench python scripts/bench_auth.py -n 20000 --tokens 1000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from fastapi import Request
+from fastapi.security import HTTPAuthorizationCredentials
+
+from shared import auth
+
+
+def make_request(headers: dict) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers.items()],
+    })
+
+
+def make_tokens(count: int) -> list:
+    return [
+        auth.create_access_token(
+            {"sub": str(user_id), "email": f"usuario{user_id}@cine.com", "role": "cliente", "name": f"Usuario {user_id}"},
+            expires_delta=timedelta(hours=1)
+        )
+        for user_id in range(1, count + 1)
+    ]
+
+
+async def measure(calls: list, iterations: int) -> dict:
+    """Latencia por llamada en µs, en lotes de 100 llamadas"""
+    samples = []
+    done = 0
+    while done < iterations:
+        batch = min(100, iterations - done)
+        started = time.perf_counter()
+        for i in range(done, done + batch):
+            request, credentials = calls[i % len(calls)]
+            await auth.verify_token(request, credentials)
+        samples.append((time.perf_counter() - started) / batch * 1e6)
+        done += batch
+    return {
+        "mean_us": round(statistics.fmean(samples), 2),
+        "p50_us": round(statistics.median(samples), 2),
+        "calls_per_s": round(1e6 / statistics.fmean(samples)),
+    }
+
+
+async def run(iterations: int, token_count: int) -> dict:
+    tokens = make_tokens(token_count)
+    bearer = [
+        (make_request({"Authorization": f"Bearer {token}"}), HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+        for token in tokens
+    ]
+    results = {}
+
+    # Sin caché: cada llamada decodifica y verifica la firma
+    size = auth.token_cache.max_entries
+    auth.token_cache.max_entries = 0
+    results["jwt"] = await measure(bearer, iterations)
+    auth.token_cache.max_entries = size
+
+    auth.token_cache.entries.clear()
+    auth.token_cache.hits = auth.token_cache.misses = 0
+    for request, credentials in bearer:
+        await auth.verify_token(request, credentials)
+    results["cache"] = await measure(bearer, iterations)
+    results["cache"]["hit_ratio"] = auth.token_cache.metrics()["hit_ratio"]
+
+    if auth.IDENTITY_SECRET:
+        signed = []
+        for token in tokens:
+            headers = {"Authorization": f"Bearer {token}"}
+            headers.update(auth.sign_identity(auth.decode_token(token), token))
+            signed.append((make_request(headers), HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)))
+        auth.token_cache.entries.clear()
+        results["identidad"] = await measure(signed, iterations)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark de verify_token")
+    parser.add_argument("-n", "--iterations", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=100, help="Tokens distintos (usuarios)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.iterations, args.tokens))
+    if not auth.IDENTITY_SECRET:
+        print("AUTH_IDENTITY_SECRET no definido: se omite el camino de identidad firmada")
+    baseline = results["jwt"]["mean_us"]
+    for name, result in results.items():
+        speedup = baseline / result["mean_us"] if result["mean_us"] else 0.0
+        print(f"{name:>10}: " + ", ".join(f"{key}={value}" for key, value in result.items()) + f", x{speedup:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark de programación masiva de funciones
+
+Genera una grilla de N funciones (por defecto 1.000) repartidas entre las
+salas indicadas, a partir de una fecha futura y separadas 3 horas, y la
+envía a `POST /showtimes/bulk`. Reporta el tiempo total y funciones/seg.
+
+    python scripts/bench_bulk_schedule.py --token <jwt admin> --movie 1 --rooms 1 2 3
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+
+def build_grid(count: int, movie_id: int, rooms: list, start: datetime, price: float) -> list:
+    """Funciones cada 3 horas en cada sala hasta completar `count`"""
+    showtimes = []
+    slot = 0
+    while len(showtimes) < count:
+        horario = start + timedelta(hours=3 * slot)
+        for room in rooms:
+            if len(showtimes) == count:
+                break
+            showtimes.append({
+                "id_pelicula": movie_id,
+                "id_sala": room,
+                "horario": horario.isoformat(),
+                "precio": price
+            })
+        slot += 1
+    return showtimes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de programación masiva")
+    parser.add_argument("--url", default="http://localhost:8003/showtimes/bulk")
+    parser.add_argument("--token", required=True, help="JWT de un administrador")
+    parser.add_argument("-n", "--count", type=int, default=1000)
+    parser.add_argument("--movie", type=int, default=1)
+    parser.add_argument("--rooms", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--days-ahead", type=int, default=400, help="Días hacia adelante para evitar choques")
+    parser.add_argument("--price", type=float, default=80.0)
+    args = parser.parse_args()
+
+    start = (datetime.now() + timedelta(days=args.days_ahead)).replace(minute=0, second=0, microsecond=0)
+    grid = build_grid(args.count, args.movie, args.rooms, start, args.price)
+
+    started = time.perf_counter()
+    response = httpx.post(
+        args.url,
+        json={"funciones": grid},
+        headers={"Authorization": f"Bearer {args.token}"},
+        timeout=300.0
+    )
+    elapsed = time.perf_counter() - started
+
+    print(f"    status: {response.status_code}")
+    if response.status_code == 200:
+        body = response.json()
+        print(f"   creadas: {body['creadas']}")
+        print(f"  asientos: {body['asientos_creados']}")
+    else:
+        print(f"     error: {response.text[:500]}")
+    print(f" elapsed_s: {elapsed:.3f}")
+    print(f"funciones/s: {len(grid) / elapsed:.1f}")
+
+
+if __name__ == "__main__":
+    main()
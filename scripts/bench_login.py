@@ -0,0 +1,121 @@
+"""Benchmark de throughput de login para ajustar el costo de scrypt
+
+Modo local (por defecto): mide el pool de shared/passwords.py con varios
+valores de `n`, lanzando verificaciones concurrentes como lo haría el
+servicio de auth, y marca cuáles alcanzan el pico de logins esperado:
+
+    python scripts/bench_login.py --costs 8192,16384,32768 --workers 4 -c 50 --peak 100
+
+Modo HTTP: logins reales contra el gateway (el usuario debe existir):
+
+    python scripts/bench_login.py --url http://localhost:8000/api/auth/login \\
+        --email admin@cinemagic.com --password admin123 -n 500 -c 50
+
+La latencia de un login incluye la espera en la cola del pool: con más
+concurrencia que hilos crece aunque el throughput se mantenga.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+from bench_gateway import percentile
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared.passwords import PASSWORD_HASH_WORKERS, SCRYPT_P, SCRYPT_R, PasswordHasher
+
+
+async def drive(total: int, concurrency: int, login) -> tuple:
+    """Ejecutar `total` logins con `concurrency` clientes; (latencias ms, errores, segundos)"""
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in counter:
+            started = time.perf_counter()
+            try:
+                if not await login():
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def summary(latencies: list, errors: int, elapsed: float, total: int) -> dict:
+    return {
+        "logins": total,
+        "errors": errors,
+        "logins_per_s": round(total / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(statistics.median(latencies), 1) if latencies else 0.0,
+        "p99_ms": round(percentile(latencies, 99), 1),
+    }
+
+
+async def run_local(costs: list, workers: int, total: int, concurrency: int) -> dict:
+    results = {}
+    for n in costs:
+        hasher = PasswordHasher(n=n, r=SCRYPT_R, p=SCRYPT_P, workers=workers, max_queue=concurrency)
+        stored = await hasher.hash("contraseña-de-prueba")
+
+        async def login():
+            valid, _ = await hasher.verify("contraseña-de-prueba", stored)
+            return valid
+
+        latencies, errors, elapsed = await drive(total, concurrency, login)
+        hasher.shutdown()
+        results[f"n={n}"] = summary(latencies, errors, elapsed, total)
+    return results
+
+
+async def run_http(url: str, email: str, password: str, total: int, concurrency: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60.0) as client:
+        async def login():
+            response = await client.post(url, json={"correo": email, "contrasena": password})
+            return response.status_code == 200
+
+        latencies, errors, elapsed = await drive(total, concurrency, login)
+    return {url: summary(latencies, errors, elapsed, total)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de throughput de login")
+    parser.add_argument("--costs", default="8192,16384,32768", help="Valores de n de scrypt (modo local)")
+    parser.add_argument("--workers", type=int, default=PASSWORD_HASH_WORKERS, help="Hilos del pool (modo local)")
+    parser.add_argument("--url", help="Endpoint de login (modo HTTP)")
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("-n", "--logins", type=int, default=200)
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("--peak", type=float, help="Logins por segundo que se deben sostener")
+    args = parser.parse_args()
+
+    if args.url:
+        if not args.email or not args.password:
+            parser.error("--url requiere --email y --password")
+        results = asyncio.run(run_http(args.url, args.email, args.password, args.logins, args.concurrency))
+    else:
+        costs = [int(value) for value in args.costs.split(",") if value.strip()]
+        print(f"Pool de {args.workers} hilos, {os.cpu_count()} núcleos")
+        results = asyncio.run(run_local(costs, args.workers, args.logins, args.concurrency))
+
+    for name, result in results.items():
+        line = ", ".join(f"{key}={value}" for key, value in result.items())
+        if args.peak:
+            line += ", OK" if result["logins_per_s"] >= args.peak else ", insuficiente"
+        print(f"{name:>10}: {line}")
+
+
+if __name__ == "__main__":
+    main()
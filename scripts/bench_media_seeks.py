@@ -0,0 +1,82 @@
+"""Benchmark de saltos concurrentes en un trailer (peticiones Range)
+
+Simula reproductores que saltan a posiciones aleatorias del video: cada
+petición pide `--span` bytes desde un offset al azar con `Range` y se
+verifica que la respuesta sea 206 con el tamaño pedido. Reporta
+throughput, MB/s y latencias:
+
+    python scripts/bench_media_seeks.py --url http://localhost:8000/uploads/movies/trailers/<uuid>.mp4 -n 2000 -c 100
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+
+from bench_gateway import percentile
+
+
+async def run(url: str, total: int, concurrency: int, span: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30.0) as client:
+        head = await client.head(url)
+        head.raise_for_status()
+        size = int(head.headers["content-length"])
+        if head.headers.get("accept-ranges") != "bytes":
+            raise SystemExit("El servidor no anuncia Accept-Ranges: bytes")
+
+        latencies = []
+        errors = 0
+        received = 0
+        counter = iter(range(total))
+        rng = random.Random(7)
+
+        async def worker():
+            nonlocal errors, received
+            for _ in counter:
+                start = rng.randrange(0, max(1, size - span))
+                end = min(size, start + span) - 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(url, headers={"Range": f"bytes={start}-{end}"})
+                    body = await response.aread()
+                    if response.status_code != 206 or len(body) != end - start + 1:
+                        errors += 1
+                    received += len(body)
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "file_bytes": size,
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "mb_per_s": round(received / elapsed / 1e6, 1) if elapsed else 0.0,
+        "p50_ms": round(statistics.median(latencies), 2) if latencies else 0.0,
+        "p99_ms": round(percentile(latencies, 99), 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de saltos (Range) en trailers")
+    parser.add_argument("--url", required=True, help="URL del trailer en /uploads")
+    parser.add_argument("-n", "--requests", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=100)
+    parser.add_argument("--span", type=int, default=512 * 1024, help="Bytes por salto")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.requests, args.concurrency, args.span))
+    for key, value in result.items():
+        print(f"{key:>10}: {value}")
+
+
+if __name__ == "__main__":
+    main()
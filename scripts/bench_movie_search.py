@@ -0,0 +1,109 @@
+"""Benchmark de búsqueda de películas sobre un catálogo sintético
+
+Genera N películas (por defecto 100.000) con títulos en español, construye
+el índice invertido de shared/search.py y mide la latencia de consultas
+típicas (palabra completa, prefijo, con acentos, con errores). Como
+referencia mide también un recorrido completo equivalente a
+`titulo LIKE '%q%' OR director LIKE '%q%' OR genero LIKE '%q%'`.
+
+    python scripts/bench_movie_search.py -n 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared.search import SearchIndex
+
+WORDS = [
+    "corazón", "pirata", "noche", "ciudad", "sombra", "último", "camino", "río",
+    "montaña", "guerra", "amor", "secreto", "canción", "fantasma", "océano", "héroe",
+    "dragón", "jardín", "invierno", "verano", "estrella", "lágrima", "misión", "niño",
+    "ladrón", "reina", "imperio", "tormenta", "desierto", "ángel", "fuego", "silencio",
+]
+CONNECTORS = ["del", "de la", "y el", "en la", "sin", "contra el"]
+NAMES = ["Guillermo", "Alfonso", "Pedro", "Lucrecia", "Icíar", "Pablo", "Fernando", "María"]
+SURNAMES = ["del Toro", "Cuarón", "Almodóvar", "Martel", "Bollaín", "Larraín", "Meirelles", "Iñárritu"]
+GENRES = ["Drama", "Acción", "Comedia", "Terror", "Ciencia Ficción", "Animación", "Aventura", "Suspenso"]
+
+QUERIES = ["corazon", "pirata noche", "dragón", "almodovar", "ciencia ficcion", "torm", "lagrim", "fantasm", "misoin", "inarritu"]
+
+
+def synthetic_movies(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    movies = []
+    for movie_id in range(1, count + 1):
+        # Una palabra inventada por título para tener un vocabulario realista
+        invented = "".join(rng.choice("bcdfglmnprstv") + rng.choice("aeiou") for _ in range(rng.randint(2, 4)))
+        title = f"{rng.choice(WORDS).capitalize()} {rng.choice(CONNECTORS)} {invented} {rng.choice(WORDS)}"
+        if rng.random() < 0.3:
+            title += f" {rng.randint(2, 5)}"
+        movies.append({
+            "id_pelicula": movie_id,
+            "titulo": title,
+            "director": f"{rng.choice(NAMES)} {rng.choice(SURNAMES)}",
+            "genero": rng.choice(GENRES),
+        })
+    return movies
+
+
+def like_scan(movies: list, query: str, limit: int = 20) -> list:
+    """Equivalente en memoria del LIKE con comodín inicial (sin acentos ni ranking)"""
+    needle = query.lower()
+    result = []
+    for movie in movies:
+        if (needle in movie["titulo"].lower() or needle in movie["director"].lower()
+                or needle in movie["genero"].lower()):
+            result.append(movie)
+            if len(result) == limit:
+                break
+    return result
+
+
+def measure(label: str, func, queries: list, repeat: int) -> None:
+    samples = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            func(query)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{label:>12}: p50 {statistics.median(samples):8.3f} ms   p99 {p99:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda de películas")
+    parser.add_argument("-n", "--count", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    movies = synthetic_movies(args.count)
+
+    start = time.perf_counter()
+    index = SearchIndex("id_pelicula")
+    index.build(movies)
+    print(f"   películas: {len(index)}")
+    print(f" vocabulario: {len(index.vocabulary)} términos")
+    print(f"  construcción: {time.perf_counter() - start:.2f} s")
+
+    start = time.perf_counter()
+    for movie_id in range(1, 1001):
+        movie = dict(movies[movie_id - 1], titulo=f"Remasterizada {movies[movie_id - 1]['titulo']}")
+        index.upsert(movie)
+    print(f"  1000 upserts: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    for query in QUERIES:
+        top = index.search_documents(query, limit=1)
+        print(f"  {query!r:>18} -> {top[0]['titulo'] if top else '(sin resultados)'}")
+
+    measure("índice", lambda q: index.search(q, limit=20), QUERIES, args.repeat)
+    measure("LIKE scan", lambda q: like_scan(movies, q), QUERIES, max(1, args.repeat // 10))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Benchmark de paginación profunda: OFFSET contra cursor (keyset)
+
+Con --seed carga un usuario sintético con N boletos (por defecto 1M)
+repartidos entre unas cuantas funciones y recorre su historial como lo hace
+`GET /tickets/user/{id}`, ordenado por (horario, id de boleto) descendente:
+con `LIMIT/OFFSET` cada página arma y descarta todas las filas anteriores,
+mientras que con cursor (`(f.horario, b.id_boleto) < último`) solo se arman
+las filas de la página.
+
+    DB_HOST=localhost python scripts/bench_pagination.py --seed -n 1000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared.database import db_manager
+from shared.pagination import keyset_condition
+
+BENCH_EMAIL = "bench.paginacion@cinemagic.com"
+
+TICKETS_QUERY = """SELECT b.id_boleto, b.id_usuario, b.id_funcion, b.numero_asiento, b.precio,
+                          b.fecha_compra, b.estado, p.titulo as pelicula_titulo,
+                          s.nombre as sala_nombre, f.horario
+                   FROM boletos b
+                   JOIN funciones f ON b.id_funcion = f.id_funcion
+                   JOIN peliculas p ON f.id_pelicula = p.id_pelicula
+                   JOIN salas s ON f.id_sala = s.id_sala
+                   WHERE b.id_usuario = %s"""
+
+
+def bench_user() -> int:
+    """Id del usuario sintético (se crea si no existe)"""
+    rows = db_manager.execute_query("SELECT id_usuario FROM usuarios WHERE correo = %s", (BENCH_EMAIL,))
+    if rows:
+        return rows[0]['id_usuario']
+    return db_manager.execute_query(
+        "INSERT INTO usuarios (nombre, edad, correo, contrasena) VALUES (%s, %s, %s, %s)",
+        ("Benchmark paginación", 30, BENCH_EMAIL, "x" * 64),
+        fetch=False
+    )
+
+
+def seed(user_id: int, count: int, batch: int = 5000):
+    """Cargar `count` boletos para el usuario sintético"""
+    showtimes = [row['id_funcion'] for row in db_manager.execute_query("SELECT id_funcion FROM funciones LIMIT 50")]
+    if not showtimes:
+        raise SystemExit("No hay funciones; cree alguna o ejecute scripts/check_query_plans.py --seed")
+
+    for start in range(0, count, batch):
+        size = min(batch, count - start)
+        with db_manager.transaction() as tx:
+            tx.execute_many(
+                "INSERT INTO boletos (id_usuario, id_funcion, numero_asiento, precio) VALUES (%s, %s, %s, %s)",
+                [(user_id, showtimes[(start + i) % len(showtimes)], (start + i) % 200 + 1, 80.0) for i in range(size)]
+            )
+        if (start // batch) % 20 == 0:
+            print(f"Boletos sembrados: {start + size}/{count}")
+
+    with db_manager.transaction() as tx:
+        tx.cursor.execute("ANALYZE TABLE boletos")
+        tx.cursor.fetchall()
+
+
+def offset_page(user_id: int, page: int, limit: int) -> list:
+    return db_manager.execute_query(
+        TICKETS_QUERY + " ORDER BY f.horario DESC, b.id_boleto DESC LIMIT %s OFFSET %s",
+        (user_id, limit, page * limit)
+    )
+
+
+def keyset_page(user_id: int, after, limit: int) -> list:
+    query = TICKETS_QUERY
+    params = [user_id]
+    if after is not None:
+        condition, condition_params = keyset_condition(["f.horario", "b.id_boleto"], after, descending=True)
+        query += " AND " + condition
+        params.extend(condition_params)
+    return db_manager.execute_query(
+        query + " ORDER BY f.horario DESC, b.id_boleto DESC LIMIT %s", tuple(params) + (limit,)
+    )
+
+
+def timed(func, *args) -> tuple:
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de paginación OFFSET contra cursor")
+    parser.add_argument("--seed", action="store_true", help="Sembrar boletos sintéticos antes de medir")
+    parser.add_argument("-n", "--count", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--depths", default="0,100,1000,5000,19000",
+                        help="Páginas (separadas por coma) en las que se mide")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    user_id = bench_user()
+    if args.seed:
+        seed(user_id, args.count)
+
+    print(f"{'página':>8} {'OFFSET p50':>12} {'cursor p50':>12}")
+    for page in (int(depth) for depth in args.depths.split(",")):
+        # Cursor de la página: (horario, id) de la última fila de la página anterior
+        after = None
+        if page > 0:
+            previous = offset_page(user_id, page - 1, args.limit)
+            if not previous:
+                print(f"{page:>8} (sin datos a esta profundidad)")
+                continue
+            after = [previous[-1]['horario'], previous[-1]['id_boleto']]
+
+        offset_samples = []
+        keyset_samples = []
+        for _ in range(args.repeat):
+            by_offset, elapsed = timed(offset_page, user_id, page, args.limit)
+            offset_samples.append(elapsed)
+            by_keyset, elapsed = timed(keyset_page, user_id, after, args.limit)
+            keyset_samples.append(elapsed)
+
+        if [row['id_boleto'] for row in by_offset] != [row['id_boleto'] for row in by_keyset]:
+            raise SystemExit(f"Las páginas {page} no coinciden entre OFFSET y cursor")
+        print(f"{page:>8} {statistics.median(offset_samples):>9.1f} ms {statistics.median(keyset_samples):>9.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""Benchmark de concurrencia para el listado de funciones
+
+Lanza peticiones concurrentes a `/showtimes` del servicio de salas (por
+defecto 200 a la vez) y reporta throughput y latencias. Útil para comparar
+el acceso bloqueante a la base de datos contra el gestor asíncrono:
+
+    python scripts/bench_showtimes.py --url http://localhost:8003/showtimes -c 200
+"""
+import argparse
+import asyncio
+
+from bench_gateway import run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de concurrencia de /showtimes")
+    parser.add_argument("--url", default="http://localhost:8003/showtimes")
+    parser.add_argument("-n", "--requests", type=int, default=4000)
+    parser.add_argument("-c", "--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.requests, args.concurrency))
+    for key, value in result.items():
+        print(f"{key:>10}: {value}")
+
+
+if __name__ == "__main__":
+    main()
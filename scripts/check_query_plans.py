@@ -0,0 +1,126 @@
+"""Verificación de planes de ejecución de las queries de funciones
+
+Ejecuta EXPLAIN sobre las queries de listado/programación/asientos del
+servicio de salas y termina con código 1 si alguna recorre completa
+(type = ALL) las tablas `funciones` o `asientos`.
+
+Con --seed se carga antes un conjunto sintético (por defecto 5.000
+funciones x 200 asientos = 1M de asientos) repartido entre el último año y
+las próximas dos semanas, para que el optimizador vea datos realistas:
+
+    DB_HOST=localhost python scripts/check_query_plans.py --seed
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared.database import db_manager
+from shared.showtime_queries import showtimes_query, room_timelines_query, SCHEDULE_SQL, ROOM_TIMELINES_SQL, SEAT_MAP_SQL
+
+# Tablas que nunca deben recorrerse completas
+GUARDED_TABLES = {'f', 'a', 'funciones', 'asientos'}
+
+
+def fetch_all(query: str, params: tuple = ()) -> list:
+    """Ejecutar una sentencia que devuelve filas (EXPLAIN, ANALYZE, ...)"""
+    with db_manager.transaction() as tx:
+        tx.cursor.execute(query, params)
+        return tx.cursor.fetchall()
+
+
+def seed(showtimes: int, seats_per_showtime: int, batch: int = 500):
+    """Cargar películas, funciones y asientos sintéticos"""
+    with db_manager.transaction() as tx:
+        movie_ids = [
+            tx.execute(
+                """INSERT INTO peliculas (titulo, director, duracion, clasificacion, genero)
+                   VALUES (%s, %s, %s, %s, %s)""",
+                (f"Película plan {i}", "Director", 120, "B", "Drama")
+            )
+            for i in range(20)
+        ]
+        theater_ids = [row['id_sala'] for row in tx.execute("SELECT id_sala FROM salas")]
+
+    now = datetime.now()
+    rows = []
+    for i in range(showtimes):
+        horario = now + timedelta(minutes=random.randint(-365 * 24 * 60, 14 * 24 * 60))
+        rows.append((random.choice(movie_ids), random.choice(theater_ids), horario, 80.0, seats_per_showtime))
+
+    for start in range(0, len(rows), batch):
+        chunk = rows[start:start + batch]
+        with db_manager.transaction() as tx:
+            first_id = tx.execute(
+                f"""INSERT INTO funciones (id_pelicula, id_sala, horario, precio, asientos_disponibles)
+                    VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(chunk))}""",
+                tuple(value for row in chunk for value in row)
+            )
+            tx.execute_many(
+                "INSERT INTO asientos (id_funcion, numero_asiento) VALUES (%s, %s)",
+                [(first_id + offset, seat) for offset in range(len(chunk))
+                 for seat in range(1, seats_per_showtime + 1)]
+            )
+        print(f"Funciones sembradas: {start + len(chunk)}/{len(rows)}")
+
+    fetch_all("ANALYZE TABLE funciones, asientos")
+
+
+def plan_queries() -> dict:
+    """Las queries del servicio de salas con parámetros reales del conjunto de datos"""
+    sample = db_manager.execute_query(
+        "SELECT id_funcion, id_pelicula, id_sala, horario FROM funciones WHERE horario > NOW() LIMIT 1"
+    )
+    if not sample:
+        raise SystemExit("No hay funciones futuras; ejecute con --seed")
+    row = sample[0]
+    day_start = row['horario'].replace(hour=0, minute=0, second=0, microsecond=0)
+    day = (day_start, day_start + timedelta(days=1))
+
+    return {
+        "showtimes": showtimes_query(),
+        "showtimes_por_pelicula": showtimes_query(movie_id=row['id_pelicula'], day=day),
+        "showtimes_por_sala": showtimes_query(theater_id=row['id_sala'], day=day),
+        "showtimes_cursor": showtimes_query(after=[row['horario'], row['id_funcion']]),
+        "schedule": (SCHEDULE_SQL, day),
+        "indice_salas": (ROOM_TIMELINES_SQL, ()),
+        "indice_salas_parcial": room_timelines_query([row['id_sala']]),
+        "mapa_asientos": (SEAT_MAP_SQL, (row['id_funcion'],)),
+    }
+
+
+def check_plans() -> list:
+    """Ejecutar EXPLAIN y devolver las queries con recorridos completos"""
+    failures = []
+    for name, (query, params) in plan_queries().items():
+        plan = fetch_all("EXPLAIN " + query, params)
+        full_scans = [step for step in plan if step['type'] == 'ALL' and step['table'] in GUARDED_TABLES]
+        status = "FALLA" if full_scans else "ok"
+        keys = ", ".join(f"{step['table']}:{step['type']}:{step['key']}" for step in plan)
+        print(f"[{status}] {name}: {keys}")
+        if full_scans:
+            failures.append(name)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verificar planes de ejecución de funciones")
+    parser.add_argument("--seed", action="store_true", help="Sembrar datos sintéticos antes de verificar")
+    parser.add_argument("--showtimes", type=int, default=5000)
+    parser.add_argument("--seats", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.seed:
+        seed(args.showtimes, args.seats)
+
+    failures = check_plans()
+    if failures:
+        print(f"Queries con recorrido completo: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
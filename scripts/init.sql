@@ -40,6 +40,8 @@ CREATE TABLE IF NOT EXISTS peliculas (
     genero VARCHAR(50) NOT NULL,
     sinopsis TEXT,
     imagen_url VARCHAR(500),
+    imagen_estado ENUM('pendiente', 'listo', 'error') NULL,
+    imagen_variantes JSON NULL,
     trailer_url VARCHAR(500),
     fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -65,18 +67,33 @@ CREATE TABLE IF NOT EXISTS funciones (
     id_sala INT NOT NULL,
     horario DATETIME NOT NULL,
     precio DECIMAL(10,2) NOT NULL,
+    asientos_disponibles INT NOT NULL DEFAULT 0,
+    version_asientos INT NOT NULL DEFAULT 0,
     FOREIGN KEY (id_pelicula) REFERENCES peliculas(id_pelicula) ON DELETE CASCADE,
     FOREIGN KEY (id_sala) REFERENCES salas(id_sala)
 );
 
+-- Contadores de asientos por función repartidos en franjas (migración 0006)
+CREATE TABLE IF NOT EXISTS funciones_contadores (
+    id_funcion INT NOT NULL,
+    franja TINYINT UNSIGNED NOT NULL,
+    delta_disponibles INT NOT NULL DEFAULT 0,
+    version INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (id_funcion, franja),
+    FOREIGN KEY (id_funcion) REFERENCES funciones(id_funcion) ON DELETE CASCADE
+);
+
 -- Tabla de asientos
 CREATE TABLE IF NOT EXISTS asientos (
     id_asiento INT PRIMARY KEY AUTO_INCREMENT,
     id_funcion INT NOT NULL,
     numero_asiento INT NOT NULL,
     estado ENUM('disponible', 'ocupado', 'reservado') DEFAULT 'disponible',
+    reservado_por INT NULL,
+    reservado_hasta DATETIME NULL,
     FOREIGN KEY (id_funcion) REFERENCES funciones(id_funcion) ON DELETE CASCADE,
-    UNIQUE KEY unique_seat_per_function (id_funcion, numero_asiento)
+    UNIQUE KEY unique_seat_per_function (id_funcion, numero_asiento),
+    KEY idx_asientos_reserva (estado, reservado_hasta)
 );
 
 -- Tabla de productos
@@ -88,6 +105,8 @@ CREATE TABLE IF NOT EXISTS productos (
     categoria VARCHAR(50) NOT NULL,
     stock INT NOT NULL DEFAULT 0,
     imagen_url VARCHAR(500),
+    imagen_estado ENUM('pendiente', 'listo', 'error') NULL,
+    imagen_variantes JSON NULL,
     fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -140,8 +159,53 @@ CREATE TABLE IF NOT EXISTS devoluciones (
     FOREIGN KEY (id_boleto) REFERENCES boletos(id_boleto)
 );
 
+-- Sesiones con refresh tokens (solo el hash del token)
+CREATE TABLE IF NOT EXISTS sesiones (
+    id_sesion BIGINT PRIMARY KEY AUTO_INCREMENT,
+    id_usuario INT NOT NULL,
+    familia CHAR(32) NOT NULL,
+    token_hash BINARY(32) NOT NULL,
+    correo VARCHAR(100) NOT NULL,
+    nombre VARCHAR(100) NOT NULL,
+    rol VARCHAR(50) NOT NULL,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fecha_expiracion DATETIME NOT NULL,
+    fecha_rotacion DATETIME NULL,
+    fecha_revocacion DATETIME NULL,
+    UNIQUE KEY idx_sesiones_token (token_hash),
+    KEY idx_sesiones_familia (familia),
+    KEY idx_sesiones_usuario (id_usuario),
+    KEY idx_sesiones_expiracion (fecha_expiracion),
+    FOREIGN KEY (id_usuario) REFERENCES usuarios(id_usuario) ON DELETE CASCADE
+);
+
 -- Crear índices para mejorar rendimiento
 CREATE INDEX idx_funciones_horario ON funciones(horario);
 CREATE INDEX idx_boletos_usuario ON boletos(id_usuario);
 CREATE INDEX idx_asientos_funcion ON asientos(id_funcion);
 CREATE INDEX idx_productos_categoria ON productos(categoria);
+CREATE INDEX idx_funciones_pelicula_horario ON funciones(id_pelicula, horario);
+CREATE INDEX idx_funciones_sala_horario ON funciones(id_sala, horario);
+CREATE INDEX idx_asientos_mapa ON asientos(id_funcion, numero_asiento, estado);
+CREATE INDEX idx_boletos_usuario_estado ON boletos(id_usuario, estado);
+CREATE INDEX idx_peliculas_fecha ON peliculas(fecha_creacion);
+CREATE INDEX idx_peliculas_genero_fecha ON peliculas(genero, fecha_creacion);
+CREATE INDEX idx_productos_categoria_nombre ON productos(categoria, nombre);
+
+-- Registro de migraciones: este script ya contiene el esquema final, así que
+-- las migraciones incluidas se marcan como aplicadas (ver shared/migrations/)
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version VARCHAR(10) PRIMARY KEY,
+    nombre VARCHAR(200) NOT NULL,
+    checksum CHAR(64) NULL,
+    duracion_ms INT NULL,
+    fecha_aplicacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO schema_migrations (version, nombre) VALUES
+('0001', 'seat_state_columns'),
+('0002', 'showtime_indexes'),
+('0003', 'pagination_indexes'),
+('0004', 'image_renditions'),
+('0005', 'sessions'),
+('0006', 'seat_counter_stripes');
@@ -0,0 +1,91 @@
+"""Reprocesamiento por lotes de las imágenes de películas y productos
+
+Genera (o regenera) las variantes de shared/images.py para las imágenes
+ya existentes en uploads/: las subidas antes del pipeline, las que quedaron
+en error o todas si cambian los tamaños o formatos. Usa un pool de procesos
+con todos los núcleos disponibles y registra el resultado en la base igual
+que los servicios. Las cachés de los servicios se actualizan al vencer su
+TTL (o reiniciándolos).
+
+    python scripts/reprocess_images.py                  # sin variantes o con error
+    python scripts/reprocess_images.py --all --table peliculas
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared.database import db_manager
+from shared.images import (
+    MOVIE_IMAGE_RENDITIONS, PRODUCT_IMAGE_RENDITIONS, STATUS_READY, IMAGE_QUALITY,
+    available_formats, record_variants, render_variants, source_image_url, url_to_path
+)
+
+# tabla -> (columna id, variantes, variante cuyo JPEG queda en imagen_url)
+TARGETS = {
+    "peliculas": ("id_pelicula", MOVIE_IMAGE_RENDITIONS, "detail"),
+    "productos": ("id_producto", PRODUCT_IMAGE_RENDITIONS, "card"),
+}
+
+
+def pending_rows(table: str, include_ready: bool) -> list:
+    """Filas con imagen que necesitan variantes"""
+    id_field = TARGETS[table][0]
+    query = f"SELECT {id_field} AS id, imagen_url, imagen_variantes FROM {table} WHERE imagen_url IS NOT NULL"
+    params = ()
+    if not include_ready:
+        query += " AND (imagen_estado IS NULL OR imagen_estado <> %s)"
+        params = (STATUS_READY,)
+    return db_manager.execute_query(query, params)
+
+
+def reprocess(table: str, include_ready: bool, workers: int, formats: list) -> tuple:
+    id_field, renditions, main_rendition = TARGETS[table]
+    rows = pending_rows(table, include_ready)
+    done = failed = missing = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for row in rows:
+            source_url = source_image_url(row['imagen_url'], row['imagen_variantes'])
+            if not os.path.isfile(url_to_path(source_url)):
+                missing += 1
+                continue
+            future = executor.submit(render_variants, source_url, renditions, formats, IMAGE_QUALITY)
+            futures[future] = row
+
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                variants = future.result()
+                done += 1
+            except Exception as e:
+                print(f"  {table} {row['id']}: {e}")
+                variants = None
+                failed += 1
+            record_variants(db_manager, table, id_field, row['id'], row['imagen_url'], variants, main_rendition)
+    return len(rows), done, failed, missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprocesar imágenes existentes")
+    parser.add_argument("--table", choices=sorted(TARGETS), action="append",
+                        help="Tabla a procesar (por defecto todas)")
+    parser.add_argument("--all", action="store_true", help="Incluir las imágenes que ya tienen variantes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    formats = available_formats()
+    print(f"Formatos: {', '.join(formats)}")
+    for table in args.table or sorted(TARGETS):
+        start = time.perf_counter()
+        total, done, failed, missing = reprocess(table, args.all, args.workers, formats)
+        print(f"{table}: {done}/{total} procesadas, {failed} con error, {missing} sin archivo "
+              f"({time.perf_counter() - start:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,19 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
-from shared.database import db_manager
-from shared.models import UserCreate, UserResponse, UserLogin
+from shared.database import db_manager, async_db_manager
+from shared.migrator import run_startup_migrations
+from shared.models import UserCreate, UserResponse, UserLogin, RefreshRequest
 from shared.auth import create_access_token, verify_token, get_current_user
-import hashlib
+from shared.http_cache import ETagMiddleware, CacheRule
+from shared.passwords import PasswordHasher
+from shared.ratelimit import RateLimit, client_ip, rate_limiter
+from shared.sessions import SessionStore
 from datetime import timedelta
+import asyncio
 import logging
 
 # Configuración de logging
@@ -17,6 +22,15 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="CineMagic Auth Service", version="1.0.0")
 
+# ETag y Cache-Control por ruta; se agrega antes que CORS para que
+# también las respuestas 304 lleven las cabeceras de CORS
+app.add_middleware(
+    ETagMiddleware,
+    rules=[
+        CacheRule(r".*", "no-store"),
+    ]
+)
+
 # Configuración CORS
 app.add_middleware(
     CORSMiddleware,
@@ -26,13 +40,61 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def hash_password(password: str) -> str:
-    """Hashear contraseña usando SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
+# scrypt en un pool de hilos; los hashes SHA-256 anteriores se actualizan al iniciar sesión
+password_hasher = PasswordHasher()
+
+# Límites de intentos ("cantidad/segundos"; vacío o 0 desactiva). Por correo
+# solo cuentan los intentos fallidos: frena la fuerza bruta sobre una cuenta
+LOGIN_IP_LIMIT = RateLimit.parse("login_ip", os.getenv("RATE_LIMIT_LOGIN_IP", "30/60"))
+LOGIN_EMAIL_LIMIT = RateLimit.parse("login_correo", os.getenv("RATE_LIMIT_LOGIN_EMAIL", "10/300"))
+REGISTER_IP_LIMIT = RateLimit.parse("register_ip", os.getenv("RATE_LIMIT_REGISTER_IP", "10/3600"))
+REFRESH_IP_LIMIT = RateLimit.parse("refresh_ip", os.getenv("RATE_LIMIT_REFRESH_IP", "60/60"))
+
+# Refresh tokens: renovar el access token sin volver a pedir la contraseña
+session_store = SessionStore(db_manager)
+SESSION_PURGE_INTERVAL = int(os.getenv("SESSION_PURGE_INTERVAL", "3600"))
+
+def issue_access_token(user: dict) -> str:
+    """Access token JWT con los claims del usuario"""
+    return create_access_token(
+        data={
+            "sub": user['id_usuario'],
+            "email": user['correo'],
+            "name": user['nombre'],
+            "role": user['rol']
+        },
+        expires_delta=timedelta(minutes=30)
+    )
+
+@app.on_event("startup")
+async def apply_migrations():
+    """Aplicar migraciones de esquema pendientes (DB_AUTO_MIGRATE=true)"""
+    run_startup_migrations()
+
+@app.on_event("shutdown")
+async def stop_password_hasher():
+    password_hasher.shutdown()
+
+async def session_purger():
+    """Tarea periódica que borra las sesiones vencidas"""
+    while True:
+        try:
+            purged = await async_db_manager.run(session_store.purge_expired)
+            if purged:
+                logger.info(f"Sesiones vencidas eliminadas: {purged}")
+        except Exception as e:
+            logger.error(f"Error eliminando sesiones vencidas: {e}")
+        await asyncio.sleep(SESSION_PURGE_INTERVAL)
 
-def verify_password(password: str, hashed_password: str) -> bool:
-    """Verificar contraseña"""
-    return hash_password(password) == hashed_password
+@app.on_event("startup")
+async def start_session_purger():
+    """Iniciar la limpieza periódica de sesiones"""
+    app.state.session_purger = asyncio.create_task(session_purger())
+
+@app.on_event("shutdown")
+async def stop_session_purger():
+    """Detener la limpieza periódica de sesiones"""
+    app.state.session_purger.cancel()
 
 @app.get("/health")
 async def health_check():
@@ -45,9 +107,31 @@ async def health_check():
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
+@app.get("/metrics/db")
+async def db_pool_metrics():
+    """Pool de conexiones: en uso/ociosas e histograma de espera"""
+    return db_manager.pool_metrics()
+
+@app.get("/metrics/passwords")
+async def password_metrics():
+    """Métricas del pool de hash de contraseñas"""
+    return password_hasher.metrics()
+
+@app.get("/metrics/rate-limits")
+async def rate_limit_metrics():
+    """Métricas de los límites de login, registro y renovación"""
+    return rate_limiter.metrics(LOGIN_IP_LIMIT, LOGIN_EMAIL_LIMIT, REGISTER_IP_LIMIT, REFRESH_IP_LIMIT)
+
+@app.get("/metrics/sessions")
+async def session_metrics():
+    """Métricas de sesiones: creadas, renovadas, rechazadas y reutilizadas"""
+    return session_store.metrics()
+
 @app.post("/register", response_model=dict)
-async def register_user(user: UserCreate):
+async def register_user(user: UserCreate, request: Request):
     """Registrar nuevo usuario"""
+    await rate_limiter.enforce(REGISTER_IP_LIMIT, client_ip(request))
+    
     try:
         # Verificar si el correo ya existe
         existing_user = db_manager.execute_query(
@@ -58,8 +142,8 @@ async def register_user(user: UserCreate):
         if existing_user:
             raise HTTPException(status_code=400, detail="El correo electrónico ya está registrado")
         
-        # Hashear contraseña
-        hashed_password = hash_password(user.contrasena)
+        # Hashear contraseña (fuera del event loop)
+        hashed_password = await password_hasher.hash(user.contrasena)
         
         # Insertar usuario
         user_id = db_manager.execute_query(
@@ -74,13 +158,20 @@ async def register_user(user: UserCreate):
             "message": "Usuario registrado exitosamente",
             "user_id": user_id
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error registrando usuario: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
 @app.post("/login", response_model=dict)
-async def login_user(credentials: UserLogin):
+async def login_user(credentials: UserLogin, request: Request):
     """Iniciar sesión"""
+    # Antes de consultar la base o calcular el hash
+    email_key = credentials.correo.strip().lower()
+    await rate_limiter.enforce(LOGIN_IP_LIMIT, client_ip(request))
+    await rate_limiter.enforce(LOGIN_EMAIL_LIMIT, email_key, consume=False)
+    
     try:
         # Buscar usuario
         user_data = db_manager.execute_query(
@@ -91,26 +182,31 @@ async def login_user(credentials: UserLogin):
             (credentials.correo,)
         )
         
-        if not user_data or not verify_password(credentials.contrasena, user_data[0]['contrasena']):
+        # Si el usuario no existe también se calcula un hash (mismo tiempo de respuesta)
+        stored_hash = user_data[0]['contrasena'] if user_data else None
+        valid, new_hash = await password_hasher.verify(credentials.contrasena, stored_hash)
+        if not valid:
+            await rate_limiter.retry_after(LOGIN_EMAIL_LIMIT, email_key)
             raise HTTPException(status_code=401, detail="Credenciales incorrectas")
         
         user = user_data[0]
         
-        # Crear token JWT
-        access_token_expires = timedelta(minutes=30)
-        access_token = create_access_token(
-            data={
-                "sub": user['id_usuario'],
-                "email": user['correo'],
-                "name": user['nombre'],
-                "role": user['rol']
-            },
-            expires_delta=access_token_expires
-        )
+        if new_hash:
+            # Hash SHA-256 heredado o con otros parámetros de costo: se reemplaza
+            db_manager.execute_query(
+                "UPDATE usuarios SET contrasena = %s WHERE id_usuario = %s AND contrasena = %s",
+                (new_hash, user['id_usuario'], stored_hash),
+                fetch=False
+            )
+        
+        # Crear token JWT y abrir la sesión del refresh token
+        access_token = issue_access_token(user)
+        refresh_token = await async_db_manager.run(session_store.create, user)
         
         logger.info(f"Usuario logueado: {user['correo']}")
         return {
             "access_token": access_token,
+            "refresh_token": refresh_token,
             "token_type": "bearer",
             "user": {
                 "id_usuario": user['id_usuario'],
@@ -125,6 +221,43 @@ async def login_user(credentials: UserLogin):
         logger.exception("Error inesperado en login")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+@app.post("/refresh", response_model=dict)
+async def refresh_session(body: RefreshRequest, request: Request):
+    """Renovar el access token con un refresh token (que se rota)"""
+    await rate_limiter.enforce(REFRESH_IP_LIMIT, client_ip(request))
+    try:
+        user, refresh_token = await async_db_manager.run(session_store.rotate, body.refresh_token)
+        return {
+            "access_token": issue_access_token(user),
+            "refresh_token": refresh_token,
+            "token_type": "bearer"
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error renovando sesión: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
+@app.post("/logout")
+async def logout(body: RefreshRequest):
+    """Cerrar la sesión de un refresh token"""
+    try:
+        await async_db_manager.run(session_store.revoke, body.refresh_token)
+        return {"message": "Sesión cerrada"}
+    except Exception as e:
+        logger.error(f"Error cerrando sesión: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
+@app.post("/logout-all")
+async def logout_all(current_user: dict = Depends(get_current_user)):
+    """Cerrar todas las sesiones del usuario actual"""
+    try:
+        revoked = await async_db_manager.run(session_store.revoke_user, current_user['id_usuario'])
+        return {"message": "Sesiones cerradas", "sesiones": revoked}
+    except Exception as e:
+        logger.error(f"Error cerrando sesiones: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
 @app.get("/me", response_model=dict)
 async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     """Obtener información del usuario actual"""
@@ -194,6 +327,9 @@ async def update_user_role(user_id: int, new_role: str, current_user: dict = Dep
         if affected_rows == 0:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
         
+        # Las sesiones guardan el rol: se cierran para que el cambio aplique al renovar
+        session_store.revoke_user(user_id)
+        
         logger.info(f"Rol actualizado para usuario {user_id}: {new_role}")
         return {"message": "Rol actualizado exitosamente"}
     except Exception as e:
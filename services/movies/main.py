@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 import sys
 import os
@@ -7,11 +7,18 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 ## prueba de actualizacion de github##
 
 from shared.database import db_manager
+from shared.migrator import run_startup_migrations
 from shared.models import MovieCreate, MovieResponse
 from shared.auth import require_admin, get_current_user
-import aiofiles
+from shared.cache import response_cache, cache_key
+from shared.http_cache import ETagMiddleware, CacheRule
+from shared.search import SearchIndex
+from shared.suggest import MovieSuggester, SUGGEST_MAX_K
+from shared.pagination import decode_cursor, encode_cursor, keyset_condition, set_next_cursor, NEXT_CURSOR_HEADER
+from shared.images import ImagePipeline, MOVIE_IMAGE_RENDITIONS, STATUS_PENDING, decode_image_columns, remove_image_files
+from shared.uploads import ResumableUploads, TUS_VERSION, parse_upload_metadata, stream_upload
 import uuid
-from PIL import Image
+import asyncio
 import logging
 from typing import Optional, List
 
@@ -21,6 +28,21 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="CineMagic Movies Service", version="1.0.0")
 
+# ETag y Cache-Control por ruta; se agrega antes que CORS para que
+# también las respuestas 304 lleven las cabeceras de CORS
+app.add_middleware(
+    ETagMiddleware,
+    cache=response_cache,
+    rules=[
+        CacheRule(r"/", "public, max-age=60", tags=["peliculas:lista"]),
+        CacheRule(r"/(?P<movie_id>\d+)", "public, max-age=60", tags=["pelicula:{movie_id}"]),
+        CacheRule(r"/(search|genre)/.+", "public, max-age=60"),
+        CacheRule(r"/suggest", "public, max-age=30"),
+        CacheRule(r"/stats/genres", "public, max-age=300"),
+        CacheRule(r"/(health|metrics/.+)", "no-store"),
+    ]
+)
+
 # Configuración CORS
 app.add_middleware(
     CORSMiddleware,
@@ -35,10 +57,20 @@ UPLOAD_DIR = "uploads/movies"
 ALLOWED_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
 ALLOWED_VIDEO_EXTENSIONS = {".mp4", ".webm", ".mov"}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+# Las subidas reanudables escriben por bloques; pueden admitir trailers más grandes
+MAX_RESUMABLE_SIZE = int(os.getenv("MAX_RESUMABLE_UPLOAD_SIZE", str(MAX_FILE_SIZE)))
+
+# Tipo de archivo -> (subcarpeta, extensiones permitidas, error de formato)
+UPLOAD_KINDS = {
+    "trailer": ("trailers", ALLOWED_VIDEO_EXTENSIONS, "Formato de video no válido"),
+    "imagen": ("images", ALLOWED_IMAGE_EXTENSIONS, "Formato de imagen no válido"),
+}
 
 # Crear directorio de uploads
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+resumable_uploads = ResumableUploads(os.path.join(UPLOAD_DIR, ".resumable"), MAX_RESUMABLE_SIZE)
+
 def validate_file_extension(filename: str, allowed_extensions: set) -> bool:
     """Validar extensión de archivo"""
     return any(filename.lower().endswith(ext) for ext in allowed_extensions)
@@ -50,10 +82,7 @@ def generate_unique_filename(original_filename: str) -> str:
     return unique_name
 
 async def save_uploaded_file(file: UploadFile, subfolder: str = "") -> str:
-    """Guardar archivo subido"""
-    if file.size > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="Archivo demasiado grande")
-    
+    """Guardar archivo subido (por bloques, sin cargarlo completo en memoria)"""
     # Crear subdirectorio si es necesario
     save_dir = os.path.join(UPLOAD_DIR, subfolder) if subfolder else UPLOAD_DIR
     os.makedirs(save_dir, exist_ok=True)
@@ -63,31 +92,110 @@ async def save_uploaded_file(file: UploadFile, subfolder: str = "") -> str:
     file_path = os.path.join(save_dir, unique_filename)
     
     # Guardar archivo
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    size, sha256 = await stream_upload(file, file_path, MAX_FILE_SIZE)
+    logger.info(f"Archivo guardado: {file_path} ({size} bytes, sha256 {sha256})")
     
     # Retornar URL relativa
     return f"/uploads/movies/{subfolder}/{unique_filename}" if subfolder else f"/uploads/movies/{unique_filename}"
 
-def optimize_image(file_path: str, max_width: int = 800, quality: int = 85):
-    """Optimizar imagen"""
+async def receive_file(file: Optional[UploadFile], upload_id: Optional[str], kind: str, current_user: dict) -> Optional[str]:
+    """URL del archivo enviado en el formulario o por una subida reanudable ya completa"""
+    subfolder, allowed_extensions, format_error = UPLOAD_KINDS[kind]
+    if file:
+        if not validate_file_extension(file.filename, allowed_extensions):
+            raise HTTPException(status_code=400, detail=format_error)
+        return await save_uploaded_file(file, subfolder)
+    if upload_id:
+        return resumable_uploads.claim(upload_id, current_user['sub'], f"/uploads/movies/{subfolder}/")
+    return None
+
+MOVIE_COLUMNS = """id_pelicula, titulo, director, duracion, clasificacion, genero,
+                   sinopsis, imagen_url, imagen_estado, imagen_variantes, trailer_url, fecha_creacion"""
+
+# Variantes del póster; el JPEG de "detail" queda en imagen_url
+image_pipeline = ImagePipeline(db_manager, MOVIE_IMAGE_RENDITIONS, main_rendition="detail")
+
+async def process_movie_image(movie_id: int, source_url: str, expected_url: str):
+    """Generar las variantes del póster de una película y publicarlas"""
+    if await image_pipeline.process("peliculas", "id_pelicula", movie_id, source_url, expected_url):
+        await response_cache.invalidate("peliculas:lista", f"pelicula:{movie_id}")
+        await asyncio.to_thread(refresh_movie_index, movie_id)
+
+# Índice de búsqueda en memoria; se recarga completo cada tanto para incorporar
+# cambios hechos por otras réplicas
+movie_index = SearchIndex('id_pelicula')
+movie_index_ready = False
+movie_suggester = MovieSuggester()
+SEARCH_INDEX_REFRESH_INTERVAL = int(os.getenv("SEARCH_INDEX_REFRESH_INTERVAL", "600"))
+
+def build_movie_index():
+    """Cargar todas las películas en el índice de búsqueda"""
+    global movie_index_ready
+    movies = decode_image_columns(db_manager.execute_query(f"SELECT {MOVIE_COLUMNS} FROM peliculas"))
+    movie_index.build(movies)
+    movie_suggester.build(movies)
+    movie_index_ready = True
+    logger.info(f"Índice de búsqueda cargado: {len(movies)} películas")
+
+def refresh_movie_index(movie_id: int):
+    """Actualizar una película en el índice (o quitarla si ya no existe)"""
+    movie = decode_image_columns(db_manager.execute_query(
+        f"SELECT {MOVIE_COLUMNS} FROM peliculas WHERE id_pelicula = %s",
+        (movie_id,)
+    ))
+    if movie:
+        movie_index.upsert(movie[0])
+        movie_suggester.upsert(movie[0])
+    else:
+        movie_index.remove(movie_id)
+        movie_suggester.remove(movie_id)
+
+async def movie_index_refresher():
+    """Tarea periódica de recarga del índice de búsqueda"""
+    while True:
+        await asyncio.sleep(SEARCH_INDEX_REFRESH_INTERVAL)
+        try:
+            await asyncio.to_thread(build_movie_index)
+        except Exception as e:
+            logger.error(f"Error recargando índice de búsqueda: {e}")
+
+@app.on_event("startup")
+async def apply_migrations():
+    """Aplicar migraciones de esquema pendientes (DB_AUTO_MIGRATE=true)"""
+    run_startup_migrations()
+
+@app.on_event("startup")
+async def start_movie_index():
+    """Cargar el índice de búsqueda e iniciar su recarga periódica"""
     try:
-        with Image.open(file_path) as img:
-            # Convertir a RGB si es necesario
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-            
-            # Redimensionar si es necesario
-            if img.width > max_width:
-                ratio = max_width / img.width
-                new_height = int(img.height * ratio)
-                img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-            
-            # Guardar optimizada
-            img.save(file_path, 'JPEG', quality=quality, optimize=True)
+        build_movie_index()
     except Exception as e:
-        logger.warning(f"No se pudo optimizar imagen {file_path}: {e}")
+        logger.error(f"No se pudo cargar el índice de búsqueda, se usará LIKE: {e}")
+    app.state.movie_index_refresher = asyncio.create_task(movie_index_refresher())
+
+@app.on_event("shutdown")
+async def stop_movie_index():
+    """Detener la recarga periódica del índice de búsqueda"""
+    app.state.movie_index_refresher.cancel()
+
+@app.on_event("startup")
+async def start_image_pipeline():
+    """Iniciar el pool de imágenes y retomar las que quedaron pendientes"""
+    image_pipeline.start()
+    try:
+        pending = db_manager.execute_query(
+            "SELECT id_pelicula, imagen_url FROM peliculas WHERE imagen_estado = %s",
+            (STATUS_PENDING,)
+        )
+        for movie in pending:
+            image_pipeline.submit(process_movie_image(movie['id_pelicula'], movie['imagen_url'], movie['imagen_url']))
+    except Exception as e:
+        logger.error(f"No se pudieron retomar las imágenes pendientes: {e}")
+
+@app.on_event("shutdown")
+async def stop_image_pipeline():
+    """Detener el pool de imágenes"""
+    await image_pipeline.stop()
 
 @app.get("/health")
 async def health_check():
@@ -99,32 +207,159 @@ async def health_check():
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
+@app.get("/metrics/db")
+async def db_pool_metrics():
+    """Pool de conexiones: en uso/ociosas e histograma de espera"""
+    return db_manager.pool_metrics()
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Métricas de la caché de catálogo"""
+    return response_cache.metrics()
+
+@app.get("/metrics/images")
+async def image_metrics():
+    """Métricas del procesamiento de imágenes"""
+    return image_pipeline.metrics()
+
+def tus_headers(**headers) -> dict:
+    return {"Tus-Resumable": TUS_VERSION, "Cache-Control": "no-store", **headers}
+
+@app.post("/resumable-uploads", status_code=201)
+async def create_resumable_upload(request: Request, response: Response, current_user: dict = Depends(require_admin)):
+    """Iniciar una subida reanudable (protocolo tus, solo admin)
+
+    Cabeceras: `Upload-Length` y `Upload-Metadata` con `filename`, `tipo`
+    (trailer o imagen) y opcionalmente `sha256` para verificar el archivo.
+    Luego se envían los bytes con PATCH y al terminar el id se indica en
+    `trailer_upload` o `imagen_upload` al crear o actualizar la película.
+    """
+    try:
+        try:
+            length = int(request.headers.get("upload-length", ""))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Falta Upload-Length")
+        
+        metadata = parse_upload_metadata(request.headers.get("upload-metadata"))
+        kind = metadata.get("tipo", "trailer")
+        if kind not in UPLOAD_KINDS:
+            raise HTTPException(status_code=400, detail="Tipo de subida no válido")
+        subfolder, allowed_extensions, format_error = UPLOAD_KINDS[kind]
+        filename = metadata.get("filename", "")
+        if not validate_file_extension(filename, allowed_extensions):
+            raise HTTPException(status_code=400, detail=format_error)
+        
+        unique_filename = generate_unique_filename(filename)
+        upload_id = resumable_uploads.create(
+            length, metadata, current_user['sub'],
+            os.path.join(UPLOAD_DIR, subfolder), f"/uploads/movies/{subfolder}/{unique_filename}"
+        )
+        # Relativa: funciona igual directo al servicio y a través del gateway
+        response.headers.update(tus_headers(Location=f"resumable-uploads/{upload_id}"))
+        return {"upload_id": upload_id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error iniciando subida reanudable: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
+@app.head("/resumable-uploads/{upload_id}")
+async def resumable_upload_offset(upload_id: str, current_user: dict = Depends(require_admin)):
+    """Offset actual de una subida reanudable, para continuar tras un corte"""
+    state, offset = resumable_uploads.owned_state(upload_id, current_user['sub'])
+    return Response(status_code=200, headers=tus_headers(**{
+        "Upload-Offset": str(offset),
+        "Upload-Length": str(state["length"]),
+    }))
+
+@app.patch("/resumable-uploads/{upload_id}")
+async def append_resumable_upload(upload_id: str, request: Request, current_user: dict = Depends(require_admin)):
+    """Enviar bytes de una subida reanudable a partir de `Upload-Offset`"""
+    try:
+        if request.headers.get("content-type") != "application/offset+octet-stream":
+            raise HTTPException(status_code=415, detail="Content-Type debe ser application/offset+octet-stream")
+        try:
+            offset = int(request.headers.get("upload-offset", ""))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Falta Upload-Offset")
+        
+        resumable_uploads.owned_state(upload_id, current_user['sub'])
+        new_offset = await resumable_uploads.append(upload_id, offset, request.stream())
+        return Response(status_code=204, headers=tus_headers(**{"Upload-Offset": str(new_offset)}))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error en subida reanudable {upload_id}: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
+@app.delete("/resumable-uploads/{upload_id}", status_code=204)
+async def terminate_resumable_upload(upload_id: str, current_user: dict = Depends(require_admin)):
+    """Cancelar una subida reanudable y descartar sus datos"""
+    resumable_uploads.owned_state(upload_id, current_user['sub'])
+    resumable_uploads.terminate(upload_id)
+    return Response(status_code=204, headers=tus_headers())
+
+# Orden de los listados de películas (más recientes primero)
+MOVIE_SORT = ["fecha_creacion", "id_pelicula"]
+
+def movies_page_query(where: List[str], params: list, skip: int, limit: int, cursor: Optional[str], kind: str) -> tuple:
+    """Query de una página de películas por OFFSET o por cursor"""
+    if cursor is not None:
+        after = decode_cursor(cursor, kind, len(MOVIE_SORT))
+        if after is not None:
+            condition, condition_params = keyset_condition(MOVIE_SORT, after, descending=True)
+            where = where + [condition]
+            params = params + list(condition_params)
+        skip = 0
+    
+    query = f"SELECT {MOVIE_COLUMNS} FROM peliculas"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    query += " ORDER BY fecha_creacion DESC, id_pelicula DESC LIMIT %s OFFSET %s"
+    return query, tuple(params + [limit, skip])
+
 @app.get("/", response_model=List[MovieResponse])
-async def get_movies(skip: int = 0, limit: int = 20):
-    """Obtener lista de películas"""
+async def get_movies(response: Response, skip: int = 0, limit: int = 20, cursor: Optional[str] = None):
+    """Obtener lista de películas
+
+    Con `cursor` (vacío para la primera página) se pagina por keyset; la
+    siguiente página se indica en la cabecera X-Next-Cursor.
+    """
     try:
-        movies = db_manager.execute_query(
-            """SELECT id_pelicula, titulo, director, duracion, clasificacion, genero, 
-                      sinopsis, imagen_url, trailer_url, fecha_creacion
-               FROM peliculas 
-               ORDER BY fecha_creacion DESC 
-               LIMIT %s OFFSET %s""",
-            (limit, skip)
+        query, params = movies_page_query([], [], skip, limit, cursor, "peliculas")
+        movies = await response_cache.get_or_load(
+            cache_key("peliculas", "lista", skip if cursor is None else f"cursor={cursor}", limit),
+            lambda: decode_image_columns(db_manager.execute_query(query, params)),
+            tags=["peliculas:lista"]
         )
+        if cursor is not None:
+            set_next_cursor(response, "peliculas", movies, MOVIE_SORT, limit)
         return movies
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo películas: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+# Debe declararse antes de /{movie_id} para no tomarse como un id
+@app.get("/suggest")
+async def suggest_movies(q: str, k: int = 8):
+    """Autocompletado de títulos, directores y géneros para lo que se lleva escrito"""
+    if k < 1 or k > SUGGEST_MAX_K:
+        raise HTTPException(status_code=400, detail=f"k debe estar entre 1 y {SUGGEST_MAX_K}")
+    return movie_suggester.suggest(q, k)
+
 @app.get("/{movie_id}", response_model=MovieResponse)
 async def get_movie(movie_id: int):
     """Obtener película por ID"""
     try:
-        movie = db_manager.execute_query(
-            """SELECT id_pelicula, titulo, director, duracion, clasificacion, genero,
-                      sinopsis, imagen_url, trailer_url, fecha_creacion
-               FROM peliculas WHERE id_pelicula = %s""",
-            (movie_id,)
+        movie = await response_cache.get_or_load(
+            cache_key("pelicula", movie_id),
+            lambda: decode_image_columns(db_manager.execute_query(
+                f"SELECT {MOVIE_COLUMNS} FROM peliculas WHERE id_pelicula = %s",
+                (movie_id,)
+            )),
+            tags=[f"pelicula:{movie_id}"]
         )
         
         if not movie:
@@ -147,44 +382,42 @@ async def create_movie(
     sinopsis: Optional[str] = Form(None),
     imagen: Optional[UploadFile] = File(None),
     trailer: Optional[UploadFile] = File(None),
+    imagen_upload: Optional[str] = Form(None),
+    trailer_upload: Optional[str] = Form(None),
     current_user: dict = Depends(require_admin)
 ):
-    """Crear nueva película (solo admin)"""
+    """Crear nueva película (solo admin)
+
+    Imagen y trailer se envían en el formulario o, si son grandes, antes por
+    subida reanudable indicando aquí su id (`imagen_upload`, `trailer_upload`).
+    """
     try:
-        imagen_url = None
-        trailer_url = None
-        
-        # Procesar imagen si se proporciona
-        if imagen:
-            if not validate_file_extension(imagen.filename, ALLOWED_IMAGE_EXTENSIONS):
-                raise HTTPException(status_code=400, detail="Formato de imagen no válido")
-            
-            imagen_url = await save_uploaded_file(imagen, "images")
-            # Optimizar imagen
-            full_path = os.path.join(UPLOAD_DIR, "images", os.path.basename(imagen_url))
-            optimize_image(full_path)
+        # Guardar el original; las variantes se generan en segundo plano
+        imagen_url = await receive_file(imagen, imagen_upload, "imagen", current_user)
+        imagen_estado = STATUS_PENDING if imagen_url else None
         
         # Procesar trailer si se proporciona
-        if trailer:
-            if not validate_file_extension(trailer.filename, ALLOWED_VIDEO_EXTENSIONS):
-                raise HTTPException(status_code=400, detail="Formato de video no válido")
-            
-            trailer_url = await save_uploaded_file(trailer, "trailers")
+        trailer_url = await receive_file(trailer, trailer_upload, "trailer", current_user)
         
         # Insertar película en base de datos
         movie_id = db_manager.execute_query(
             """INSERT INTO peliculas (titulo, director, duracion, clasificacion, genero, 
-                                    sinopsis, imagen_url, trailer_url)
-               VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
-            (titulo, director, duracion, clasificacion, genero, sinopsis, imagen_url, trailer_url),
+                                    sinopsis, imagen_url, imagen_estado, trailer_url)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+            (titulo, director, duracion, clasificacion, genero, sinopsis, imagen_url, imagen_estado, trailer_url),
             fetch=False
         )
+        await response_cache.invalidate("peliculas:lista", f"pelicula:{movie_id}")
+        await asyncio.to_thread(refresh_movie_index, movie_id)
+        if imagen_url:
+            image_pipeline.submit(process_movie_image(movie_id, imagen_url, imagen_url))
         
         logger.info(f"Película creada: {titulo} (ID: {movie_id})")
         return {
             "message": "Película creada exitosamente",
             "movie_id": movie_id,
             "imagen_url": imagen_url,
+            "imagen_estado": imagen_estado,
             "trailer_url": trailer_url
         }
         
@@ -205,6 +438,8 @@ async def update_movie(
     sinopsis: Optional[str] = Form(None),
     imagen: Optional[UploadFile] = File(None),
     trailer: Optional[UploadFile] = File(None),
+    imagen_upload: Optional[str] = Form(None),
+    trailer_upload: Optional[str] = Form(None),
     current_user: dict = Depends(require_admin)
 ):
     """Actualizar película (solo admin)"""
@@ -236,33 +471,24 @@ async def update_movie(
             update_data['sinopsis'] = sinopsis
         
         # Procesar nueva imagen
-        if imagen:
-            if not validate_file_extension(imagen.filename, ALLOWED_IMAGE_EXTENSIONS):
-                raise HTTPException(status_code=400, detail="Formato de imagen no válido")
+        imagen_url = await receive_file(imagen, imagen_upload, "imagen", current_user)
+        if imagen_url:
+            # Eliminar imagen anterior y sus variantes si existen
+            remove_image_files(movie['imagen_url'], movie['imagen_variantes'])
             
-            # Eliminar imagen anterior si existe
-            if movie['imagen_url']:
-                old_image_path = os.path.join(".", movie['imagen_url'].lstrip('/'))
-                if os.path.exists(old_image_path):
-                    os.remove(old_image_path)
-            
-            imagen_url = await save_uploaded_file(imagen, "images")
-            full_path = os.path.join(UPLOAD_DIR, "images", os.path.basename(imagen_url))
-            optimize_image(full_path)
             update_data['imagen_url'] = imagen_url
+            update_data['imagen_estado'] = STATUS_PENDING
+            update_data['imagen_variantes'] = None
         
         # Procesar nuevo trailer
-        if trailer:
-            if not validate_file_extension(trailer.filename, ALLOWED_VIDEO_EXTENSIONS):
-                raise HTTPException(status_code=400, detail="Formato de video no válido")
-            
+        trailer_url = await receive_file(trailer, trailer_upload, "trailer", current_user)
+        if trailer_url:
             # Eliminar trailer anterior si existe
             if movie['trailer_url']:
                 old_trailer_path = os.path.join(".", movie['trailer_url'].lstrip('/'))
                 if os.path.exists(old_trailer_path):
                     os.remove(old_trailer_path)
             
-            trailer_url = await save_uploaded_file(trailer, "trailers")
             update_data['trailer_url'] = trailer_url
         
         # Actualizar base de datos si hay cambios
@@ -275,6 +501,11 @@ async def update_movie(
                 tuple(values),
                 fetch=False
             )
+            await response_cache.invalidate("peliculas:lista", f"pelicula:{movie_id}")
+            await asyncio.to_thread(refresh_movie_index, movie_id)
+        
+        if imagen_url:
+            image_pipeline.submit(process_movie_image(movie_id, imagen_url, imagen_url))
         
         logger.info(f"Película actualizada: {movie_id}")
         return {"message": "Película actualizada exitosamente"}
@@ -291,7 +522,7 @@ async def delete_movie(movie_id: int, current_user: dict = Depends(require_admin
     try:
         # Obtener información de la película
         movie = db_manager.execute_query(
-            "SELECT imagen_url, trailer_url FROM peliculas WHERE id_pelicula = %s",
+            "SELECT imagen_url, imagen_variantes, trailer_url FROM peliculas WHERE id_pelicula = %s",
             (movie_id,)
         )
         
@@ -300,10 +531,7 @@ async def delete_movie(movie_id: int, current_user: dict = Depends(require_admin
         
         # Eliminar archivos asociados
         movie_data = movie[0]
-        if movie_data['imagen_url']:
-            image_path = os.path.join(".", movie_data['imagen_url'].lstrip('/'))
-            if os.path.exists(image_path):
-                os.remove(image_path)
+        remove_image_files(movie_data['imagen_url'], movie_data['imagen_variantes'])
         
         if movie_data['trailer_url']:
             trailer_path = os.path.join(".", movie_data['trailer_url'].lstrip('/'))
@@ -317,6 +545,10 @@ async def delete_movie(movie_id: int, current_user: dict = Depends(require_admin
             fetch=False
         )
         
+        await response_cache.invalidate("peliculas:lista", f"pelicula:{movie_id}")
+        movie_index.remove(movie_id)
+        movie_suggester.remove(movie_id)
+        
         if affected_rows == 0:
             raise HTTPException(status_code=404, detail="Película no encontrada")
         
@@ -330,40 +562,52 @@ async def delete_movie(movie_id: int, current_user: dict = Depends(require_admin
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
 @app.get("/search/{query}")
-async def search_movies(query: str, skip: int = 0, limit: int = 20):
-    """Buscar películas por título, director o género"""
+async def search_movies(response: Response, query: str, skip: int = 0, limit: int = 20, cursor: Optional[str] = None):
+    """Buscar películas por título, director o género
+
+    Usa el índice invertido en memoria: ignora acentos y mayúsculas, acepta
+    prefijos y errores de una letra, y ordena por relevancia (BM25).
+    Con `cursor` se pagina por (relevancia, id).
+    """
     try:
+        if movie_index_ready:
+            after = decode_cursor(cursor, "busqueda", 2) if cursor is not None else None
+            ranked = movie_index.search(query, limit=limit, skip=0 if cursor is not None else skip, after=after)
+            if cursor is not None and len(ranked) == limit:
+                doc_id, score = ranked[-1]
+                response.headers[NEXT_CURSOR_HEADER] = encode_cursor("busqueda", [score, doc_id])
+            return [movie for movie in (movie_index.get(doc_id) for doc_id, _ in ranked) if movie is not None]
+        
+        # Sin índice (no se pudo cargar al arrancar): búsqueda directa en la base
         search_term = f"%{query}%"
-        movies = db_manager.execute_query(
-            """SELECT id_pelicula, titulo, director, duracion, clasificacion, genero,
-                      sinopsis, imagen_url, trailer_url, fecha_creacion
-               FROM peliculas 
-               WHERE titulo LIKE %s OR director LIKE %s OR genero LIKE %s
-               ORDER BY fecha_creacion DESC
-               LIMIT %s OFFSET %s""",
-            (search_term, search_term, search_term, limit, skip)
+        sql, params = movies_page_query(
+            ["(titulo LIKE %s OR director LIKE %s OR genero LIKE %s)"],
+            [search_term, search_term, search_term],
+            skip, limit, cursor, "busqueda_sql"
         )
+        movies = decode_image_columns(db_manager.execute_query(sql, params))
+        if cursor is not None:
+            set_next_cursor(response, "busqueda_sql", movies, MOVIE_SORT, limit)
         
         return movies
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error buscando películas: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
 @app.get("/genre/{genre}")
-async def get_movies_by_genre(genre: str, skip: int = 0, limit: int = 20):
-    """Obtener películas por género"""
+async def get_movies_by_genre(response: Response, genre: str, skip: int = 0, limit: int = 20, cursor: Optional[str] = None):
+    """Obtener películas por género (con `cursor` se pagina por keyset)"""
     try:
-        movies = db_manager.execute_query(
-            """SELECT id_pelicula, titulo, director, duracion, clasificacion, genero,
-                      sinopsis, imagen_url, trailer_url, fecha_creacion
-               FROM peliculas 
-               WHERE genero = %s
-               ORDER BY fecha_creacion DESC
-               LIMIT %s OFFSET %s""",
-            (genre, limit, skip)
-        )
+        query, params = movies_page_query(["genero = %s"], [genre], skip, limit, cursor, "genero")
+        movies = decode_image_columns(db_manager.execute_query(query, params))
+        if cursor is not None:
+            set_next_cursor(response, "genero", movies, MOVIE_SORT, limit)
         
         return movies
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo películas por género: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
@@ -1,15 +1,19 @@
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Response
 from fastapi.middleware.cors import CORSMiddleware
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from shared.database import db_manager
+from shared.migrator import run_startup_migrations
 from shared.models import ProductCreate, ProductResponse
 from shared.auth import require_admin, get_current_user
-import aiofiles
+from shared.cache import response_cache, cache_key
+from shared.http_cache import ETagMiddleware, CacheRule
+from shared.pagination import decode_cursor, keyset_condition, set_next_cursor
+from shared.images import ImagePipeline, PRODUCT_IMAGE_RENDITIONS, STATUS_PENDING, decode_image_columns, remove_image_files
+from shared.uploads import stream_upload
 import uuid
-from PIL import Image
 import logging
 from typing import Optional, List
 
@@ -19,6 +23,27 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="CineMagic Products Service", version="1.0.0")
 
+# El listado incluye el stock, que cambia con cada compra en el servicio de
+# boletos; su invalidación solo alcanza a este proceso si la caché no es
+# compartida (CACHE_BACKEND=redis), así que el listado vive poco en caché
+PRODUCTS_LIST_CACHE_TTL = int(os.getenv("PRODUCTS_LIST_CACHE_TTL", "5"))
+
+# ETag y Cache-Control por ruta; se agrega antes que CORS para que
+# también las respuestas 304 lleven las cabeceras de CORS. Las rutas con
+# stock se revalidan siempre (no-cache) y su ETag se recuerda lo mismo que
+# el listado en caché
+app.add_middleware(
+    ETagMiddleware,
+    cache=response_cache,
+    rules=[
+        CacheRule(r"/", "no-cache", tags=["productos:lista"], validator_ttl=PRODUCTS_LIST_CACHE_TTL),
+        CacheRule(r"/\d+", "no-cache"),
+        CacheRule(r"/categories/list|/combos/popular", "public, max-age=60"),
+        CacheRule(r"/sales/stats", "private, no-cache"),
+        CacheRule(r"/(health|metrics/.+)", "no-store"),
+    ]
+)
+
 # Configuración CORS
 app.add_middleware(
     CORSMiddleware,
@@ -47,40 +72,49 @@ def generate_unique_filename(original_filename: str) -> str:
     return unique_name
 
 async def save_uploaded_file(file: UploadFile) -> str:
-    """Guardar archivo subido"""
-    if file.size > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="Archivo demasiado grande")
-    
+    """Guardar archivo subido (por bloques, sin cargarlo completo en memoria)"""
     # Generar nombre único
     unique_filename = generate_unique_filename(file.filename)
     file_path = os.path.join(UPLOAD_DIR, unique_filename)
     
     # Guardar archivo
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    size, sha256 = await stream_upload(file, file_path, MAX_FILE_SIZE)
+    logger.info(f"Archivo guardado: {file_path} ({size} bytes, sha256 {sha256})")
     
     # Retornar URL relativa
     return f"/uploads/products/{unique_filename}"
 
-def optimize_image(file_path: str, max_width: int = 400, quality: int = 85):
-    """Optimizar imagen de producto"""
+# Variantes de la imagen de producto; el JPEG de "card" queda en imagen_url
+image_pipeline = ImagePipeline(db_manager, PRODUCT_IMAGE_RENDITIONS, main_rendition="card")
+
+async def process_product_image(product_id: int, source_url: str, expected_url: str):
+    """Generar las variantes de la imagen de un producto y publicarlas"""
+    if await image_pipeline.process("productos", "id_producto", product_id, source_url, expected_url):
+        await response_cache.invalidate("productos:lista")
+
+@app.on_event("startup")
+async def apply_migrations():
+    """Aplicar migraciones de esquema pendientes (DB_AUTO_MIGRATE=true)"""
+    run_startup_migrations()
+
+@app.on_event("startup")
+async def start_image_pipeline():
+    """Iniciar el pool de imágenes y retomar las que quedaron pendientes"""
+    image_pipeline.start()
     try:
-        with Image.open(file_path) as img:
-            # Convertir a RGB si es necesario
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-            
-            # Redimensionar si es necesario
-            if img.width > max_width:
-                ratio = max_width / img.width
-                new_height = int(img.height * ratio)
-                img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-            
-            # Guardar optimizada
-            img.save(file_path, 'JPEG', quality=quality, optimize=True)
+        pending = db_manager.execute_query(
+            "SELECT id_producto, imagen_url FROM productos WHERE imagen_estado = %s",
+            (STATUS_PENDING,)
+        )
+        for product in pending:
+            image_pipeline.submit(process_product_image(product['id_producto'], product['imagen_url'], product['imagen_url']))
     except Exception as e:
-        logger.warning(f"No se pudo optimizar imagen {file_path}: {e}")
+        logger.error(f"No se pudieron retomar las imágenes pendientes: {e}")
+
+@app.on_event("shutdown")
+async def stop_image_pipeline():
+    """Detener el pool de imágenes"""
+    await image_pipeline.stop()
 
 @app.get("/health")
 async def health_check():
@@ -92,18 +126,39 @@ async def health_check():
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
+@app.get("/metrics/db")
+async def db_pool_metrics():
+    """Pool de conexiones: en uso/ociosas e histograma de espera"""
+    return db_manager.pool_metrics()
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Métricas de la caché de catálogo"""
+    return response_cache.metrics()
+
+@app.get("/metrics/images")
+async def image_metrics():
+    """Métricas del procesamiento de imágenes"""
+    return image_pipeline.metrics()
+
 @app.get("/", response_model=List[ProductResponse])
 async def get_products(
+    response: Response,
     categoria: Optional[str] = None,
     disponible: bool = True,
     skip: int = 0,
-    limit: int = 50
+    limit: int = 50,
+    cursor: Optional[str] = None
 ):
-    """Obtener lista de productos"""
+    """Obtener lista de productos
+
+    Con `cursor` (vacío para la primera página) se pagina por keyset; la
+    siguiente página se indica en la cabecera X-Next-Cursor.
+    """
     try:
         base_query = """
         SELECT id_producto, nombre, descripcion, precio, categoria, stock, 
-               imagen_url, fecha_creacion
+               imagen_url, imagen_estado, imagen_variantes, fecha_creacion
         FROM productos 
         WHERE 1=1
         """
@@ -116,12 +171,29 @@ async def get_products(
         if disponible:
             base_query += " AND stock > 0"
         
-        base_query += " ORDER BY categoria, nombre LIMIT %s OFFSET %s"
+        if cursor is not None:
+            after = decode_cursor(cursor, "productos", 3)
+            if after is not None:
+                condition, condition_params = keyset_condition(["categoria", "nombre", "id_producto"], after)
+                base_query += " AND " + condition
+                params.extend(condition_params)
+            skip = 0
+        
+        base_query += " ORDER BY categoria, nombre, id_producto LIMIT %s OFFSET %s"
         params.extend([limit, skip])
         
-        products = db_manager.execute_query(base_query, tuple(params))
+        products = await response_cache.get_or_load(
+            cache_key("productos", "lista", categoria, disponible, skip if cursor is None else f"cursor={cursor}", limit),
+            lambda: decode_image_columns(db_manager.execute_query(base_query, tuple(params))),
+            tags=["productos:lista"],
+            ttl=PRODUCTS_LIST_CACHE_TTL
+        )
+        if cursor is not None:
+            set_next_cursor(response, "productos", products, ["categoria", "nombre", "id_producto"], limit)
         return products
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo productos: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
@@ -130,12 +202,12 @@ async def get_products(
 async def get_product(product_id: int):
     """Obtener producto por ID"""
     try:
-        product = db_manager.execute_query(
+        product = decode_image_columns(db_manager.execute_query(
             """SELECT id_producto, nombre, descripcion, precio, categoria, stock,
-                      imagen_url, fecha_creacion
+                      imagen_url, imagen_estado, imagen_variantes, fecha_creacion
                FROM productos WHERE id_producto = %s""",
             (product_id,)
-        )
+        ))
         
         if not product:
             raise HTTPException(status_code=404, detail="Producto no encontrado")
@@ -166,30 +238,33 @@ async def create_product(
             raise HTTPException(status_code=400, detail="El stock no puede ser negativo")
         
         imagen_url = None
+        imagen_estado = None
         
-        # Procesar imagen si se proporciona
+        # Guardar el original; las variantes se generan en segundo plano
         if imagen:
             if not validate_file_extension(imagen.filename, ALLOWED_IMAGE_EXTENSIONS):
                 raise HTTPException(status_code=400, detail="Formato de imagen no válido")
             
             imagen_url = await save_uploaded_file(imagen)
-            # Optimizar imagen
-            full_path = os.path.join(UPLOAD_DIR, os.path.basename(imagen_url))
-            optimize_image(full_path)
+            imagen_estado = STATUS_PENDING
         
         # Insertar producto en base de datos
         product_id = db_manager.execute_query(
-            """INSERT INTO productos (nombre, descripcion, precio, categoria, stock, imagen_url)
-               VALUES (%s, %s, %s, %s, %s, %s)""",
-            (nombre, descripcion, precio, categoria, stock, imagen_url),
+            """INSERT INTO productos (nombre, descripcion, precio, categoria, stock, imagen_url, imagen_estado)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            (nombre, descripcion, precio, categoria, stock, imagen_url, imagen_estado),
             fetch=False
         )
+        await response_cache.invalidate("productos:lista")
+        if imagen_url:
+            image_pipeline.submit(process_product_image(product_id, imagen_url, imagen_url))
         
         logger.info(f"Producto creado: {nombre} (ID: {product_id})")
         return {
             "message": "Producto creado exitosamente",
             "product_id": product_id,
-            "imagen_url": imagen_url
+            "imagen_url": imagen_url,
+            "imagen_estado": imagen_estado
         }
         
     except HTTPException:
@@ -244,16 +319,13 @@ async def update_product(
             if not validate_file_extension(imagen.filename, ALLOWED_IMAGE_EXTENSIONS):
                 raise HTTPException(status_code=400, detail="Formato de imagen no válido")
             
-            # Eliminar imagen anterior si existe
-            if product['imagen_url']:
-                old_image_path = os.path.join(".", product['imagen_url'].lstrip('/'))
-                if os.path.exists(old_image_path):
-                    os.remove(old_image_path)
+            # Eliminar imagen anterior y sus variantes si existen
+            remove_image_files(product['imagen_url'], product['imagen_variantes'])
             
             imagen_url = await save_uploaded_file(imagen)
-            full_path = os.path.join(UPLOAD_DIR, os.path.basename(imagen_url))
-            optimize_image(full_path)
             update_data['imagen_url'] = imagen_url
+            update_data['imagen_estado'] = STATUS_PENDING
+            update_data['imagen_variantes'] = None
         
         # Actualizar base de datos si hay cambios
         if update_data:
@@ -265,6 +337,10 @@ async def update_product(
                 tuple(values),
                 fetch=False
             )
+            await response_cache.invalidate("productos:lista")
+        
+        if imagen:
+            image_pipeline.submit(process_product_image(product_id, update_data['imagen_url'], update_data['imagen_url']))
         
         logger.info(f"Producto actualizado: {product_id}")
         return {"message": "Producto actualizado exitosamente"}
@@ -281,19 +357,16 @@ async def delete_product(product_id: int, current_user: dict = Depends(require_a
     try:
         # Obtener información del producto
         product = db_manager.execute_query(
-            "SELECT imagen_url FROM productos WHERE id_producto = %s",
+            "SELECT imagen_url, imagen_variantes FROM productos WHERE id_producto = %s",
             (product_id,)
         )
         
         if not product:
             raise HTTPException(status_code=404, detail="Producto no encontrado")
         
-        # Eliminar archivo de imagen si existe
+        # Eliminar imagen y variantes si existen
         product_data = product[0]
-        if product_data['imagen_url']:
-            image_path = os.path.join(".", product_data['imagen_url'].lstrip('/'))
-            if os.path.exists(image_path):
-                os.remove(image_path)
+        remove_image_files(product_data['imagen_url'], product_data['imagen_variantes'])
         
         # Eliminar de base de datos
         affected_rows = db_manager.execute_query(
@@ -305,6 +378,7 @@ async def delete_product(product_id: int, current_user: dict = Depends(require_a
         if affected_rows == 0:
             raise HTTPException(status_code=404, detail="Producto no encontrado")
         
+        await response_cache.invalidate("productos:lista")
         logger.info(f"Producto eliminado: {product_id}")
         return {"message": "Producto eliminado exitosamente"}
         
@@ -390,6 +464,7 @@ async def update_stock(
             (new_stock, product_id),
             fetch=False
         )
+        await response_cache.invalidate("productos:lista")
         
         logger.info(f"Stock actualizado para producto {product_id}: {current_stock} -> {new_stock}")
         return {
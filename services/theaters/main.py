@@ -1,15 +1,25 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
-from shared.database import db_manager
-from shared.models import TheaterBase, TheaterResponse, ShowtimeBase, ShowtimeResponse
+from shared.database import async_db_manager
+from shared.migrator import run_startup_migrations
+from shared.models import TheaterBase, TheaterResponse, ShowtimeBase, ShowtimeResponse, ShowtimeBulkRequest
 from shared.auth import require_admin, get_current_user
+from shared.cache import response_cache
+from shared.http_cache import ETagMiddleware, CacheRule
+from shared.seatmap import SeatMapCache, SEAT_STATES, BITS_PER_SEAT
+from shared.timeline import RoomTimelines
+from shared.pagination import decode_cursor, set_next_cursor
+from shared.showtime_queries import (
+    showtimes_query, room_timelines_query, SHOWTIME_BY_ID_SQL, SCHEDULE_SQL, ROOM_TIMELINES_SQL, SEAT_MAP_SQL, SEAT_VERSION_SQL
+)
 from datetime import datetime, timedelta
 import logging
 from typing import List, Optional
+import asyncio
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
@@ -17,6 +27,20 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="CineMagic Theaters Service", version="1.0.0")
 
+# ETag y Cache-Control por ruta; se agrega antes que CORS para que
+# también las respuestas 304 lleven las cabeceras de CORS
+app.add_middleware(
+    ETagMiddleware,
+    cache=response_cache,
+    rules=[
+        CacheRule(r"/theaters", "public, max-age=60", tags=["salas"]),
+        CacheRule(r"/theaters/\d+", "public, max-age=60"),
+        CacheRule(r"/showtimes(/\d+)?|/schedule", "public, max-age=5"),
+        CacheRule(r"/showtimes/\d+/(seats|seatmap)|/theaters/\d+/free-slot", "no-cache"),
+        CacheRule(r"/(health|metrics/.+)", "no-store"),
+    ]
+)
+
 # Configuración CORS
 app.add_middleware(
     CORSMiddleware,
@@ -26,40 +50,407 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def create_seats_for_showtime(showtime_id: int, theater_capacity: int):
-    """Crear asientos para una función"""
+def read_seat_map(tx, showtime_id: int):
+    """Leer versión y estado de los asientos en una misma transacción"""
+    version = tx.execute(SEAT_VERSION_SQL, (showtime_id,))
+    rows = tx.execute(SEAT_MAP_SQL, (showtime_id,))
+    return rows, version[0]['version_asientos'] if version else 0
+
+async def load_seat_map(showtime_id: int):
+    """Cargar los asientos de una función para la caché de mapas"""
+    return await async_db_manager.run_in_transaction(read_seat_map, showtime_id)
+
+async def load_seat_version(showtime_id: int) -> Optional[int]:
+    """Versión actual de los asientos de una función (None si no existe)"""
+    rows = await async_db_manager.execute_query(SEAT_VERSION_SQL, (showtime_id,))
+    return rows[0]['version_asientos'] if rows else None
+
+# Intervalo (segundos) de la reconciliación de contadores de asientos disponibles
+SEAT_COUNTER_RECONCILE_INTERVAL = int(os.getenv("SEAT_COUNTER_RECONCILE_INTERVAL", "3600"))
+
+# Caché en memoria de mapas de asientos por función
+seat_maps = SeatMapCache(
+    load_seat_map,
+    load_seat_version,
+    check_interval=float(os.getenv("SEATMAP_CHECK_INTERVAL", "1.0"))
+)
+
+def day_range(date: str) -> tuple:
+    """Convertir una fecha YYYY-MM-DD en el rango [inicio, fin) del día
+
+    Filtrar por rango en lugar de DATE(horario) permite usar los índices
+    sobre `horario`.
+    """
     try:
-        # Crear asientos numerados del 1 al capacity
-        seats_data = [(showtime_id, seat_num) for seat_num in range(1, theater_capacity + 1)]
+        start = datetime.strptime(date, '%Y-%m-%d')
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Fecha inválida, use el formato AAAA-MM-DD")
+    return start, start + timedelta(days=1)
+
+def create_seats_for_showtime(tx, showtime_id: int, theater_capacity: int):
+    """Crear asientos para una función dentro de la transacción"""
+    # Crear asientos numerados del 1 al capacity
+    seats_data = [(showtime_id, seat_num) for seat_num in range(1, theater_capacity + 1)]
+    
+    tx.execute_many(
+        "INSERT INTO asientos (id_funcion, numero_asiento) VALUES (%s, %s)",
+        seats_data
+    )
+    
+    logger.info(f"Creados {theater_capacity} asientos para función {showtime_id}")
+
+def insert_showtime(tx, showtime: ShowtimeBase, theater_capacity: int) -> int:
+    """Insertar función y sus asientos con el contador de disponibles inicializado"""
+    showtime_id = tx.execute(
+        """INSERT INTO funciones (id_pelicula, id_sala, horario, precio, asientos_disponibles)
+           VALUES (%s, %s, %s, %s, %s)""",
+        (showtime.id_pelicula, showtime.id_sala, showtime.horario, showtime.precio, theater_capacity)
+    )
+    create_seats_for_showtime(tx, showtime_id, theater_capacity)
+    return showtime_id
+
+# Tamaño de lote para los INSERT múltiples de la programación masiva
+BULK_INSERT_BATCH = 500
+
+# Minutos de limpieza entre el fin de una película y la siguiente función de la sala
+SHOWTIME_CLEANING_MINUTES = int(os.getenv("SHOWTIME_CLEANING_MINUTES", "30"))
+
+# Cada cuánto se recarga el índice de salas desde la base (cambios de duración
+# de películas o funciones escritas por otras réplicas)
+ROOM_TIMELINE_REFRESH_INTERVAL = int(os.getenv("ROOM_TIMELINE_REFRESH_INTERVAL", "300"))
+
+SCHEDULE_CONFLICT_DETAIL = (
+    f"Conflicto de horarios: la sala está ocupada (duración de la película + "
+    f"{SHOWTIME_CLEANING_MINUTES} min de limpieza)"
+)
+
+# Ocupación de cada sala en memoria; toda lectura o escritura del índice
+# se hace con `room_timelines_lock` tomado
+room_timelines = RoomTimelines(timedelta(minutes=SHOWTIME_CLEANING_MINUTES))
+room_timelines_lock = asyncio.Lock()
+
+async def load_room_timelines():
+    """Reconstruir el índice de ocupación con las funciones vigentes"""
+    async with room_timelines_lock:
+        rows = await async_db_manager.execute_query(ROOM_TIMELINES_SQL)
+        room_timelines.load(rows)
+    logger.info(f"Índice de salas cargado: {len(rows)} funciones")
+
+async def room_timeline_refresher():
+    """Tarea periódica de recarga del índice de salas"""
+    while True:
+        await asyncio.sleep(ROOM_TIMELINE_REFRESH_INTERVAL)
+        try:
+            await load_room_timelines()
+        except Exception as e:
+            logger.error(f"Error recargando índice de salas: {e}")
+
+def check_room_free(tx, theater_id: int, start: datetime, duration: int, exclude: Optional[int] = None):
+    """Verificar en la base que la sala esté libre (película + limpieza)
+
+    La fila de la sala se bloquea con FOR UPDATE, así dos altas o cambios
+    en la misma sala se serializan aunque vengan de réplicas distintas (el
+    índice en memoria de cada réplica puede estar desactualizado).
+    """
+    theater = tx.execute("SELECT id_sala FROM salas WHERE id_sala = %s FOR UPDATE", (theater_id,))
+    if not theater:
+        raise HTTPException(status_code=404, detail="Sala no encontrada")
+    
+    end = room_timelines.occupied_until(start, duration)
+    # La cota de un día (como el índice) permite usar idx_funciones_sala_horario
+    conflict = tx.execute(
+        """SELECT f.id_funcion FROM funciones f
+           JOIN peliculas p ON f.id_pelicula = p.id_pelicula
+           WHERE f.id_sala = %s AND f.id_funcion <> %s
+           AND f.horario > %s - INTERVAL 1 DAY AND f.horario < %s
+           AND f.horario + INTERVAL (p.duracion + %s) MINUTE > %s
+           LIMIT 1""",
+        (theater_id, exclude or 0, start, end, SHOWTIME_CLEANING_MINUTES, start)
+    )
+    if conflict:
+        raise HTTPException(status_code=400, detail=SCHEDULE_CONFLICT_DETAIL)
+
+def create_showtime_checked(tx, showtime: ShowtimeBase, duration: int, theater_capacity: int) -> int:
+    """Verificar la sala e insertar la función en una misma transacción"""
+    check_room_free(tx, showtime.id_sala, showtime.horario, duration)
+    return insert_showtime(tx, showtime, theater_capacity)
+
+def update_showtime_checked(tx, showtime_id: int, showtime: ShowtimeBase, duration: int) -> int:
+    """Verificar la sala y actualizar la función en una misma transacción"""
+    check_room_free(tx, showtime.id_sala, showtime.horario, duration, exclude=showtime_id)
+    existing = tx.execute("SELECT id_funcion FROM funciones WHERE id_funcion = %s FOR UPDATE", (showtime_id,))
+    if not existing:
+        raise HTTPException(status_code=404, detail="Función no encontrada")
+    return tx.execute(
+        "UPDATE funciones SET id_pelicula = %s, id_sala = %s, horario = %s, precio = %s WHERE id_funcion = %s",
+        (showtime.id_pelicula, showtime.id_sala, showtime.horario, showtime.precio, showtime_id)
+    )
+
+async def get_movie_duration(movie_id: int) -> int:
+    """Duración en minutos de una película (404 si no existe)"""
+    movie = await async_db_manager.execute_query(
+        "SELECT duracion FROM peliculas WHERE id_pelicula = %s",
+        (movie_id,)
+    )
+    if not movie:
+        raise HTTPException(status_code=404, detail="Película no encontrada")
+    return movie[0]['duracion']
+
+def find_schedule_conflicts(showtimes: List[ShowtimeBase], durations: dict) -> List[int]:
+    """Detectar con el índice de salas las funciones nuevas que chocan
+
+    Las funciones aceptadas se registran de forma provisional con clave
+    negativa (-1 - índice), así también se detectan choques dentro de la
+    misma solicitud; quien llama debe quitarlas al terminar. Devuelve los
+    índices de las funciones en conflicto.
+    """
+    conflicts = []
+    for index, showtime in enumerate(showtimes):
+        duration = durations[showtime.id_pelicula]
+        if room_timelines.has_conflict(showtime.id_sala, showtime.horario, duration):
+            conflicts.append(index)
+        else:
+            room_timelines.add(-1 - index, showtime.id_sala, showtime.horario, duration)
+    return conflicts
+
+def insert_showtimes_bulk(tx, showtimes: List[ShowtimeBase], capacities: dict) -> List[int]:
+    """Insertar funciones y asientos con INSERT de múltiples filas en una transacción"""
+    showtime_ids = []
+    for start in range(0, len(showtimes), BULK_INSERT_BATCH):
+        chunk = showtimes[start:start + BULK_INSERT_BATCH]
+        values = []
+        for showtime in chunk:
+            values.extend([
+                showtime.id_pelicula, showtime.id_sala, showtime.horario,
+                showtime.precio, capacities[showtime.id_sala]
+            ])
+        # En un INSERT simple de varias filas InnoDB asigna ids consecutivos
+        first_id = tx.execute(
+            f"""INSERT INTO funciones (id_pelicula, id_sala, horario, precio, asientos_disponibles)
+                VALUES {", ".join(["(%s, %s, %s, %s, %s)"] * len(chunk))}""",
+            tuple(values)
+        )
+        chunk_ids = list(range(first_id, first_id + len(chunk)))
+        showtime_ids.extend(chunk_ids)
         
-        db_manager.execute_many(
+        # executemany de un INSERT ... VALUES se envía como un único INSERT múltiple
+        tx.execute_many(
             "INSERT INTO asientos (id_funcion, numero_asiento) VALUES (%s, %s)",
-            seats_data
+            [
+                (showtime_id, seat_num)
+                for showtime_id, showtime in zip(chunk_ids, chunk)
+                for seat_num in range(1, capacities[showtime.id_sala] + 1)
+            ]
         )
-        
-        logger.info(f"Creados {theater_capacity} asientos para función {showtime_id}")
+    return showtime_ids
+
+def schedule_showtimes(tx, request: ShowtimeBulkRequest) -> tuple:
+    """Validar y programar un lote de funciones en una sola transacción
+
+    Debe llamarse con `room_timelines_lock` tomado. Devuelve el resumen y las
+    funciones creadas como (id, sala, horario, duración) para registrarlas
+    en el índice una vez confirmada la transacción.
+    """
+    showtimes = request.funciones
+    movie_ids = sorted({showtime.id_pelicula for showtime in showtimes})
+    theater_ids = sorted({showtime.id_sala for showtime in showtimes})
+    
+    # Las salas se bloquean antes de cualquier otra lectura, para serializarse
+    # con las altas y cambios individuales y que la recarga de abajo vea todo
+    # lo confirmado hasta obtener el lock
+    theaters = tx.execute(
+        f"SELECT id_sala, capacidad FROM salas WHERE id_sala IN ({', '.join(['%s'] * len(theater_ids))}) FOR UPDATE",
+        tuple(theater_ids)
+    )
+    capacities = {row['id_sala']: row['capacidad'] for row in theaters}
+    missing_theaters = set(theater_ids) - set(capacities)
+    if missing_theaters:
+        raise HTTPException(status_code=404, detail=f"Salas no encontradas: {sorted(missing_theaters)}")
+    
+    movies = tx.execute(
+        f"SELECT id_pelicula, duracion FROM peliculas WHERE id_pelicula IN ({', '.join(['%s'] * len(movie_ids))})",
+        tuple(movie_ids)
+    )
+    durations = {row['id_pelicula']: row['duracion'] for row in movies}
+    missing_movies = set(movie_ids) - set(durations)
+    if missing_movies:
+        raise HTTPException(status_code=404, detail=f"Películas no encontradas: {sorted(missing_movies)}")
+    
+    # El índice puede no tener funciones creadas por otras réplicas desde la
+    # última recarga: se recargan desde la base las salas del lote
+    room_timelines.load_rooms(theater_ids, tx.execute(*room_timelines_query(theater_ids)))
+    
+    conflicts = find_schedule_conflicts(showtimes, durations)
+    conflict_set = set(conflicts)
+    accepted_indexes = [index for index in range(len(showtimes)) if index not in conflict_set]
+    try:
+        if conflicts and not request.omitir_conflictos:
+            raise HTTPException(status_code=400, detail={
+                "message": SCHEDULE_CONFLICT_DETAIL,
+                "conflictos": conflicts
+            })
+        
+        accepted = [showtimes[index] for index in accepted_indexes]
+        showtime_ids = insert_showtimes_bulk(tx, accepted, capacities) if accepted else []
+    finally:
+        for index in accepted_indexes:
+            room_timelines.remove(-1 - index)
+    
+    scheduled = [
+        (showtime_id, showtime.id_sala, showtime.horario, durations[showtime.id_pelicula])
+        for showtime_id, showtime in zip(showtime_ids, accepted)
+    ]
+    return {
+        "creadas": len(showtime_ids),
+        "showtime_ids": showtime_ids,
+        "asientos_creados": sum(capacities[showtime.id_sala] for showtime in accepted),
+        "conflictos": conflicts
+    }, scheduled
+
+def reconcile_showtime_counters(tx, batch_size: int, after_id: int) -> tuple:
+    """Verificar y corregir el contador de asientos disponibles de un lote de funciones
+
+    Se bloquean las funciones y sus franjas de contador (FOR UPDATE, que en
+    REPEATABLE READ también impide crear franjas nuevas) y después se cuenta
+    desde `asientos` con una lectura normal. Una reserva o compra en curso
+    escribe su franja al final, así que termina antes de este conteo o queda
+    fuera del conteo y del contador a la vez. Devuelve (funciones
+    corregidas, último id revisado).
+    """
+    rows = tx.execute(
+        """SELECT id_funcion, asientos_disponibles FROM funciones
+           WHERE id_funcion > %s AND horario > NOW()
+           ORDER BY id_funcion
+           LIMIT %s
+           FOR UPDATE""",
+        (after_id, batch_size)
+    )
+    if not rows:
+        return [], None
+    
+    ids = [row['id_funcion'] for row in rows]
+    stripes = tx.execute(
+        f"""SELECT id_funcion, SUM(delta_disponibles) as delta
+            FROM funciones_contadores
+            WHERE id_funcion IN ({", ".join(["%s"] * len(ids))})
+            GROUP BY id_funcion
+            FOR UPDATE""",
+        tuple(ids)
+    )
+    deltas = {row['id_funcion']: int(row['delta']) for row in stripes}
+    counts = tx.execute(
+        f"""SELECT id_funcion, COUNT(*) as real_disponibles
+            FROM asientos
+            WHERE estado = 'disponible' AND id_funcion IN ({", ".join(["%s"] * len(ids))})
+            GROUP BY id_funcion""",
+        tuple(ids)
+    )
+    real = {row['id_funcion']: row['real_disponibles'] for row in counts}
+    
+    drifted = []
+    for row in rows:
+        actual = real.get(row['id_funcion'], 0)
+        delta = deltas.get(row['id_funcion'], 0)
+        counter = row['asientos_disponibles'] + delta
+        if counter != actual:
+            tx.execute(
+                "UPDATE funciones SET asientos_disponibles = %s WHERE id_funcion = %s",
+                (actual - delta, row['id_funcion'])
+            )
+            drifted.append({
+                "id_funcion": row['id_funcion'],
+                "contador": counter,
+                "real_disponibles": actual
+            })
+    
+    return drifted, ids[-1]
+
+async def reconcile_seat_counters(batch_size: int = 500) -> list:
+    """Revisar todas las funciones futuras por lotes y corregir desviaciones"""
+    repaired = []
+    after_id = 0
+    while after_id is not None:
+        drifted, after_id = await async_db_manager.run_in_transaction(
+            reconcile_showtime_counters, batch_size, after_id
+        )
+        repaired.extend(drifted)
+    
+    for row in repaired:
+        logger.warning(
+            f"Contador corregido en función {row['id_funcion']}: {row['contador']} -> {row['real_disponibles']}"
+        )
+    return repaired
+
+async def seat_counter_reconciler():
+    """Tarea periódica de reconciliación de contadores"""
+    while True:
+        await asyncio.sleep(SEAT_COUNTER_RECONCILE_INTERVAL)
+        try:
+            await reconcile_seat_counters()
+        except Exception as e:
+            logger.error(f"Error reconciliando contadores de asientos: {e}")
+
+@app.on_event("startup")
+async def start_seat_counter_reconciler():
+    """Iniciar la reconciliación periódica de contadores"""
+    app.state.seat_counter_reconciler = asyncio.create_task(seat_counter_reconciler())
+
+@app.on_event("shutdown")
+async def stop_seat_counter_reconciler():
+    """Detener la reconciliación periódica de contadores"""
+    app.state.seat_counter_reconciler.cancel()
+
+@app.on_event("startup")
+async def apply_migrations():
+    """Aplicar migraciones de esquema pendientes (DB_AUTO_MIGRATE=true)"""
+    run_startup_migrations()
+
+@app.on_event("startup")
+async def start_room_timelines():
+    """Cargar el índice de salas e iniciar su recarga periódica"""
+    try:
+        await load_room_timelines()
     except Exception as e:
-        logger.error(f"Error creando asientos: {e}")
-        raise
+        logger.error(f"No se pudo cargar el índice de salas, se reintentará en la recarga periódica: {e}")
+    app.state.room_timeline_refresher = asyncio.create_task(room_timeline_refresher())
+
+@app.on_event("shutdown")
+async def stop_room_timelines():
+    """Detener la recarga periódica del índice de salas"""
+    app.state.room_timeline_refresher.cancel()
 
 @app.get("/health")
 async def health_check():
     """Verificar estado del servicio"""
     try:
-        db_manager.execute_query("SELECT 1")
+        await async_db_manager.execute_query("SELECT 1")
         return {"status": "healthy", "service": "theaters"}
     except Exception as e:
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
+@app.get("/metrics/db")
+async def db_pool_metrics():
+    """Pool de conexiones: en uso/ociosas e histograma de espera"""
+    return async_db_manager.manager.pool_metrics()
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Métricas de la caché de catálogo"""
+    return response_cache.metrics()
+
 # GESTIÓN DE SALAS
 
 @app.get("/theaters", response_model=List[TheaterResponse])
 async def get_theaters():
     """Obtener todas las salas"""
     try:
-        theaters = db_manager.execute_query(
-            "SELECT id_sala, nombre, capacidad, tipo FROM salas ORDER BY nombre"
+        theaters = await response_cache.get_or_load(
+            "salas:lista",
+            lambda: async_db_manager.execute_query(
+                "SELECT id_sala, nombre, capacidad, tipo FROM salas ORDER BY nombre"
+            ),
+            tags=["salas"]
         )
         return theaters
     except Exception as e:
@@ -70,7 +461,7 @@ async def get_theaters():
 async def get_theater(theater_id: int):
     """Obtener sala por ID"""
     try:
-        theater = db_manager.execute_query(
+        theater = await async_db_manager.execute_query(
             "SELECT id_sala, nombre, capacidad, tipo FROM salas WHERE id_sala = %s",
             (theater_id,)
         )
@@ -85,15 +476,58 @@ async def get_theater(theater_id: int):
         logger.error(f"Error obteniendo sala: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+@app.get("/theaters/{theater_id}/free-slot")
+async def get_free_slot(
+    theater_id: int,
+    after: Optional[datetime] = None,
+    movie_id: Optional[int] = None,
+    duration: Optional[int] = None
+):
+    """Primer horario libre de la sala a partir de `after` (por defecto ahora)
+
+    La duración se toma de `movie_id` o se indica en minutos con `duration`;
+    a ella se suma el tiempo de limpieza de la sala.
+    """
+    try:
+        if movie_id is not None:
+            duration = await get_movie_duration(movie_id)
+        elif duration is None or duration <= 0:
+            raise HTTPException(status_code=400, detail="Debe indicar movie_id o una duración positiva")
+        
+        theater = await async_db_manager.execute_query(
+            "SELECT id_sala FROM salas WHERE id_sala = %s",
+            (theater_id,)
+        )
+        if not theater:
+            raise HTTPException(status_code=404, detail="Sala no encontrada")
+        
+        after = after or datetime.now().replace(second=0, microsecond=0)
+        async with room_timelines_lock:
+            start = room_timelines.next_free_slot(theater_id, after, duration)
+        
+        return {
+            "id_sala": theater_id,
+            "horario": start,
+            "fin_pelicula": start + timedelta(minutes=duration),
+            "sala_libre": room_timelines.occupied_until(start, duration),
+            "limpieza_minutos": SHOWTIME_CLEANING_MINUTES
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error buscando horario libre: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
 @app.post("/theaters", response_model=dict)
 async def create_theater(theater: TheaterBase, current_user: dict = Depends(require_admin)):
     """Crear nueva sala (solo admin)"""
     try:
-        theater_id = db_manager.execute_query(
+        theater_id = await async_db_manager.execute_query(
             "INSERT INTO salas (nombre, capacidad, tipo) VALUES (%s, %s, %s)",
             (theater.nombre, theater.capacidad, theater.tipo),
             fetch=False
         )
+        await response_cache.invalidate("salas")
         
         logger.info(f"Sala creada: {theater.nombre} (ID: {theater_id})")
         return {
@@ -109,7 +543,7 @@ async def create_theater(theater: TheaterBase, current_user: dict = Depends(requ
 async def update_theater(theater_id: int, theater: TheaterBase, current_user: dict = Depends(require_admin)):
     """Actualizar sala (solo admin)"""
     try:
-        affected_rows = db_manager.execute_query(
+        affected_rows = await async_db_manager.execute_query(
             "UPDATE salas SET nombre = %s, capacidad = %s, tipo = %s WHERE id_sala = %s",
             (theater.nombre, theater.capacidad, theater.tipo, theater_id),
             fetch=False
@@ -118,6 +552,7 @@ async def update_theater(theater_id: int, theater: TheaterBase, current_user: di
         if affected_rows == 0:
             raise HTTPException(status_code=404, detail="Sala no encontrada")
         
+        await response_cache.invalidate("salas")
         logger.info(f"Sala actualizada: {theater_id}")
         return {"message": "Sala actualizada exitosamente"}
         
@@ -132,7 +567,7 @@ async def delete_theater(theater_id: int, current_user: dict = Depends(require_a
     """Eliminar sala (solo admin)"""
     try:
         # Verificar si hay funciones programadas
-        existing_showtimes = db_manager.execute_query(
+        existing_showtimes = await async_db_manager.execute_query(
             "SELECT COUNT(*) as count FROM funciones WHERE id_sala = %s AND horario > NOW()",
             (theater_id,)
         )
@@ -140,7 +575,7 @@ async def delete_theater(theater_id: int, current_user: dict = Depends(require_a
         if existing_showtimes[0]['count'] > 0:
             raise HTTPException(status_code=400, detail="No se puede eliminar la sala: tiene funciones programadas")
         
-        affected_rows = db_manager.execute_query(
+        affected_rows = await async_db_manager.execute_query(
             "DELETE FROM salas WHERE id_sala = %s",
             (theater_id,),
             fetch=False
@@ -149,6 +584,7 @@ async def delete_theater(theater_id: int, current_user: dict = Depends(require_a
         if affected_rows == 0:
             raise HTTPException(status_code=404, detail="Sala no encontrada")
         
+        await response_cache.invalidate("salas")
         logger.info(f"Sala eliminada: {theater_id}")
         return {"message": "Sala eliminada exitosamente"}
         
@@ -162,49 +598,35 @@ async def delete_theater(theater_id: int, current_user: dict = Depends(require_a
 
 @app.get("/showtimes", response_model=List[ShowtimeResponse])
 async def get_showtimes(
+    response: Response,
     movie_id: Optional[int] = None,
     theater_id: Optional[int] = None,
     date: Optional[str] = None,
     skip: int = 0,
-    limit: int = 50
+    limit: int = 50,
+    cursor: Optional[str] = None
 ):
-    """Obtener funciones con filtros opcionales"""
+    """Obtener funciones con filtros opcionales
+
+    Con `cursor` (vacío para la primera página) se pagina por (horario, id);
+    la siguiente página se indica en la cabecera X-Next-Cursor.
+    """
     try:
-        base_query = """
-        SELECT f.id_funcion, f.id_pelicula, f.id_sala, f.horario, f.precio,
-               p.titulo as pelicula_titulo, s.nombre as sala_nombre,
-               COUNT(a.id_asiento) as asientos_disponibles
-        FROM funciones f
-        JOIN peliculas p ON f.id_pelicula = p.id_pelicula
-        JOIN salas s ON f.id_sala = s.id_sala
-        LEFT JOIN asientos a ON f.id_funcion = a.id_funcion AND a.estado = 'disponible'
-        WHERE f.horario > NOW()
-        """
-        
-        params = []
-        
-        if movie_id:
-            base_query += " AND f.id_pelicula = %s"
-            params.append(movie_id)
-        
-        if theater_id:
-            base_query += " AND f.id_sala = %s"
-            params.append(theater_id)
-        
-        if date:
-            base_query += " AND DATE(f.horario) = %s"
-            params.append(date)
-        
-        base_query += """
-        GROUP BY f.id_funcion
-        ORDER BY f.horario
-        LIMIT %s OFFSET %s
-        """
-        params.extend([limit, skip])
-        
-        showtimes = db_manager.execute_query(base_query, tuple(params))
+        after = None
+        if cursor is not None:
+            after = decode_cursor(cursor, "funciones", 2)
+            skip = 0
+        
+        query, params = showtimes_query(
+            movie_id, theater_id, day_range(date) if date else None, after, limit, skip
+        )
+        showtimes = await async_db_manager.execute_query(query, params)
+        if cursor is not None:
+            set_next_cursor(response, "funciones", showtimes, ["horario", "id_funcion"], limit)
         return showtimes
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo funciones: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
@@ -213,18 +635,7 @@ async def get_showtimes(
 async def get_showtime(showtime_id: int):
     """Obtener función por ID"""
     try:
-        showtime = db_manager.execute_query(
-            """SELECT f.id_funcion, f.id_pelicula, f.id_sala, f.horario, f.precio,
-                      p.titulo as pelicula_titulo, s.nombre as sala_nombre,
-                      COUNT(a.id_asiento) as asientos_disponibles
-               FROM funciones f
-               JOIN peliculas p ON f.id_pelicula = p.id_pelicula
-               JOIN salas s ON f.id_sala = s.id_sala
-               LEFT JOIN asientos a ON f.id_funcion = a.id_funcion AND a.estado = 'disponible'
-               WHERE f.id_funcion = %s
-               GROUP BY f.id_funcion""",
-            (showtime_id,)
-        )
+        showtime = await async_db_manager.execute_query(SHOWTIME_BY_ID_SQL, (showtime_id,))
         
         if not showtime:
             raise HTTPException(status_code=404, detail="Función no encontrada")
@@ -240,42 +651,24 @@ async def get_showtime(showtime_id: int):
 async def create_showtime(showtime: ShowtimeBase, current_user: dict = Depends(require_admin)):
     """Crear nueva función (solo admin)"""
     try:
-        # Verificar que la película existe
-        movie = db_manager.execute_query(
-            "SELECT id_pelicula FROM peliculas WHERE id_pelicula = %s",
-            (showtime.id_pelicula,)
-        )
-        if not movie:
-            raise HTTPException(status_code=404, detail="Película no encontrada")
+        # Verificar que la película existe y obtener su duración
+        duration = await get_movie_duration(showtime.id_pelicula)
         
         # Verificar que la sala existe y obtener capacidad
-        theater = db_manager.execute_query(
+        theater = await async_db_manager.execute_query(
             "SELECT id_sala, capacidad FROM salas WHERE id_sala = %s",
             (showtime.id_sala,)
         )
         if not theater:
             raise HTTPException(status_code=404, detail="Sala no encontrada")
         
-        # Verificar que no haya conflicto de horarios
-        conflict = db_manager.execute_query(
-            """SELECT id_funcion FROM funciones 
-               WHERE id_sala = %s 
-               AND ABS(TIMESTAMPDIFF(MINUTE, horario, %s)) < 180""",
-            (showtime.id_sala, showtime.horario)
-        )
-        
-        if conflict:
-            raise HTTPException(status_code=400, detail="Conflicto de horarios: debe haber al menos 3 horas entre funciones")
-        
-        # Crear función
-        showtime_id = db_manager.execute_query(
-            "INSERT INTO funciones (id_pelicula, id_sala, horario, precio) VALUES (%s, %s, %s, %s)",
-            (showtime.id_pelicula, showtime.id_sala, showtime.horario, showtime.precio),
-            fetch=False
-        )
-        
-        # Crear asientos para la función
-        create_seats_for_showtime(showtime_id, theater[0]['capacidad'])
+        async with room_timelines_lock:
+            # Verificar que la sala esté libre y crear la función con sus asientos
+            # en una sola transacción
+            showtime_id = await async_db_manager.run_in_transaction(
+                create_showtime_checked, showtime, duration, theater[0]['capacidad']
+            )
+            room_timelines.add(showtime_id, showtime.id_sala, showtime.horario, duration)
         
         logger.info(f"Función creada: {showtime_id}")
         return {
@@ -289,12 +682,38 @@ async def create_showtime(showtime: ShowtimeBase, current_user: dict = Depends(r
         logger.error(f"Error creando función: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+@app.post("/showtimes/bulk", response_model=dict)
+async def create_showtimes_bulk(request: ShowtimeBulkRequest, current_user: dict = Depends(require_admin)):
+    """Programar muchas funciones (películas x salas x horarios) en una sola operación (solo admin)
+
+    Los conflictos se detectan con el índice de salas en memoria.
+    Con `omitir_conflictos` las funciones en conflicto se descartan y el resto
+    se crea; sin él, cualquier conflicto cancela toda la programación.
+    """
+    try:
+        async with room_timelines_lock:
+            result, scheduled = await async_db_manager.run_in_transaction(schedule_showtimes, request)
+            for showtime_id, theater_id, horario, duration in scheduled:
+                room_timelines.add(showtime_id, theater_id, horario, duration)
+        
+        logger.info(f"Programación masiva: {result['creadas']} funciones creadas, {len(result['conflictos'])} conflictos")
+        return {
+            "message": "Programación creada exitosamente",
+            **result
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error en programación masiva: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
 @app.put("/showtimes/{showtime_id}")
 async def update_showtime(showtime_id: int, showtime: ShowtimeBase, current_user: dict = Depends(require_admin)):
     """Actualizar función (solo admin)"""
     try:
         # Verificar que la función existe
-        existing = db_manager.execute_query(
+        existing = await async_db_manager.execute_query(
             "SELECT id_funcion FROM funciones WHERE id_funcion = %s",
             (showtime_id,)
         )
@@ -302,7 +721,7 @@ async def update_showtime(showtime_id: int, showtime: ShowtimeBase, current_user
             raise HTTPException(status_code=404, detail="Función no encontrada")
         
         # Verificar que no hay boletos vendidos
-        tickets = db_manager.execute_query(
+        tickets = await async_db_manager.execute_query(
             "SELECT COUNT(*) as count FROM boletos WHERE id_funcion = %s",
             (showtime_id,)
         )
@@ -310,27 +729,15 @@ async def update_showtime(showtime_id: int, showtime: ShowtimeBase, current_user
         if tickets[0]['count'] > 0:
             raise HTTPException(status_code=400, detail="No se puede modificar: ya hay boletos vendidos")
         
-        # Verificar conflicto de horarios (excluyendo la función actual)
-        conflict = db_manager.execute_query(
-            """SELECT id_funcion FROM funciones 
-               WHERE id_sala = %s 
-               AND id_funcion != %s
-               AND ABS(TIMESTAMPDIFF(MINUTE, horario, %s)) < 180""",
-            (showtime.id_sala, showtime_id, showtime.horario)
-        )
-        
-        if conflict:
-            raise HTTPException(status_code=400, detail="Conflicto de horarios: debe haber al menos 3 horas entre funciones")
+        duration = await get_movie_duration(showtime.id_pelicula)
         
-        # Actualizar función
-        affected_rows = db_manager.execute_query(
-            "UPDATE funciones SET id_pelicula = %s, id_sala = %s, horario = %s, precio = %s WHERE id_funcion = %s",
-            (showtime.id_pelicula, showtime.id_sala, showtime.horario, showtime.precio, showtime_id),
-            fetch=False
-        )
-        
-        if affected_rows == 0:
-            raise HTTPException(status_code=404, detail="Función no encontrada")
+        async with room_timelines_lock:
+            # Verificar conflicto de horarios (excluyendo la función actual) y actualizar
+            await async_db_manager.run_in_transaction(
+                update_showtime_checked, showtime_id, showtime, duration
+            )
+            
+            room_timelines.add(showtime_id, showtime.id_sala, showtime.horario, duration)
         
         logger.info(f"Función actualizada: {showtime_id}")
         return {"message": "Función actualizada exitosamente"}
@@ -346,7 +753,7 @@ async def delete_showtime(showtime_id: int, current_user: dict = Depends(require
     """Eliminar función (solo admin)"""
     try:
         # Verificar que no hay boletos vendidos
-        tickets = db_manager.execute_query(
+        tickets = await async_db_manager.execute_query(
             "SELECT COUNT(*) as count FROM boletos WHERE id_funcion = %s",
             (showtime_id,)
         )
@@ -354,15 +761,18 @@ async def delete_showtime(showtime_id: int, current_user: dict = Depends(require
         if tickets[0]['count'] > 0:
             raise HTTPException(status_code=400, detail="No se puede eliminar: ya hay boletos vendidos")
         
-        affected_rows = db_manager.execute_query(
-            "DELETE FROM funciones WHERE id_funcion = %s",
-            (showtime_id,),
-            fetch=False
-        )
+        async with room_timelines_lock:
+            affected_rows = await async_db_manager.execute_query(
+                "DELETE FROM funciones WHERE id_funcion = %s",
+                (showtime_id,),
+                fetch=False
+            )
+            room_timelines.remove(showtime_id)
         
         if affected_rows == 0:
             raise HTTPException(status_code=404, detail="Función no encontrada")
         
+        seat_maps.invalidate(showtime_id)
         logger.info(f"Función eliminada: {showtime_id}")
         return {"message": "Función eliminada exitosamente"}
         
@@ -374,44 +784,97 @@ async def delete_showtime(showtime_id: int, current_user: dict = Depends(require
 
 @app.get("/showtimes/{showtime_id}/seats")
 async def get_showtime_seats(showtime_id: int):
-    """Obtener asientos de una función"""
+    """Obtener asientos de una función (desde la caché de mapas)"""
     try:
-        seats = db_manager.execute_query(
-            """SELECT id_asiento, numero_asiento, estado
-               FROM asientos 
-               WHERE id_funcion = %s 
-               ORDER BY numero_asiento""",
-            (showtime_id,)
-        )
+        seat_map = await seat_maps.get(showtime_id)
+        if seat_map is None:
+            raise HTTPException(status_code=404, detail="Función no encontrada")
         
-        return seats
+        return [
+            {"numero_asiento": seat, "estado": SEAT_STATES[seat_map.get(seat)]}
+            for seat in range(1, seat_map.total_seats + 1)
+        ]
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo asientos: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+@app.get("/showtimes/{showtime_id}/seatmap")
+async def get_showtime_seatmap(showtime_id: int, since: Optional[int] = None, format: str = "base64"):
+    """Obtener el mapa de asientos empaquetado (2 bits por asiento)
+
+    Con `since` se devuelven solo los asientos que cambiaron desde esa
+    versión; si el historial ya no la cubre se devuelve el mapa completo.
+    Con `format=binary` el mapa se envía como bytes crudos.
+    """
+    try:
+        seat_map = await seat_maps.get(showtime_id)
+        if seat_map is None:
+            raise HTTPException(status_code=404, detail="Función no encontrada")
+        
+        if since is not None:
+            changes = seat_map.changes_since(since)
+            if changes is not None:
+                return {
+                    "id_funcion": showtime_id,
+                    "version": seat_map.version,
+                    "desde": since,
+                    "cambios": changes
+                }
+        
+        if format == "binary":
+            return Response(
+                content=seat_map.to_bytes(),
+                media_type="application/octet-stream",
+                headers={
+                    "X-Seatmap-Version": str(seat_map.version),
+                    "X-Seatmap-Seats": str(seat_map.total_seats),
+                    "X-Seatmap-Bits": str(BITS_PER_SEAT)
+                }
+            )
+        
+        return {
+            "id_funcion": showtime_id,
+            "version": seat_map.version,
+            "total_asientos": seat_map.total_seats,
+            "bits_por_asiento": BITS_PER_SEAT,
+            "estados": SEAT_STATES,
+            "mapa": seat_map.to_base64()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error obteniendo mapa de asientos: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
+@app.post("/showtimes/reconcile-seats")
+async def reconcile_seats(current_user: dict = Depends(require_admin)):
+    """Verificar y corregir los contadores de asientos disponibles (solo admin)"""
+    try:
+        repaired = await reconcile_seat_counters()
+        return {
+            "message": "Reconciliación completada",
+            "corregidas": len(repaired),
+            "funciones": repaired
+        }
+    except Exception as e:
+        logger.error(f"Error reconciliando contadores: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
 @app.get("/schedule")
 async def get_schedule(date: Optional[str] = None):
     """Obtener programación del día"""
     try:
         if not date:
             date = datetime.now().strftime('%Y-%m-%d')
+        day_start, day_end = day_range(date)
         
-        schedule = db_manager.execute_query(
-            """SELECT f.id_funcion, f.horario, f.precio,
-                      p.titulo, p.duracion, p.clasificacion, p.imagen_url,
-                      s.nombre as sala, s.tipo as sala_tipo,
-                      COUNT(a.id_asiento) as asientos_disponibles
-               FROM funciones f
-               JOIN peliculas p ON f.id_pelicula = p.id_pelicula
-               JOIN salas s ON f.id_sala = s.id_sala
-               LEFT JOIN asientos a ON f.id_funcion = a.id_funcion AND a.estado = 'disponible'
-               WHERE DATE(f.horario) = %s
-               GROUP BY f.id_funcion
-               ORDER BY f.horario""",
-            (date,)
-        )
+        schedule = await async_db_manager.execute_query(SCHEDULE_SQL, (day_start, day_end))
         
         return schedule
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error obteniendo programación: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
@@ -1,16 +1,22 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
-from shared.database import db_manager
-from shared.models import TicketResponse, PurchaseRequest
+from shared.database import db_manager, async_db_manager
+from shared.migrator import run_startup_migrations
+from shared.models import TicketResponse, PurchaseRequest, SeatHoldRequest
 from shared.auth import get_current_user, require_admin
+from shared.cache import response_cache
+from shared.http_cache import ETagMiddleware, CacheRule
+from shared.pagination import decode_cursor, keyset_condition, set_next_cursor
 from datetime import datetime, timedelta
 import logging
 from typing import List, Optional
 import uuid
+import asyncio
+import random
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
@@ -18,6 +24,17 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="CineMagic Tickets Service", version="1.0.0")
 
+# ETag y Cache-Control por ruta; se agrega antes que CORS para que
+# también las respuestas 304 lleven las cabeceras de CORS
+app.add_middleware(
+    ETagMiddleware,
+    cache=response_cache,
+    rules=[
+        CacheRule(r"/health", "no-store"),
+        CacheRule(r".*", "private, no-cache"),
+    ]
+)
+
 # Configuración CORS
 app.add_middleware(
     CORSMiddleware,
@@ -27,10 +44,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Configuración de reservas temporales de asientos
+HOLD_TTL_SECONDS = int(os.getenv("SEAT_HOLD_TTL_SECONDS", "300"))
+HOLD_SWEEP_INTERVAL = int(os.getenv("SEAT_HOLD_SWEEP_INTERVAL", "30"))
+HOLD_SWEEP_BATCH = int(os.getenv("SEAT_HOLD_SWEEP_BATCH", "1000"))
+
+# Franjas por función para el contador de disponibles y la versión del mapa
+SEAT_COUNTER_STRIPES = int(os.getenv("SEAT_COUNTER_STRIPES", "16"))
+
+# Tamaño de página del historial de boletos en modo cursor si no se indica limit
+DEFAULT_TICKETS_PAGE = int(os.getenv("TICKETS_PAGE_SIZE", "50"))
+
 def generate_ticket_code() -> str:
     """Generar código único para boleto"""
     return f"CINE-{uuid.uuid4().hex[:8].upper()}"
 
+@app.on_event("startup")
+async def apply_migrations():
+    """Aplicar migraciones de esquema pendientes (DB_AUTO_MIGRATE=true)"""
+    run_startup_migrations()
+
 @app.get("/health")
 async def health_check():
     """Verificar estado del servicio"""
@@ -41,6 +74,225 @@ async def health_check():
         logger.error(f"Health check failed: {e}")
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
+@app.get("/metrics/db")
+async def db_pool_metrics():
+    """Pool de conexiones: en uso/ociosas e histograma de espera"""
+    return db_manager.pool_metrics()
+
+def placeholders(count: int, group: str = "%s") -> str:
+    """Generar lista de placeholders para queries con IN o VALUES múltiples"""
+    return ", ".join([group] * count)
+
+def apply_seat_changes(tx, deltas: dict):
+    """Registrar cambios de asientos en las funciones afectadas
+
+    `deltas` asocia cada id_funcion con la variación de asientos
+    disponibles. Cada función suma la variación y un cambio de versión
+    (que el servicio de salas usa para refrescar su caché de mapas) en una
+    franja al azar de `funciones_contadores`, no en la fila de `funciones`:
+    las reservas concurrentes de una función casi nunca esperan por el
+    mismo lock. Todo en una sentencia.
+    """
+    ids = sorted(deltas)
+    if not ids:
+        return
+    
+    values = []
+    for id_funcion in ids:
+        values.extend([id_funcion, random.randrange(SEAT_COUNTER_STRIPES), deltas[id_funcion]])
+    tx.execute(
+        f"""INSERT INTO funciones_contadores (id_funcion, franja, delta_disponibles, version)
+            VALUES {placeholders(len(ids), "(%s, %s, %s, 1)")}
+            ON DUPLICATE KEY UPDATE
+                delta_disponibles = delta_disponibles + VALUES(delta_disponibles),
+                version = version + 1""",
+        tuple(values)
+    )
+
+def process_purchase(tx, purchase: PurchaseRequest) -> dict:
+    """Validar y registrar toda la compra dentro de una única transacción
+
+    Primero se validan todos los items (con los asientos y productos
+    bloqueados con FOR UPDATE) y luego se escriben en bloque. Si algo
+    falla, la transacción completa se revierte.
+    """
+    # Los items llegan como JSON libre: normalizar ids y cantidades a int para
+    # que la detección de repetidos y las búsquedas comparen con las claves de la BD
+    try:
+        ticket_items = [
+            {'id_funcion': int(item['id_funcion']), 'asiento': int(item['asiento'])}
+            for item in purchase.items if item.get('type') == 'ticket'
+        ]
+        product_items = [
+            {'id_producto': int(item['id_producto']), 'cantidad': int(item['cantidad'])}
+            for item in purchase.items if item.get('type') == 'product'
+        ]
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Items de compra inválidos")
+    if any(item['cantidad'] <= 0 for item in product_items):
+        raise HTTPException(status_code=400, detail="La cantidad debe ser mayor a cero")
+    
+    total_calculado = 0
+    funciones = {}
+    asientos = {}
+    productos = {}
+    
+    # Validar boletos
+    if ticket_items:
+        seat_keys = [(item['id_funcion'], item['asiento']) for item in ticket_items]
+        if len(set(seat_keys)) != len(seat_keys):
+            raise HTTPException(status_code=400, detail="Hay asientos repetidos en la compra")
+        
+        funcion_ids = sorted({id_funcion for id_funcion, _ in seat_keys})
+        rows = tx.execute(
+            f"""SELECT f.id_funcion, f.horario, f.precio, p.titulo, s.nombre as sala_nombre
+                FROM funciones f
+                JOIN peliculas p ON f.id_pelicula = p.id_pelicula
+                JOIN salas s ON f.id_sala = s.id_sala
+                WHERE f.id_funcion IN ({placeholders(len(funcion_ids))}) AND f.horario > NOW()""",
+            tuple(funcion_ids)
+        )
+        funciones = {row['id_funcion']: row for row in rows}
+        
+        for id_funcion in funcion_ids:
+            if id_funcion not in funciones:
+                raise HTTPException(status_code=404, detail=f"Función {id_funcion} no encontrada o ya pasó")
+        
+        # Bloquear los asientos solicitados que estén libres o reservados por el comprador
+        rows = tx.execute(
+            f"""SELECT id_asiento, id_funcion, numero_asiento, estado FROM asientos
+                WHERE (id_funcion, numero_asiento) IN ({placeholders(len(seat_keys), "(%s, %s)")})
+                AND (estado = 'disponible'
+                     OR (estado = 'reservado' AND (reservado_por = %s OR reservado_hasta < NOW())))
+                ORDER BY id_asiento
+                FOR UPDATE""",
+            tuple(value for key in seat_keys for value in key) + (purchase.id_usuario,)
+        )
+        asientos = {(row['id_funcion'], row['numero_asiento']): row for row in rows}
+        
+        for id_funcion, asiento in seat_keys:
+            if (id_funcion, asiento) not in asientos:
+                raise HTTPException(status_code=400, detail=f"Asiento {asiento} no disponible")
+        
+        total_calculado += sum(float(funciones[item['id_funcion']]['precio']) for item in ticket_items)
+    
+    # Validar productos (la cantidad se acumula si un producto aparece varias veces)
+    if product_items:
+        cantidades = {}
+        for item in product_items:
+            cantidades[item['id_producto']] = cantidades.get(item['id_producto'], 0) + item['cantidad']
+        
+        producto_ids = sorted(cantidades)
+        rows = tx.execute(
+            f"""SELECT id_producto, nombre, precio, stock FROM productos
+                WHERE id_producto IN ({placeholders(len(producto_ids))})
+                ORDER BY id_producto
+                FOR UPDATE""",
+            tuple(producto_ids)
+        )
+        productos = {row['id_producto']: row for row in rows}
+        
+        for id_producto in producto_ids:
+            if id_producto not in productos:
+                raise HTTPException(status_code=404, detail=f"Producto {id_producto} no encontrado")
+            if productos[id_producto]['stock'] < cantidades[id_producto]:
+                raise HTTPException(status_code=400, detail=f"Stock insuficiente para {productos[id_producto]['nombre']}")
+        
+        total_calculado += sum(
+            float(productos[item['id_producto']]['precio']) * item['cantidad'] for item in product_items
+        )
+    
+    # Verificar que el total coincide antes de escribir nada
+    if abs(total_calculado - purchase.total) > 0.01:
+        raise HTTPException(status_code=400, detail="El total no coincide con los items seleccionados")
+    
+    boletos_creados = []
+    productos_comprados = []
+    
+    if ticket_items:
+        # Ocupar asientos (convierte las reservas en venta)
+        seat_ids = [row['id_asiento'] for row in asientos.values()]
+        tx.execute(
+            f"""UPDATE asientos SET estado = 'ocupado', reservado_por = NULL, reservado_hasta = NULL
+                WHERE id_asiento IN ({placeholders(len(seat_ids))})""",
+            tuple(seat_ids)
+        )
+        
+        # Solo los asientos que estaban disponibles reducen el contador (los reservados ya lo hicieron)
+        deltas = {id_funcion: 0 for id_funcion in funciones}
+        for row in asientos.values():
+            if row['estado'] == 'disponible':
+                deltas[row['id_funcion']] -= 1
+        apply_seat_changes(tx, deltas)
+        
+        # Crear boletos con un solo INSERT (los ids son consecutivos)
+        codigos = [generate_ticket_code() for _ in ticket_items]
+        values = []
+        for item, codigo in zip(ticket_items, codigos):
+            values.extend([
+                purchase.id_usuario, item['id_funcion'], item['asiento'],
+                funciones[item['id_funcion']]['precio'], codigo
+            ])
+        first_id = tx.execute(
+            f"""INSERT INTO boletos (id_usuario, id_funcion, numero_asiento, precio, codigo_boleto)
+                VALUES {placeholders(len(ticket_items), "(%s, %s, %s, %s, %s)")}""",
+            tuple(values)
+        )
+        
+        for offset, (item, codigo) in enumerate(zip(ticket_items, codigos)):
+            funcion_data = funciones[item['id_funcion']]
+            boletos_creados.append({
+                'id_boleto': first_id + offset,
+                'codigo': codigo,
+                'pelicula': funcion_data['titulo'],
+                'sala': funcion_data['sala_nombre'],
+                'horario': funcion_data['horario'],
+                'asiento': item['asiento'],
+                'precio': float(funcion_data['precio'])
+            })
+    
+    if product_items:
+        # Descontar stock de todos los productos en una sola sentencia
+        case_params = []
+        for id_producto, cantidad in cantidades.items():
+            case_params.extend([id_producto, cantidad])
+        tx.execute(
+            f"""UPDATE productos
+                SET stock = stock - CASE id_producto {" ".join(["WHEN %s THEN %s"] * len(cantidades))} END
+                WHERE id_producto IN ({placeholders(len(cantidades))})""",
+            tuple(case_params) + tuple(cantidades)
+        )
+        
+        # Registrar ventas con un solo INSERT
+        values = []
+        for item in product_items:
+            precio = productos[item['id_producto']]['precio']
+            values.extend([
+                purchase.id_usuario, item['id_producto'], item['cantidad'],
+                precio, float(precio) * item['cantidad']
+            ])
+        first_id = tx.execute(
+            f"""INSERT INTO ventas_productos (id_usuario, id_producto, cantidad, precio_unitario, total)
+                VALUES {placeholders(len(product_items), "(%s, %s, %s, %s, %s)")}""",
+            tuple(values)
+        )
+        
+        for offset, item in enumerate(product_items):
+            producto_data = productos[item['id_producto']]
+            productos_comprados.append({
+                'id_venta': first_id + offset,
+                'producto': producto_data['nombre'],
+                'cantidad': item['cantidad'],
+                'precio_unitario': float(producto_data['precio']),
+                'total': float(producto_data['precio']) * item['cantidad']
+            })
+    
+    return {
+        "total": total_calculado,
+        "boletos": boletos_creados,
+        "productos": productos_comprados
+    }
+
 @app.post("/purchase", response_model=dict)
 async def purchase_tickets_and_products(
     purchase: PurchaseRequest,
@@ -52,126 +304,18 @@ async def purchase_tickets_and_products(
         if purchase.id_usuario != current_user['id_usuario']:
             raise HTTPException(status_code=403, detail="No puedes comprar para otro usuario")
         
-        total_calculado = 0
-        boletos_creados = []
-        productos_comprados = []
-        
-        # Procesar cada item
-        for item in purchase.items:
-            if item['type'] == 'ticket':
-                # Procesar boleto
-                id_funcion = item['id_funcion']
-                asiento = item['asiento']
-                
-                # Verificar que la función existe y está disponible
-                funcion = db_manager.execute_query(
-                    """SELECT f.*, p.titulo, s.nombre as sala_nombre
-                       FROM funciones f
-                       JOIN peliculas p ON f.id_pelicula = p.id_pelicula
-                       JOIN salas s ON f.id_sala = s.id_sala
-                       WHERE f.id_funcion = %s AND f.horario > NOW()""",
-                    (id_funcion,)
-                )
-                
-                if not funcion:
-                    raise HTTPException(status_code=404, detail=f"Función {id_funcion} no encontrada o ya pasó")
-                
-                funcion_data = funcion[0]
-                
-                # Verificar que el asiento está disponible
-                asiento_disponible = db_manager.execute_query(
-                    """SELECT id_asiento FROM asientos 
-                       WHERE id_funcion = %s AND numero_asiento = %s AND estado = 'disponible'""",
-                    (id_funcion, asiento)
-                )
-                
-                if not asiento_disponible:
-                    raise HTTPException(status_code=400, detail=f"Asiento {asiento} no disponible")
-                
-                # Reservar asiento
-                db_manager.execute_query(
-                    "UPDATE asientos SET estado = 'ocupado' WHERE id_asiento = %s",
-                    (asiento_disponible[0]['id_asiento'],),
-                    fetch=False
-                )
-                
-                # Crear boleto
-                codigo_boleto = generate_ticket_code()
-                boleto_id = db_manager.execute_query(
-                    """INSERT INTO boletos (id_usuario, id_funcion, numero_asiento, precio, codigo_boleto)
-                       VALUES (%s, %s, %s, %s, %s)""",
-                    (purchase.id_usuario, id_funcion, asiento, funcion_data['precio'], codigo_boleto),
-                    fetch=False
-                )
-                
-                boletos_creados.append({
-                    'id_boleto': boleto_id,
-                    'codigo': codigo_boleto,
-                    'pelicula': funcion_data['titulo'],
-                    'sala': funcion_data['sala_nombre'],
-                    'horario': funcion_data['horario'],
-                    'asiento': asiento,
-                    'precio': float(funcion_data['precio'])
-                })
-                
-                total_calculado += float(funcion_data['precio'])
-                
-            elif item['type'] == 'product':
-                # Procesar producto
-                id_producto = item['id_producto']
-                cantidad = item['cantidad']
-                
-                # Verificar que el producto existe y hay stock
-                producto = db_manager.execute_query(
-                    "SELECT * FROM productos WHERE id_producto = %s",
-                    (id_producto,)
-                )
-                
-                if not producto:
-                    raise HTTPException(status_code=404, detail=f"Producto {id_producto} no encontrado")
-                
-                producto_data = producto[0]
-                
-                if producto_data['stock'] < cantidad:
-                    raise HTTPException(status_code=400, detail=f"Stock insuficiente para {producto_data['nombre']}")
-                
-                # Actualizar stock
-                db_manager.execute_query(
-                    "UPDATE productos SET stock = stock - %s WHERE id_producto = %s",
-                    (cantidad, id_producto),
-                    fetch=False
-                )
-                
-                # Registrar venta
-                total_producto = float(producto_data['precio']) * cantidad
-                venta_id = db_manager.execute_query(
-                    """INSERT INTO ventas_productos (id_usuario, id_producto, cantidad, precio_unitario, total)
-                       VALUES (%s, %s, %s, %s, %s)""",
-                    (purchase.id_usuario, id_producto, cantidad, producto_data['precio'], total_producto),
-                    fetch=False
-                )
-                
-                productos_comprados.append({
-                    'id_venta': venta_id,
-                    'producto': producto_data['nombre'],
-                    'cantidad': cantidad,
-                    'precio_unitario': float(producto_data['precio']),
-                    'total': total_producto
-                })
-                
-                total_calculado += total_producto
-        
-        # Verificar que el total coincide
-        if abs(total_calculado - purchase.total) > 0.01:
-            raise HTTPException(status_code=400, detail="El total no coincide con los items seleccionados")
-        
-        logger.info(f"Compra realizada por usuario {purchase.id_usuario}: ${total_calculado}")
+        result = await async_db_manager.run_in_transaction(process_purchase, purchase)
+        
+        # El stock cambió: con un backend compartido (Redis) se invalida el
+        # listado de productos del servicio de productos
+        if any(item.get('type') == 'product' for item in purchase.items):
+            await response_cache.invalidate("productos:lista")
+        
+        logger.info(f"Compra realizada por usuario {purchase.id_usuario}: ${result['total']}")
         
         return {
             "message": "Compra realizada exitosamente",
-            "total": total_calculado,
-            "boletos": boletos_creados,
-            "productos": productos_comprados
+            **result
         }
         
     except HTTPException:
@@ -180,13 +324,192 @@ async def purchase_tickets_and_products(
         logger.error(f"Error procesando compra: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+def hold_seats(tx, hold: SeatHoldRequest, user_id: int) -> dict:
+    """Reservar asientos de forma atómica
+
+    Los asientos se bloquean con SELECT ... FOR UPDATE y se actualizan con
+    un solo UPDATE por id. Solo se toman asientos disponibles, con reserva
+    vencida o ya reservados por el mismo usuario (en cuyo caso se renueva la
+    expiración). Si no se pueden tomar todos, la transacción se revierte y
+    no queda nada reservado.
+    """
+    funcion = tx.execute(
+        "SELECT id_funcion FROM funciones WHERE id_funcion = %s AND horario > NOW()",
+        (hold.id_funcion,)
+    )
+    if not funcion:
+        raise HTTPException(status_code=404, detail=f"Función {hold.id_funcion} no encontrada o ya pasó")
+    
+    # Bloquear los asientos que se pueden tomar y contarlos aquí: el rowcount
+    # de un UPDATE cuenta filas modificadas, y renovar una reserva propia en el
+    # mismo segundo no modifica nada aunque la fila coincida
+    rows = tx.execute(
+        f"""SELECT id_asiento, estado FROM asientos
+            WHERE id_funcion = %s
+            AND numero_asiento IN ({placeholders(len(hold.asientos))})
+            AND (estado = 'disponible'
+                 OR (estado = 'reservado' AND (reservado_por = %s OR reservado_hasta < NOW())))
+            ORDER BY id_asiento
+            FOR UPDATE""",
+        (hold.id_funcion, *hold.asientos, user_id)
+    )
+    if len(rows) != len(hold.asientos):
+        raise HTTPException(status_code=409, detail="Uno o más asientos ya no están disponibles")
+    
+    # Solo los que estaban libres salen del contador de disponibles; las
+    # reservas propias o vencidas ya se descontaron al tomarlas
+    taken_free = sum(1 for row in rows if row['estado'] == 'disponible')
+    seat_ids = [row['id_asiento'] for row in rows]
+    tx.execute(
+        f"""UPDATE asientos
+            SET estado = 'reservado', reservado_por = %s,
+                reservado_hasta = NOW() + INTERVAL %s SECOND
+            WHERE id_asiento IN ({placeholders(len(seat_ids))})""",
+        (user_id, HOLD_TTL_SECONDS, *seat_ids)
+    )
+    apply_seat_changes(tx, {hold.id_funcion: -taken_free})
+    
+    expira = tx.execute(
+        f"""SELECT MAX(reservado_hasta) as expira FROM asientos
+            WHERE id_funcion = %s AND numero_asiento IN ({placeholders(len(hold.asientos))})""",
+        (hold.id_funcion, *hold.asientos)
+    )
+    
+    return {
+        "id_funcion": hold.id_funcion,
+        "asientos": hold.asientos,
+        "expira": expira[0]['expira']
+    }
+
+def sweep_expired_holds(tx, batch_size: int) -> int:
+    """Liberar un lote de reservas vencidas
+
+    Usa SKIP LOCKED para no esperar por filas que otra transacción está
+    reservando o comprando en ese momento.
+    """
+    expired = tx.execute(
+        """SELECT id_asiento, id_funcion FROM asientos
+           WHERE estado = 'reservado' AND reservado_hasta < NOW()
+           LIMIT %s
+           FOR UPDATE SKIP LOCKED""",
+        (batch_size,)
+    )
+    if not expired:
+        return 0
+    
+    seat_ids = [row['id_asiento'] for row in expired]
+    released = tx.execute(
+        f"""UPDATE asientos SET estado = 'disponible', reservado_por = NULL, reservado_hasta = NULL
+            WHERE id_asiento IN ({placeholders(len(seat_ids))})""",
+        tuple(seat_ids)
+    )
+    deltas = {}
+    for row in expired:
+        deltas[row['id_funcion']] = deltas.get(row['id_funcion'], 0) + 1
+    apply_seat_changes(tx, deltas)
+    return released
+
+def release_seats(tx, hold: SeatHoldRequest, user_id: int) -> int:
+    """Liberar asientos reservados por un usuario"""
+    released = tx.execute(
+        f"""UPDATE asientos SET estado = 'disponible', reservado_por = NULL, reservado_hasta = NULL
+            WHERE id_funcion = %s
+            AND numero_asiento IN ({placeholders(len(hold.asientos))})
+            AND estado = 'reservado' AND reservado_por = %s""",
+        (hold.id_funcion, *hold.asientos, user_id)
+    )
+    if released:
+        apply_seat_changes(tx, {hold.id_funcion: released})
+    return released
+
+async def release_expired_holds() -> int:
+    """Liberar todas las reservas vencidas por lotes"""
+    total = 0
+    while True:
+        released = await async_db_manager.run_in_transaction(sweep_expired_holds, HOLD_SWEEP_BATCH)
+        total += released
+        if released < HOLD_SWEEP_BATCH:
+            return total
+
+async def hold_sweeper():
+    """Tarea periódica que libera reservas vencidas"""
+    while True:
+        await asyncio.sleep(HOLD_SWEEP_INTERVAL)
+        try:
+            released = await release_expired_holds()
+            if released:
+                logger.info(f"Reservas vencidas liberadas: {released}")
+        except Exception as e:
+            logger.error(f"Error liberando reservas vencidas: {e}")
+
+@app.on_event("startup")
+async def start_hold_sweeper():
+    """Iniciar el liberador de reservas vencidas"""
+    app.state.hold_sweeper = asyncio.create_task(hold_sweeper())
+
+@app.on_event("shutdown")
+async def stop_hold_sweeper():
+    """Detener el liberador de reservas vencidas"""
+    app.state.hold_sweeper.cancel()
+
+@app.post("/holds", response_model=dict)
+async def create_hold(hold: SeatHoldRequest, current_user: dict = Depends(get_current_user)):
+    """Reservar asientos temporalmente mientras se completa la compra"""
+    try:
+        result = await async_db_manager.run_in_transaction(hold_seats, hold, current_user['id_usuario'])
+        
+        logger.info(f"Asientos reservados por usuario {current_user['id_usuario']}: función {hold.id_funcion} {hold.asientos}")
+        return {
+            "message": "Asientos reservados",
+            "ttl_segundos": HOLD_TTL_SECONDS,
+            **result
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error reservando asientos: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
+@app.post("/holds/release", response_model=dict)
+async def release_hold(hold: SeatHoldRequest, current_user: dict = Depends(get_current_user)):
+    """Liberar asientos reservados por el usuario actual"""
+    try:
+        released = await async_db_manager.run_in_transaction(release_seats, hold, current_user['id_usuario'])
+        
+        return {"message": "Reserva liberada", "liberados": released}
+        
+    except Exception as e:
+        logger.error(f"Error liberando reserva: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
+@app.post("/holds/sweep", response_model=dict)
+async def sweep_holds(current_user: dict = Depends(require_admin)):
+    """Liberar inmediatamente todas las reservas vencidas (solo admin)"""
+    try:
+        released = await release_expired_holds()
+        return {"message": "Reservas vencidas liberadas", "liberados": released}
+    except Exception as e:
+        logger.error(f"Error liberando reservas vencidas: {e}")
+        raise HTTPException(status_code=500, detail="Error interno del servidor")
+
 @app.get("/user/{user_id}", response_model=List[TicketResponse])
 async def get_user_tickets(
     user_id: int,
+    response: Response,
     current_user: dict = Depends(get_current_user),
-    estado: Optional[str] = None
+    estado: Optional[str] = None,
+    skip: int = 0,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
 ):
-    """Obtener boletos de un usuario"""
+    """Obtener boletos de un usuario
+
+    Sin `limit` ni `cursor` devuelve todos, como antes. Con `cursor` (vacío
+    para la primera página) se pagina por (horario, id de boleto), en el
+    mismo orden que con `limit`/`skip`; la siguiente página se indica en la
+    cabecera X-Next-Cursor.
+    """
     try:
         # Verificar permisos
         if current_user['id_usuario'] != user_id and current_user['rol'] != 'admin':
@@ -209,9 +532,24 @@ async def get_user_tickets(
             base_query += " AND b.estado = %s"
             params.append(estado)
         
-        base_query += " ORDER BY f.horario DESC"
+        if cursor is not None:
+            limit = limit or DEFAULT_TICKETS_PAGE
+            after = decode_cursor(cursor, "boletos", 2)
+            if after is not None:
+                condition, condition_params = keyset_condition(["f.horario", "b.id_boleto"], after, descending=True)
+                base_query += " AND " + condition
+                params.extend(condition_params)
+            base_query += " ORDER BY f.horario DESC, b.id_boleto DESC LIMIT %s"
+            params.append(limit)
+        elif limit is not None:
+            base_query += " ORDER BY f.horario DESC, b.id_boleto DESC LIMIT %s OFFSET %s"
+            params.extend([limit, skip])
+        else:
+            base_query += " ORDER BY f.horario DESC"
         
         tickets = db_manager.execute_query(base_query, tuple(params))
+        if cursor is not None:
+            set_next_cursor(response, "boletos", tickets, ["horario", "id_boleto"], limit)
         return tickets
         
     except HTTPException:
@@ -253,6 +591,28 @@ async def get_ticket(ticket_id: int, current_user: dict = Depends(get_current_us
         logger.error(f"Error obteniendo boleto: {e}")
         raise HTTPException(status_code=500, detail="Error interno del servidor")
 
+def cancel_ticket_seat(tx, ticket_data: dict):
+    """Cancelar boleto, liberar su asiento y crear la devolución"""
+    affected = tx.execute(
+        "UPDATE boletos SET estado = 'cancelado' WHERE id_boleto = %s AND estado = 'activo'",
+        (ticket_data['id_boleto'],)
+    )
+    if affected == 0:
+        raise HTTPException(status_code=400, detail="El boleto ya está cancelado o usado")
+    
+    released = tx.execute(
+        """UPDATE asientos SET estado = 'disponible'
+           WHERE id_funcion = %s AND numero_asiento = %s AND estado <> 'disponible'""",
+        (ticket_data['id_funcion'], ticket_data['numero_asiento'])
+    )
+    apply_seat_changes(tx, {ticket_data['id_funcion']: released})
+    
+    tx.execute(
+        """INSERT INTO devoluciones (id_boleto, motivo, estado)
+           VALUES (%s, 'Cancelación por usuario', 'aprobada')""",
+        (ticket_data['id_boleto'],)
+    )
+
 @app.post("/{ticket_id}/cancel")
 async def cancel_ticket(ticket_id: int, current_user: dict = Depends(get_current_user)):
     """Cancelar boleto"""
@@ -288,28 +648,8 @@ async def cancel_ticket(ticket_id: int, current_user: dict = Depends(get_current
         if datetime.now() > tiempo_limite:
             raise HTTPException(status_code=400, detail="No se puede cancelar con menos de 2 horas de anticipación")
         
-        # Cancelar boleto
-        db_manager.execute_query(
-            "UPDATE boletos SET estado = 'cancelado' WHERE id_boleto = %s",
-            (ticket_id,),
-            fetch=False
-        )
-        
-        # Liberar asiento
-        db_manager.execute_query(
-            """UPDATE asientos SET estado = 'disponible' 
-               WHERE id_funcion = %s AND numero_asiento = %s""",
-            (ticket_data['id_funcion'], ticket_data['numero_asiento']),
-            fetch=False
-        )
-        
-        # Crear solicitud de devolución
-        db_manager.execute_query(
-            """INSERT INTO devoluciones (id_boleto, motivo, estado)
-               VALUES (%s, 'Cancelación por usuario', 'aprobada')""",
-            (ticket_id,),
-            fetch=False
-        )
+        # Cancelar boleto, liberar asiento y registrar devolución en una transacción
+        await async_db_manager.run_in_transaction(cancel_ticket_seat, ticket_data)
         
         logger.info(f"Boleto cancelado: {ticket_id}")
         return {"message": "Boleto cancelado exitosamente"}
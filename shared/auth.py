@@ -1,15 +1,30 @@
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
-from fastapi import HTTPException, Depends
+from fastapi import HTTPException, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from collections import OrderedDict
+import base64
+import hashlib
+import hmac
+import json
 import os
-from typing import Optional
+import time
+from typing import Dict, Optional
 
 # Configuración JWT
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "cinemagic-secret-key-2024")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Tokens ya verificados que se recuerdan por proceso (0 desactiva la caché)
+TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+
+# Identidad firmada por el gateway: si está configurado el secreto, el
+# gateway verifica el token una vez y los servicios solo comprueban un HMAC
+IDENTITY_SECRET = os.getenv("AUTH_IDENTITY_SECRET", "").encode("utf-8")
+IDENTITY_HEADER = "X-Auth-Identity"
+IDENTITY_SIGNATURE_HEADER = "X-Auth-Signature"
+
 security = HTTPBearer()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -24,24 +39,122 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Verificar token JWT"""
-    try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Token inválido")
+def token_digest(token: str) -> bytes:
+    """SHA-256 del token: clave de la caché (no se guarda el token en sí)"""
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+class TokenCache:
+    """LRU acotada de claims ya verificados, indexada por el digest del token
+
+    Un token alterado tiene otro digest, así que nunca coincide con una
+    entrada verificada. Cada entrada vence con el `exp` del token; los
+    tokens sin `exp` no se guardan.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: bytes) -> Optional[dict]:
+        entry = self.entries.get(digest)
+        if entry is None:
+            self.misses += 1
+            return None
+        payload, expires_at = entry
+        if expires_at <= time.time():
+            self.entries.pop(digest, None)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(digest)
+        self.hits += 1
         return payload
+
+    def put(self, digest: bytes, payload: dict):
+        expires_at = payload.get("exp")
+        if self.max_entries <= 0 or not isinstance(expires_at, (int, float)):
+            return
+        self.entries[digest] = (payload, expires_at)
+        self.entries.move_to_end(digest)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None
+        }
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+def decode_token(token: str, digest: Optional[bytes] = None) -> dict:
+    """Claims de un token válido (desde la caché si ya se verificó)"""
+    digest = digest or token_digest(token)
+    payload = token_cache.get(digest)
+    if payload is not None:
+        return dict(payload)
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         raise HTTPException(status_code=401, detail="Token inválido")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Token inválido")
+    token_cache.put(digest, payload)
+    return dict(payload)
+
+def _identity_signature(identity: str, digest: bytes) -> str:
+    # La firma incluye el digest del token: la identidad no sirve con otro token
+    return hmac.new(IDENTITY_SECRET, identity.encode("ascii") + b"." + digest, hashlib.sha256).hexdigest()
+
+def sign_identity(payload: dict, token: str) -> Dict[str, str]:
+    """Cabeceras de identidad que el gateway agrega a la petición reenviada"""
+    identity = base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8")).decode("ascii")
+    return {
+        IDENTITY_HEADER: identity,
+        IDENTITY_SIGNATURE_HEADER: _identity_signature(identity, token_digest(token))
+    }
+
+def read_identity(identity: str, signature: str, digest: bytes) -> Optional[dict]:
+    """Claims de la identidad firmada por el gateway; None si no es válida"""
+    try:
+        expected = _identity_signature(identity, digest)
+        if not hmac.compare_digest(expected, signature):
+            return None
+        payload = json.loads(base64.urlsafe_b64decode(identity))
+    except (ValueError, UnicodeError):
+        return None
+    if payload.get("sub") is None or payload.get("exp", 0) <= time.time():
+        return None
+    return payload
+
+async def verify_token(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Verificar token JWT
+
+    Es async para no pasar por el pool de hilos en cada petición; el trabajo
+    es corto (una búsqueda en la caché o un HMAC por petición).
+    """
+    token = credentials.credentials
+    digest = token_digest(token)
+    if IDENTITY_SECRET:
+        identity = request.headers.get(IDENTITY_HEADER)
+        if identity:
+            payload = read_identity(identity, request.headers.get(IDENTITY_SIGNATURE_HEADER, ""), digest)
+            if payload is not None:
+                return payload
+    return decode_token(token, digest)
 
-def require_admin(token_data: dict = Depends(verify_token)):
+async def require_admin(token_data: dict = Depends(verify_token)):
     """Verificar que el usuario sea administrador"""
     if token_data.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Acceso denegado: se requieren permisos de administrador")
     return token_data
 
-def get_current_user(token_data: dict = Depends(verify_token)):
+async def get_current_user(token_data: dict = Depends(verify_token)):
     """Obtener usuario actual del token"""
     return {
         "id_usuario": token_data.get("sub"),
@@ -0,0 +1,254 @@
+"""Caché de lectura para respuestas de catálogo
+
+`ResponseCache.get_or_load` devuelve el valor guardado o lo carga con la
+función indicada y lo guarda con sus etiquetas. Los handlers de escritura
+invalidan por etiqueta (por ejemplo "peliculas:lista" o "pelicula:12").
+
+Backends (CACHE_BACKEND):
+    memory  LRU + TTL en el proceso (por defecto)
+    redis   servidor compatible con Redis en CACHE_REDIS_URL; compartido
+            entre réplicas y servicios. Requiere el paquete `redis`.
+    none    sin caché
+"""
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'memory').lower()
+CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', '300'))
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '1024'))
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_PREFIX = os.getenv('CACHE_PREFIX', 'cine')
+
+class MemoryBackend:
+    """LRU con expiración por entrada, local al proceso"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: OrderedDict = OrderedDict()  # key -> (expira, valor, etiquetas)
+        self.tags: Dict[str, Set[str]] = {}
+        self.lock = threading.Lock()
+
+    async def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._drop(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    async def set(self, key: str, value: Any, ttl: int, tags: Iterable[str]):
+        tags = set(tags)
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self.tags.setdefault(tag, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        with self.lock:
+            for tag in tags:
+                for key in self.tags.pop(tag, set()):
+                    if key in self.entries:
+                        self._drop(key)
+                        removed += 1
+        return removed
+
+    async def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tags.clear()
+
+    def size(self) -> int:
+        return len(self.entries)
+
+    def _drop(self, key: str):
+        _, _, tags = self.entries.pop(key)
+        for tag in tags:
+            keys = self.tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tags[tag]
+
+def _json_default(value):
+    """Serializar tipos de MySQL que json no conoce"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+class RedisBackend:
+    """Backend sobre un servidor compatible con Redis
+
+    Los valores se guardan como JSON; cada etiqueta es un set con las claves
+    que la usan y se renueva con cada entrada que se agrega.
+    """
+
+    name = 'redis'
+
+    def __init__(self, url: str, prefix: str):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}:tag:{tag}"
+
+    async def get(self, key: str):
+        raw = await self.client.get(f"{self.prefix}:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: int, tags: Iterable[str]):
+        full_key = f"{self.prefix}:{key}"
+        pipe = self.client.pipeline()
+        pipe.set(full_key, json.dumps(value, default=_json_default), ex=ttl)
+        for tag in tags:
+            pipe.sadd(self._tag_key(tag), full_key)
+            pipe.expire(self._tag_key(tag), ttl)
+        await pipe.execute()
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        removed = 0
+        for tag in tags:
+            tag_key = self._tag_key(tag)
+            keys = await self.client.smembers(tag_key)
+            if keys:
+                removed += await self.client.delete(*keys)
+            await self.client.delete(tag_key)
+        return removed
+
+    async def clear(self):
+        async for key in self.client.scan_iter(match=f"{self.prefix}:*"):
+            await self.client.delete(key)
+
+    def size(self) -> Optional[int]:
+        return None
+
+class ResponseCache:
+    """Caché de lectura con invalidación por etiquetas y métricas"""
+
+    def __init__(self, backend, default_ttl: int = CACHE_TTL_SECONDS):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.invalidations = 0
+        # Contador de invalidaciones por etiqueta (local al proceso)
+        self.versions: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def get_or_load(self, key: str, loader: Callable, tags: Iterable[str] = (),
+                          ttl: Optional[int] = None):
+        """Devolver el valor de `key` o cargarlo con `loader` y guardarlo
+
+        `loader` puede ser síncrona o asíncrona. Si el backend falla se
+        responde directamente desde `loader`.
+        """
+        if not self.enabled:
+            return await self._load(loader)
+
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Error leyendo caché ({key}): {e}")
+            return await self._load(loader)
+
+        if value is not None:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = await self._load(loader)
+        try:
+            await self.backend.set(key, value, ttl or self.default_ttl, tags)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Error guardando en caché ({key}): {e}")
+        return value
+
+    async def invalidate(self, *tags: str) -> int:
+        """Eliminar las entradas asociadas a cualquiera de las etiquetas"""
+        for tag in tags:
+            self.versions[tag] = self.versions.get(tag, 0) + 1
+        if not self.enabled:
+            return 0
+        try:
+            removed = await self.backend.invalidate_tags(tags)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Error invalidando caché ({', '.join(tags)}): {e}")
+            return 0
+        self.invalidations += 1
+        return removed
+
+    def tag_versions(self, tags: Iterable[str]) -> tuple:
+        """Versión actual de cada etiqueta; cambia con cada invalidación"""
+        return tuple(self.versions.get(tag, 0) for tag in tags)
+
+    async def clear(self):
+        """Vaciar la caché"""
+        if self.enabled:
+            await self.backend.clear()
+
+    def metrics(self) -> dict:
+        """Aciertos, fallos y tamaño de la caché"""
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.enabled else "none",
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            "errors": self.errors,
+            "invalidations": self.invalidations,
+            "entries": self.backend.size() if self.enabled else 0
+        }
+
+    @staticmethod
+    async def _load(loader: Callable):
+        value = loader()
+        if inspect.isawaitable(value):
+            value = await value
+        return value
+
+def cache_key(*parts) -> str:
+    """Clave de caché a partir de sus partes (None se omite)"""
+    return ":".join(str(part) for part in parts if part is not None)
+
+def build_cache() -> ResponseCache:
+    """Crear la caché según CACHE_BACKEND"""
+    if CACHE_BACKEND == 'none':
+        return ResponseCache(None)
+    if CACHE_BACKEND == 'redis':
+        try:
+            return ResponseCache(RedisBackend(CACHE_REDIS_URL, CACHE_PREFIX))
+        except ImportError:
+            logger.warning("Paquete redis no instalado; se usa la caché en memoria")
+    return ResponseCache(MemoryBackend(CACHE_MAX_ENTRIES))
+
+response_cache = build_cache()
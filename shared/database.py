@@ -1,14 +1,58 @@
 import mysql.connector
-from mysql.connector import pooling
 import os
 from typing import Optional, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
+import functools
 import logging
 import time
 
+from shared.db_pool import ConnectionPool
+
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Reintentos al esperar que MySQL acepte conexiones durante el arranque
+DB_CONNECT_RETRIES = int(os.getenv('DB_CONNECT_RETRIES', '8'))
+DB_CONNECT_RETRY_DELAY = float(os.getenv('DB_CONNECT_RETRY_DELAY', '1'))
+DB_CONNECT_RETRY_MAX_DELAY = float(os.getenv('DB_CONNECT_RETRY_MAX_DELAY', '30'))
+
+class Transaction:
+    """Unidad de trabajo sobre una única conexión
+
+    Todas las queries se ejecutan en la misma conexión y se confirman juntas
+    al salir de `DatabaseManager.transaction()`.
+    """
+    
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.cursor(dictionary=True)
+    
+    def execute(self, query: str, params: tuple = None):
+        """Ejecutar query dentro de la transacción (sin commit)
+
+        Devuelve las filas para SELECT, el id insertado para INSERT y el
+        número de filas afectadas para el resto.
+        """
+        query_type = query.strip().upper().split()[0]
+        self.cursor.execute(query, params or ())
+        
+        if query_type == 'SELECT':
+            return self.cursor.fetchall()
+        if query_type == 'INSERT':
+            return self.cursor.lastrowid
+        return self.cursor.rowcount
+    
+    def execute_many(self, query: str, params_list: list):
+        """Ejecutar la misma query con varios juegos de parámetros (sin commit)"""
+        self.cursor.executemany(query, params_list)
+        return self.cursor.rowcount
+    
+    def close(self):
+        self.cursor.close()
+
 class DatabaseManager:
     """Gestor de conexiones a la base de datos con pool de conexiones"""
     
@@ -21,33 +65,61 @@ class DatabaseManager:
             'charset': 'utf8mb4',
             'collation': 'utf8mb4_unicode_ci',
             'autocommit': False,
-            'pool_name': 'cine_pool',
-            'pool_size': 10,
-            'pool_reset_session': True
+            'connection_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5'))
         }
 
-        retries = 5
-        delay = 5
-        for i in range(retries):
-            try:
-                self.pool = mysql.connector.pooling.MySQLConnectionPool(**self.config)
-                logger.info("Pool de conexiones creado exitosamente")
-                return
-            except mysql.connector.Error as err:
-                logger.error(f"Error al crear pool de conexiones: {err}. Reintentando en {delay} segundos... (Intento {i+1}/{retries})")
-                time.sleep(delay)
-        
-        logger.critical("No se pudo conectar a la base de datos después de varios intentos.")
-        raise Exception("Fallo al conectar con la base de datos.")
+        # No se conecta aquí: el pool abre el mínimo en segundo plano y bajo
+        # demanda, así importar el módulo no bloquea si MySQL aún no responde
+        self.pool = ConnectionPool(
+            lambda: mysql.connector.connect(**self.config),
+            min_size=int(os.getenv('DB_POOL_MIN', '2')),
+            max_size=int(os.getenv('DB_POOL_MAX', '10')),
+            timeout=float(os.getenv('DB_POOL_TIMEOUT', '5')),
+            recycle=float(os.getenv('DB_POOL_RECYCLE', '1800')),
+            idle_timeout=float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300')),
+            ping_interval=float(os.getenv('DB_POOL_PING_INTERVAL', '30')),
+            reset_session=os.getenv('DB_POOL_RESET_SESSION', 'true').lower() == 'true',
+            name='cine_pool'
+        )
+        self.pool.start()
+        logger.info(
+            f"Pool de conexiones creado ({self.pool.min_size}-{self.pool.max_size} conexiones)"
+        )
     
     def get_connection(self):
-        """Obtener conexión del pool"""
+        """Obtener conexión del pool (espera hasta DB_POOL_TIMEOUT si está agotado)"""
         try:
             return self.pool.get_connection()
         except mysql.connector.Error as err:
             logger.error(f"Error al obtener conexión: {err}")
             raise
     
+    def wait_until_ready(self, retries: int = DB_CONNECT_RETRIES, delay: float = DB_CONNECT_RETRY_DELAY):
+        """Esperar a que MySQL responda, con reintentos y espera creciente
+
+        Para el arranque de los servicios: el contenedor de MySQL puede
+        tardar en aceptar conexiones aunque ya figure como iniciado.
+        """
+        for attempt in range(1, retries + 1):
+            try:
+                connection = self.get_connection()
+                connection.close()
+                return
+            except mysql.connector.Error as err:
+                if attempt == retries:
+                    logger.critical("No se pudo conectar a la base de datos después de varios intentos.")
+                    raise
+                logger.error(
+                    f"Base de datos no disponible: {err}. Reintentando en {delay:g} segundos... "
+                    f"(Intento {attempt}/{retries})"
+                )
+                time.sleep(delay)
+                delay = min(delay * 2, DB_CONNECT_RETRY_MAX_DELAY)
+    
+    def pool_metrics(self) -> dict:
+        """Conexiones en uso/ociosas e histograma de espera del pool"""
+        return self.pool.metrics()
+    
     def execute_query(self, query: str, params: tuple = None, fetch: bool = True):
         """Ejecutar query con manejo de errores"""
         connection = None
@@ -102,5 +174,67 @@ class DatabaseManager:
             if connection:
                 connection.close()
 
+    @contextmanager
+    def transaction(self):
+        """Abrir una transacción con una sola conexión del pool
+
+        Se hace commit al salir del bloque y rollback si ocurre cualquier
+        excepción.
+        """
+        connection = self.get_connection()
+        tx = Transaction(connection)
+        try:
+            yield tx
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            tx.close()
+            connection.close()
+    
+    def run_in_transaction(self, func, *args, **kwargs):
+        """Ejecutar `func(tx, *args, **kwargs)` dentro de una transacción"""
+        with self.transaction() as tx:
+            return func(tx, *args, **kwargs)
+
+class AsyncDatabaseManager:
+    """Gestor asíncrono que ejecuta las queries en un pool de hilos acotado
+
+    Expone la misma interfaz que DatabaseManager pero con corutinas, para que
+    los endpoints `async def` no bloqueen el event loop mientras MySQL responde.
+    El número de hilos es igual al tamaño del pool de conexiones, de modo que
+    las peticiones que excedan la capacidad esperan turno en lugar de fallar
+    por pool agotado.
+    """
+    
+    def __init__(self, manager: DatabaseManager, max_workers: Optional[int] = None):
+        self.manager = manager
+        self.max_workers = max_workers or manager.pool.max_size
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='db'
+        )
+    
+    async def run(self, func, *args, **kwargs):
+        """Ejecutar una función bloqueante en el pool de hilos"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+    
+    async def execute_query(self, query: str, params: tuple = None, fetch: bool = True):
+        """Ejecutar query sin bloquear el event loop"""
+        return await self.run(self.manager.execute_query, query, params, fetch)
+    
+    async def execute_many(self, query: str, params_list: list):
+        """Ejecutar múltiples queries en una transacción sin bloquear el event loop"""
+        return await self.run(self.manager.execute_many, query, params_list)
+
+    async def run_in_transaction(self, func, *args, **kwargs):
+        """Ejecutar `func(tx, *args, **kwargs)` en una transacción sin bloquear el event loop"""
+        return await self.run(self.manager.run_in_transaction, func, *args, **kwargs)
+
 # Instancia global del gestor de base de datos
 db_manager = DatabaseManager()
+
+# Instancia global del gestor asíncrono (comparte el pool de conexiones)
+async_db_manager = AsyncDatabaseManager(db_manager)
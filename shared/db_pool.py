@@ -0,0 +1,316 @@
+"""Pool de conexiones MySQL con tamaño adaptable, espera acotada y métricas
+
+Reemplaza a `MySQLConnectionPool` (tamaño fijo, falla de inmediato al
+agotarse y exige conectar al crearse):
+
+- Entre `min_size` y `max_size` conexiones: se abren bajo demanda y las
+  que quedan ociosas más de `idle_timeout` se cierran hasta volver a
+  `min_size`.
+- Si están todas en uso, `get_connection` espera hasta `timeout` segundos
+  a que se libere una antes de lanzar `PoolError`.
+- Un hilo de mantenimiento hace ping a las ociosas, descarta las caídas,
+  recicla las que superan `recycle` segundos de vida y repone el mínimo.
+  Crear el pool no conecta: el servicio arranca aunque MySQL tarde.
+- Métricas: conexiones en uso/ociosas/esperando e histograma del tiempo de
+  espera al pedir una conexión.
+
+Las conexiones se entregan envueltas: `close()` las devuelve al pool
+(con rollback de lo no confirmado y, si se pide, reset de la sesión).
+"""
+import bisect
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from mysql.connector import errors
+
+logger = logging.getLogger(__name__)
+
+# Límites superiores (ms) de los buckets del histograma de espera
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class PoolEntry:
+    __slots__ = ('connection', 'created_at', 'last_used')
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+class PooledConnection:
+    """Conexión prestada por el pool; `close()` la devuelve"""
+
+    def __init__(self, pool: "ConnectionPool", entry: PoolEntry):
+        self._pool = pool
+        self._entry = entry
+
+    def __getattr__(self, name):
+        if self._entry is None:
+            raise errors.InterfaceError("La conexión ya fue devuelta al pool")
+        return getattr(self._entry.connection, name)
+
+    def close(self):
+        if self._entry is not None:
+            entry, self._entry = self._entry, None
+            self._pool.release(entry)
+
+class ConnectionPool:
+    """Pool acotado y seguro entre hilos sobre una función `connect()`"""
+
+    def __init__(self, connect: Callable, min_size: int, max_size: int, timeout: float,
+                 recycle: float, idle_timeout: float, ping_interval: float,
+                 reset_session: bool = True, name: str = 'cine_pool'):
+        self.connect = connect
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.idle_timeout = idle_timeout
+        self.ping_interval = ping_interval
+        self.reset_session = reset_session
+        self.name = name
+
+        self.condition = threading.Condition()
+        # Ociosas: se toma la más reciente (derecha) y las viejas quedan a la izquierda
+        self.idle: deque = deque()
+        self.in_use = 0
+        self.opening = 0
+        self.checking = 0
+        self.waiting = 0
+
+        self.checkouts = 0
+        self.timeouts = 0
+        self.opened = 0
+        self.closed = 0
+        self.recycled = 0
+        self.ping_failures = 0
+        self.connect_errors = 0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_sum_ms = 0.0
+        self.wait_max_ms = 0.0
+
+        self.stopped = threading.Event()
+        self.maintainer: Optional[threading.Thread] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.idle) + self.in_use + self.opening + self.checking
+
+    def start(self):
+        """Iniciar el hilo de mantenimiento (abre el mínimo en segundo plano)"""
+        if self.maintainer is None:
+            self.maintainer = threading.Thread(target=self._maintain_loop, name=f"{self.name}-maintainer", daemon=True)
+            self.maintainer.start()
+
+    def stop(self):
+        self.stopped.set()
+        with self.condition:
+            entries = list(self.idle)
+            self.idle.clear()
+        for entry in entries:
+            self._close(entry)
+
+    def get_connection(self) -> PooledConnection:
+        """Conexión del pool; espera hasta `timeout` si están todas en uso"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        entry = None
+        with self.condition:
+            self.waiting += 1
+            try:
+                while True:
+                    if self.idle:
+                        entry = self.idle.pop()
+                        break
+                    if self.size < self.max_size:
+                        self.opening += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise errors.PoolError(
+                            f"Pool {self.name} agotado: {self.max_size} conexiones en uso tras esperar {self.timeout:g} s"
+                        )
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            if entry is not None:
+                self.in_use += 1
+            self._record_wait((time.monotonic() - started) * 1000)
+
+        if entry is None:
+            entry = self._open_reserved()
+        else:
+            entry = self._validate(entry)
+        entry.last_used = time.monotonic()
+        return PooledConnection(self, entry)
+
+    def _open_reserved(self) -> PoolEntry:
+        """Abrir una conexión para un lugar ya reservado en `opening`"""
+        try:
+            entry = PoolEntry(self.connect())
+        except Exception:
+            with self.condition:
+                self.opening -= 1
+                self.connect_errors += 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.opening -= 1
+            self.in_use += 1
+            self.opened += 1
+        return entry
+
+    def _validate(self, entry: PoolEntry) -> PoolEntry:
+        """Reemplazar una conexión vieja o que ya no responde antes de prestarla"""
+        now = time.monotonic()
+        expired = now - entry.created_at > self.recycle
+        if not expired and (now - entry.last_used <= self.ping_interval or self._alive(entry)):
+            return entry
+        self._close(entry)
+        with self.condition:
+            if expired:
+                self.recycled += 1
+            self.in_use -= 1
+            self.opening += 1
+        return self._open_reserved()
+
+    def release(self, entry: PoolEntry):
+        """Devolver una conexión; se cierra si quedó en mal estado o es vieja"""
+        keep = True
+        try:
+            connection = entry.connection
+            if connection.in_transaction:
+                connection.rollback()
+            if self.reset_session:
+                connection.reset_session()
+        except Exception as e:
+            logger.warning(f"Conexión descartada al devolverla al pool: {e}")
+            keep = False
+        expired = keep and time.monotonic() - entry.created_at > self.recycle
+        if expired:
+            keep = False
+        if not keep:
+            self._close(entry)
+
+        with self.condition:
+            if expired:
+                self.recycled += 1
+            self.in_use -= 1
+            if keep:
+                entry.last_used = time.monotonic()
+                self.idle.append(entry)
+            self.condition.notify()
+
+    def _alive(self, entry: PoolEntry) -> bool:
+        try:
+            entry.connection.ping(reconnect=False)
+            return True
+        except Exception:
+            with self.condition:
+                self.ping_failures += 1
+            return False
+
+    def _close(self, entry: PoolEntry):
+        try:
+            entry.connection.close()
+        except Exception:
+            pass
+        with self.condition:
+            self.closed += 1
+
+    def _maintain_loop(self):
+        while True:
+            try:
+                self.maintain()
+            except Exception as e:
+                logger.error(f"Error en el mantenimiento del pool {self.name}: {e}")
+            if self.stopped.wait(max(self.ping_interval, 1.0)):
+                return
+
+    def maintain(self):
+        """Ping a las ociosas, reciclar y cerrar sobrantes, reponer el mínimo"""
+        with self.condition:
+            entries = list(self.idle)
+            self.idle.clear()
+            self.checking += len(entries)
+
+        now = time.monotonic()
+        survivors = []
+        closed = 0
+        recycled = 0
+        for entry in entries:
+            idle_for = now - entry.last_used
+            expired = now - entry.created_at > self.recycle
+            surplus = idle_for > self.idle_timeout and self.size - closed > self.min_size
+            if expired:
+                recycled += 1
+            if expired or surplus or (idle_for >= self.ping_interval and not self._alive(entry)):
+                self._close(entry)
+                closed += 1
+            else:
+                survivors.append(entry)
+
+        with self.condition:
+            self.recycled += recycled
+            self.checking -= len(entries)
+            # Al frente, para seguir siendo las primeras en vencer por inactividad
+            self.idle.extendleft(reversed(survivors))
+            self.condition.notify(len(survivors))
+
+        while True:
+            with self.condition:
+                if self.size >= self.min_size or self.stopped.is_set():
+                    return
+                self.opening += 1
+            try:
+                entry = self._open_reserved()
+            except Exception as e:
+                logger.warning(f"No se pudo abrir conexión para el pool {self.name}: {e}")
+                return
+            with self.condition:
+                self.in_use -= 1
+                self.idle.append(entry)
+                self.condition.notify()
+
+    def _record_wait(self, wait_ms: float):
+        self.checkouts += 1
+        self.wait_sum_ms += wait_ms
+        self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+        self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS_MS, wait_ms)] += 1
+
+    def metrics(self) -> dict:
+        """Gauges de uso e histograma (acumulado) del tiempo de espera"""
+        with self.condition:
+            histogram = {}
+            cumulative = 0
+            for bound, count in zip(list(WAIT_BUCKETS_MS) + ['+Inf'], self.wait_buckets):
+                cumulative += count
+                histogram[str(bound)] = cumulative
+            return {
+                "name": self.name,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self.size,
+                "in_use": self.in_use,
+                "idle": len(self.idle),
+                "opening": self.opening,
+                "waiting": self.waiting,
+                "utilization": round(self.in_use / self.max_size, 3) if self.max_size else 0.0,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "opened": self.opened,
+                "closed": self.closed,
+                "recycled": self.recycled,
+                "ping_failures": self.ping_failures,
+                "connect_errors": self.connect_errors,
+                "wait_ms": {
+                    "count": self.checkouts,
+                    "sum": round(self.wait_sum_ms, 3),
+                    "max": round(self.wait_max_ms, 3),
+                    "avg": round(self.wait_sum_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                    "histogram": histogram
+                }
+            }
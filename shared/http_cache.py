@@ -0,0 +1,186 @@
+"""Validadores HTTP (ETag / If-None-Match) y Cache-Control por ruta
+
+`ETagMiddleware` calcula un ETag fuerte (hash del cuerpo) para las
+respuestas 200 de GET, responde `304 Not Modified` cuando el cliente ya
+tiene esa versión y agrega el Cache-Control configurado para cada ruta.
+
+Las reglas con etiquetas de la caché de catálogo (ver shared/cache.py)
+recuerdan el último ETag de cada URL junto con la versión de sus
+etiquetas: mientras ninguna escritura las invalide, un If-None-Match que
+coincida se responde con 304 sin ejecutar el handler ni la query.
+"""
+import hashlib
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from shared.cache import CACHE_TTL_SECONDS, ResponseCache
+
+# Tamaño máximo de cuerpo al que se le calcula ETag; los mayores pasan sin validador
+ETAG_MAX_BODY = int(os.getenv('ETAG_MAX_BODY', str(1024 * 1024)))
+# URLs con validador recordado para responder 304 sin ejecutar el handler
+ETAG_MAX_VALIDATORS = int(os.getenv('ETAG_MAX_VALIDATORS', '2048'))
+# Vigencia de un validador recordado; acota cambios hechos por otras réplicas
+ETAG_VALIDATOR_TTL = int(os.getenv('ETAG_VALIDATOR_TTL', str(CACHE_TTL_SECONDS)))
+
+class CacheRule:
+    """Política de caché HTTP para las rutas que coinciden con `pattern`
+
+    `tags` son etiquetas de la caché de catálogo; pueden usar los grupos con
+    nombre del patrón, por ejemplo `pelicula:{movie_id}`. `validator_ttl`
+    acota cuánto se recuerda el ETag de la ruta: las versiones de etiquetas
+    son locales al proceso y no ven escrituras de otros servicios, así que
+    debe ser a lo sumo la vigencia de la ruta en la caché de catálogo.
+    """
+
+    def __init__(self, pattern: str, cache_control: str, tags: Iterable[str] = (),
+                 validator_ttl: int = ETAG_VALIDATOR_TTL):
+        self.pattern = re.compile(pattern)
+        self.cache_control = cache_control
+        self.tags = tuple(tags)
+        self.validator_ttl = validator_ttl
+
+    def match(self, path: str) -> Optional[Tuple[str, ...]]:
+        """Etiquetas de la ruta si coincide, None si no"""
+        match = self.pattern.fullmatch(path)
+        if match is None:
+            return None
+        return tuple(tag.format(**match.groupdict()) for tag in self.tags)
+
+def compute_etag(body: bytes) -> str:
+    """ETag fuerte a partir del contenido"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Comparación débil de If-None-Match (RFC 9110)"""
+    if if_none_match.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+class ETagMiddleware:
+    """Middleware ASGI de ETag, 304 y Cache-Control"""
+
+    def __init__(self, app, rules: Iterable[CacheRule] = (), cache: Optional[ResponseCache] = None,
+                 max_body: int = ETAG_MAX_BODY):
+        self.app = app
+        self.rules = list(rules)
+        self.cache = cache
+        self.max_body = max_body
+        # url -> (etag, versiones de etiquetas, vence)
+        self.validators: OrderedDict = OrderedDict()
+
+    def find_rule(self, path: str) -> Tuple[Optional[CacheRule], Tuple[str, ...]]:
+        for rule in self.rules:
+            tags = rule.match(path)
+            if tags is not None:
+                return rule, tags
+        return None, ()
+
+    def remembered_etag(self, url: str, versions: tuple) -> Optional[str]:
+        """ETag recordado si sus etiquetas no cambiaron desde entonces"""
+        entry = self.validators.get(url)
+        if entry is None:
+            return None
+        etag, stored_versions, expires_at = entry
+        if stored_versions != versions or time.monotonic() > expires_at:
+            del self.validators[url]
+            return None
+        return etag
+
+    def remember(self, url: str, etag: str, versions: tuple, ttl: int):
+        if ttl <= 0:
+            return
+        self.validators[url] = (etag, versions, time.monotonic() + ttl)
+        self.validators.move_to_end(url)
+        while len(self.validators) > ETAG_MAX_VALIDATORS:
+            self.validators.popitem(last=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            await self.app(scope, receive, send)
+            return
+
+        rule, tags = self.find_rule(scope['path'])
+        cache_control = rule.cache_control if rule else None
+        if_none_match = Headers(scope=scope).get('if-none-match')
+        url = scope['path'] + ('?' + scope['query_string'].decode('latin-1') if scope['query_string'] else '')
+
+        # Las versiones se toman antes de ejecutar el handler: si una escritura
+        # invalida durante la query, el validador guardado ya nace vencido
+        versions = self.cache.tag_versions(tags) if tags and self.cache is not None else None
+        if versions is not None and if_none_match:
+            etag = self.remembered_etag(url, versions)
+            if etag is not None and etag_matches(if_none_match, etag):
+                await self.send_not_modified(send, etag, cache_control)
+                return
+
+        start_message = None
+        chunks = []
+        size = 0
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, size, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(scope=message)
+                if cache_control and 'cache-control' not in headers:
+                    headers['Cache-Control'] = cache_control
+                if message['status'] != 200 or 'etag' in headers:
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+
+            chunks.append(message.get('body', b''))
+            size += len(chunks[-1])
+            if size > self.max_body:
+                # Demasiado grande para almacenarlo: se envía sin validador
+                passthrough = True
+                await send(start_message)
+                await send({
+                    'type': 'http.response.body',
+                    'body': b''.join(chunks),
+                    'more_body': message.get('more_body', False)
+                })
+                return
+            if message.get('more_body', False):
+                return
+
+            body = b''.join(chunks)
+            etag = compute_etag(body)
+            if versions is not None:
+                self.remember(url, etag, versions, rule.validator_ttl)
+
+            if if_none_match and etag_matches(if_none_match, etag):
+                await self.send_not_modified(send, etag, cache_control)
+                return
+
+            MutableHeaders(scope=start_message)['ETag'] = etag
+            await send(start_message)
+            await send({'type': 'http.response.body', 'body': body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    async def send_not_modified(send, etag: str, cache_control: Optional[str]):
+        headers = [(b'etag', etag.encode('latin-1'))]
+        if cache_control:
+            headers.append((b'cache-control', cache_control.encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
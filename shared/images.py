@@ -0,0 +1,255 @@
+"""Procesamiento de imágenes subidas en un pool de procesos
+
+Redimensionar con LANCZOS y recodificar una imagen grande toma cientos de
+ms de CPU; hacerlo dentro del handler bloquea el event loop de todo el
+servicio. Las subidas ahora solo guardan el original y responden con
+`imagen_estado = 'pendiente'`. Un pool de procesos genera las variantes
+(por ejemplo miniatura, tarjeta y detalle) en JPEG, WebP y AVIF si Pillow
+lo soporta, y al terminar se registran sus URLs en `imagen_variantes`.
+
+En disco, junto al original `<uuid>.<ext>` se crea el directorio `<uuid>/`
+con un archivo por variante y formato (`thumb.jpg`, `thumb.webp`, ...).
+El original se conserva para poder reprocesar (scripts/reprocess_images.py).
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '2'))
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', '82'))
+IMAGE_FORMATS = [fmt.strip() for fmt in os.getenv('IMAGE_FORMATS', 'jpeg,webp,avif').split(',') if fmt.strip()]
+
+# Variantes por tipo de imagen (ancho en px)
+MOVIE_IMAGE_RENDITIONS = {"thumb": 160, "card": 400, "detail": 800}
+PRODUCT_IMAGE_RENDITIONS = {"thumb": 160, "card": 400}
+
+STATUS_PENDING = 'pendiente'
+STATUS_READY = 'listo'
+STATUS_ERROR = 'error'
+
+FORMAT_EXTENSIONS = {
+    'jpeg': 'jpg',
+    'webp': 'webp',
+    'avif': 'avif',
+}
+
+def save_options(fmt: str, quality: int) -> dict:
+    """Parámetros de codificación por formato"""
+    if fmt == 'jpeg':
+        return {'quality': quality, 'optimize': True, 'progressive': True}
+    if fmt == 'webp':
+        return {'quality': quality, 'method': 4}
+    # AVIF logra la misma calidad visual con un parámetro más bajo
+    return {'quality': max(quality - 20, 30), 'speed': 6}
+
+def available_formats(requested: Iterable[str] = IMAGE_FORMATS) -> List[str]:
+    """Formatos pedidos que este Pillow puede escribir
+
+    AVIF requiere Pillow >= 11.3 o el paquete opcional `pillow-avif-plugin`;
+    si no está se omite. JPEG siempre se genera como respaldo.
+    """
+    try:
+        import pillow_avif  # noqa: F401 (registra el formato al importarse)
+    except ImportError:
+        pass
+    Image.init()
+    formats = ['jpeg']
+    for fmt in requested:
+        fmt = fmt.lower()
+        if fmt in FORMAT_EXTENSIONS and fmt not in formats:
+            if fmt.upper() in Image.SAVE:
+                formats.append(fmt)
+            else:
+                logger.warning(f"Formato de imagen {fmt} no soportado por Pillow; se omite")
+    return formats
+
+def url_to_path(url: str) -> str:
+    """Ruta local de una URL de /uploads"""
+    return os.path.join(".", url.lstrip('/'))
+
+def variants_dir(source_url: str) -> str:
+    """Directorio de variantes de un original"""
+    return os.path.splitext(url_to_path(source_url))[0]
+
+def render_variants(source_url: str, renditions: Dict[str, int], formats: List[str], quality: int) -> dict:
+    """Generar todas las variantes de una imagen (se ejecuta en el pool)
+
+    Se decodifica una sola vez y cada variante se reduce a partir de la
+    anterior, de mayor a menor ancho. Devuelve
+    `{"original": url, "<variante>": {"<formato>": url, ...}, ...}`.
+    """
+    target_dir = variants_dir(source_url)
+    url_dir = os.path.splitext(source_url)[0]
+    os.makedirs(target_dir, exist_ok=True)
+    widest = max(renditions.values())
+    variants = {"original": source_url}
+
+    with Image.open(url_to_path(source_url)) as source:
+        # En JPEG el decodificador puede reducir en potencias de 2 al cargar
+        source.draft('RGB', (widest, widest))
+        img = ImageOps.exif_transpose(source)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+
+        for name, width in sorted(renditions.items(), key=lambda item: -item[1]):
+            if img.width > width:
+                height = max(1, round(img.height * width / img.width))
+                img = img.resize((width, height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            variants[name] = {}
+            for fmt in formats:
+                filename = f"{name}.{FORMAT_EXTENSIONS[fmt]}"
+                path = os.path.join(target_dir, filename)
+                # Escritura atómica: nunca se sirve una variante a medio escribir
+                img.save(path + '.tmp', fmt.upper(), **save_options(fmt, quality))
+                os.replace(path + '.tmp', path)
+                variants[name][fmt] = f"{url_dir}/{filename}"
+    return variants
+
+def parse_variants(value) -> Optional[dict]:
+    """Valor de la columna JSON `imagen_variantes` como diccionario"""
+    if value is None or isinstance(value, dict):
+        return value
+    if isinstance(value, (bytes, bytearray)):
+        value = value.decode('utf-8')
+    return json.loads(value)
+
+def decode_image_columns(rows: List[dict]) -> List[dict]:
+    """Decodificar `imagen_variantes` en filas leídas de la base"""
+    for row in rows:
+        if 'imagen_variantes' in row:
+            row['imagen_variantes'] = parse_variants(row['imagen_variantes'])
+    return rows
+
+def source_image_url(imagen_url: Optional[str], variants) -> Optional[str]:
+    """URL del original de una fila (imagen_url apunta a una variante una vez procesada)"""
+    variants = parse_variants(variants)
+    if variants and variants.get("original"):
+        return variants["original"]
+    return imagen_url
+
+def remove_image_files(imagen_url: Optional[str], variants=None):
+    """Borrar el original y todas sus variantes"""
+    source_url = source_image_url(imagen_url, variants)
+    for url in {imagen_url, source_url}:
+        if url and os.path.isfile(url_to_path(url)):
+            os.remove(url_to_path(url))
+    if source_url and os.path.isdir(variants_dir(source_url)):
+        shutil.rmtree(variants_dir(source_url), ignore_errors=True)
+
+def record_variants(db, table: str, id_field: str, row_id: int, expected_url: str,
+                    variants: Optional[dict], main_rendition: str) -> bool:
+    """Registrar el resultado del procesamiento en la fila
+
+    Solo se actualiza si la fila sigue apuntando a la misma imagen: si se
+    reemplazó o borró mientras se procesaba, el resultado se descarta.
+    Con `variants` = None se marca el error y se mantiene el original.
+    """
+    if variants is None:
+        updated = db.execute_query(
+            f"UPDATE {table} SET imagen_estado = %s WHERE {id_field} = %s AND imagen_url = %s",
+            (STATUS_ERROR, row_id, expected_url),
+            fetch=False
+        )
+    else:
+        updated = db.execute_query(
+            f"""UPDATE {table} SET imagen_url = %s, imagen_variantes = %s, imagen_estado = %s
+                WHERE {id_field} = %s AND imagen_url = %s""",
+            (variants[main_rendition]['jpeg'], json.dumps(variants), STATUS_READY, row_id, expected_url),
+            fetch=False
+        )
+        if not updated:
+            # MySQL cuenta 0 filas si los valores no cambiaron (reproceso de
+            # una imagen ya lista): solo se descarta si la fila es de otra imagen
+            current = db.execute_query(
+                f"SELECT imagen_url, imagen_variantes FROM {table} WHERE {id_field} = %s",
+                (row_id,)
+            )
+            if current and source_image_url(current[0]['imagen_url'], current[0]['imagen_variantes']) == variants["original"]:
+                return True
+            remove_image_files(None, variants)
+    return bool(updated)
+
+class ImagePipeline:
+    """Pool de procesos que genera las variantes de las imágenes subidas
+
+    `main_rendition` es la variante cuyo JPEG queda en `imagen_url` para los
+    clientes que no conocen `imagen_variantes`. `db` es el gestor de base de
+    datos del servicio (este módulo no lo importa para que los procesos del
+    pool no abran conexiones).
+    """
+
+    def __init__(self, db, renditions: Dict[str, int], main_rendition: str,
+                 workers: int = IMAGE_WORKERS, quality: int = IMAGE_QUALITY):
+        self.db = db
+        self.renditions = renditions
+        self.main_rendition = main_rendition
+        self.workers = workers
+        self.quality = quality
+        self.formats = available_formats()
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.tasks: set = set()
+        self.processed = 0
+        self.failed = 0
+
+    def start(self):
+        # spawn: no se hereda el estado del proceso del servicio (pool de
+        # conexiones, hilos, event loop) como ocurriría con fork
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+
+    async def stop(self):
+        for task in list(self.tasks):
+            task.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def render(self, source_url: str) -> dict:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, render_variants, source_url, self.renditions, self.formats, self.quality
+        )
+
+    async def process(self, table: str, id_field: str, row_id: int,
+                      source_url: str, expected_url: str) -> bool:
+        """Procesar una imagen y registrar el resultado; True si la fila cambió"""
+        try:
+            variants = await self.render(source_url)
+            self.processed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error procesando imagen {source_url}: {e}")
+            variants = None
+        return await asyncio.to_thread(
+            record_variants, self.db, table, id_field, row_id, expected_url, variants, self.main_rendition
+        )
+
+    def submit(self, coro):
+        """Ejecutar en segundo plano una tarea de procesamiento"""
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def metrics(self) -> dict:
+        return {
+            "workers": self.workers,
+            "formats": self.formats,
+            "renditions": self.renditions,
+            "in_progress": len(self.tasks),
+            "processed": self.processed,
+            "failed": self.failed,
+        }
@@ -0,0 +1,232 @@
+"""Servicio de archivos de /uploads con Range, ETag y caché inmutable
+
+Reemplaza a `StaticFiles` para pósters y trailers:
+
+- `Range: bytes=...` (un rango) responde 206 para poder saltar en el video
+  sin descargarlo completo; `If-Range` y 416 según RFC 9110.
+- ETag, Content-Length y Content-Type se calculan una vez por archivo
+  (tamaño + mtime) y se guardan en memoria; `If-None-Match` responde 304.
+- Los nombres generados con uuid nunca cambian de contenido, así que se
+  sirven con `Cache-Control: public, max-age=31536000, immutable`.
+- Envío sin copias: si el servidor ASGI ofrece la extensión
+  `http.response.zerocopysend` se le pasa el descriptor para que use
+  sendfile(2). Con `MEDIA_ACCEL_REDIRECT` (por ejemplo `/_media`) el cuerpo
+  lo envía un nginx delante con `X-Accel-Redirect` (sendfile y rangos en
+  nginx). Si no, se lee por bloques grandes con pread en un hilo.
+"""
+import asyncio
+import mimetypes
+import os
+import re
+import stat
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers
+
+from shared.http_cache import etag_matches
+
+MEDIA_CHUNK_SIZE = int(os.getenv('MEDIA_CHUNK_SIZE', str(256 * 1024)))
+MEDIA_METADATA_ENTRIES = int(os.getenv('MEDIA_METADATA_ENTRIES', '4096'))
+MEDIA_ACCEL_REDIRECT = os.getenv('MEDIA_ACCEL_REDIRECT', '')
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Variantes de imagen: mismo nombre si se reprocesan
+DEFAULT_CACHE_CONTROL = "public, max-age=86400"
+
+UUID_NAME_RE = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\.[a-z0-9]+")
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+# Tipos que mimetypes no conoce en todas las versiones de Python
+EXTRA_TYPES = {
+    '.webp': 'image/webp',
+    '.avif': 'image/avif',
+    '.webm': 'video/webm',
+    '.mov': 'video/quicktime',
+    '.mp4': 'video/mp4',
+}
+
+def content_type(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension in EXTRA_TYPES:
+        return EXTRA_TYPES[extension]
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Rango pedido como (inicio, fin inclusive)
+
+    Devuelve None si la cabecera no es un rango único de bytes (se responde
+    el archivo completo) y lanza ValueError si el rango no es satisfacible.
+    """
+    match = RANGE_RE.fullmatch(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first == '' and last == '':
+        return None
+    if first == '':
+        # Sufijo: los últimos N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+def route_path(scope) -> str:
+    """Ruta relativa al punto de montaje
+
+    Starlette < 0.33 ya la deja en `path`; las versiones nuevas mantienen la
+    ruta completa y el prefijo en `root_path`.
+    """
+    path = scope['path']
+    root_path = scope.get('root_path', '')
+    if root_path and path.startswith(root_path + '/'):
+        return path[len(root_path):]
+    return path
+
+class FileInfo:
+    __slots__ = ('size', 'mtime_ns', 'etag', 'content_type', 'cache_control')
+
+    def __init__(self, path: str, size: int, mtime_ns: int):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.etag = f'"{size:x}-{mtime_ns:x}"'
+        self.content_type = content_type(path)
+        name = os.path.basename(path)
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if UUID_NAME_RE.fullmatch(name) else DEFAULT_CACHE_CONTROL
+
+class MediaFiles:
+    """Aplicación ASGI que sirve un directorio con rangos y validadores"""
+
+    def __init__(self, directory: str, chunk_size: int = MEDIA_CHUNK_SIZE,
+                 accel_redirect: str = MEDIA_ACCEL_REDIRECT):
+        self.directory = os.path.realpath(directory)
+        self.chunk_size = chunk_size
+        self.accel_redirect = accel_redirect.rstrip('/')
+        self.files: OrderedDict = OrderedDict()
+
+    def resolve(self, path: str) -> Optional[str]:
+        """Ruta real dentro del directorio; None si sale de él o es interna"""
+        relative = path.lstrip('/')
+        # Archivos en curso (.part/.tmp) y estado de subidas (.resumable) no se sirven
+        if any(part.startswith('.') for part in relative.split('/')) or relative.endswith(('.part', '.tmp')):
+            return None
+        full = os.path.realpath(os.path.join(self.directory, relative))
+        if not full.startswith(self.directory + os.sep):
+            return None
+        return full
+
+    def file_info(self, full: str, file_stat: os.stat_result) -> FileInfo:
+        """Metadatos precalculados; se renuevan si cambia tamaño o mtime"""
+        info = self.files.get(full)
+        if info is None or info.size != file_stat.st_size or info.mtime_ns != file_stat.st_mtime_ns:
+            info = FileInfo(full, file_stat.st_size, file_stat.st_mtime_ns)
+            self.files[full] = info
+            while len(self.files) > MEDIA_METADATA_ENTRIES:
+                self.files.popitem(last=False)
+        else:
+            self.files.move_to_end(full)
+        return info
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        if scope['method'] not in ('GET', 'HEAD'):
+            await self.send_empty(send, 405, [(b'allow', b'GET, HEAD')])
+            return
+
+        full = self.resolve(route_path(scope))
+        fd = None
+        try:
+            if full is not None:
+                fd = os.open(full, os.O_RDONLY)
+                file_stat = os.fstat(fd)
+                if not stat.S_ISREG(file_stat.st_mode):
+                    os.close(fd)
+                    fd = None
+            if fd is None:
+                await self.send_empty(send, 404)
+                return
+            await self.serve(scope, send, full, fd, self.file_info(full, file_stat))
+        except (FileNotFoundError, NotADirectoryError):
+            await self.send_empty(send, 404)
+        finally:
+            if fd is not None:
+                os.close(fd)
+
+    async def serve(self, scope, send, full: str, fd: int, info: FileInfo):
+        request_headers = Headers(scope=scope)
+        headers = [
+            (b'accept-ranges', b'bytes'),
+            (b'etag', info.etag.encode('latin-1')),
+            (b'cache-control', info.cache_control.encode('latin-1')),
+        ]
+
+        if_none_match = request_headers.get('if-none-match')
+        if if_none_match and etag_matches(if_none_match, info.etag):
+            await self.send_empty(send, 304, headers)
+            return
+
+        start, end = 0, info.size - 1
+        status = 200
+        range_header = request_headers.get('range')
+        if_range = request_headers.get('if-range')
+        # If-Range con otro validador: el archivo cambió, se envía completo
+        if range_header and (not if_range or if_range.strip() == info.etag):
+            try:
+                requested = parse_range(range_header, info.size)
+            except ValueError:
+                headers.append((b'content-range', f"bytes */{info.size}".encode('latin-1')))
+                await self.send_empty(send, 416, headers)
+                return
+            if requested is not None:
+                start, end = requested
+                status = 206
+                headers.append((b'content-range', f"bytes {start}-{end}/{info.size}".encode('latin-1')))
+
+        length = end - start + 1 if info.size else 0
+        headers.append((b'content-type', info.content_type.encode('latin-1')))
+        headers.append((b'content-length', str(length).encode('latin-1')))
+
+        if self.accel_redirect and scope['method'] == 'GET':
+            # nginx resuelve el rango y envía el cuerpo con sendfile
+            relative = os.path.relpath(full, self.directory).replace(os.sep, '/')
+            headers = [(name, value) for name, value in headers
+                       if name not in (b'content-length', b'content-range')]
+            headers.append((b'x-accel-redirect', f"{self.accel_redirect}/{relative}".encode('utf-8')))
+            await self.send_empty(send, 200, headers)
+            return
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        if scope['method'] == 'HEAD' or length == 0:
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        if 'http.response.zerocopysend' in scope.get('extensions', {}):
+            await send({'type': 'http.response.zerocopysend', 'file': fd, 'offset': start, 'count': length})
+            return
+
+        position = start
+        remaining = length
+        while remaining > 0:
+            chunk = await asyncio.to_thread(os.pread, fd, min(self.chunk_size, remaining), position)
+            if not chunk:
+                break
+            position += len(chunk)
+            remaining -= len(chunk)
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': remaining > 0})
+        if remaining > 0:
+            # El archivo se truncó mientras se enviaba
+            await send({'type': 'http.response.body', 'body': b''})
+
+    @staticmethod
+    async def send_empty(send, status: int, headers: list = ()):
+        headers = list(headers)
+        if status != 304:
+            headers.append((b'content-length', b'0'))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
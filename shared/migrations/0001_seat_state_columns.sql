@@ -0,0 +1,22 @@
+-- Columnas de reservas temporales, versión del mapa y contador de asientos disponibles
+
+ALTER TABLE asientos
+    ADD COLUMN reservado_por INT NULL,
+    ADD COLUMN reservado_hasta DATETIME NULL,
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE asientos
+    ADD INDEX idx_asientos_reserva (estado, reservado_hasta),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE funciones
+    ADD COLUMN asientos_disponibles INT NOT NULL DEFAULT 0,
+    ADD COLUMN version_asientos INT NOT NULL DEFAULT 0,
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+-- Inicializar el contador con el conteo real
+UPDATE funciones f
+SET f.asientos_disponibles = (
+    SELECT COUNT(*) FROM asientos a
+    WHERE a.id_funcion = f.id_funcion AND a.estado = 'disponible'
+);
@@ -0,0 +1,15 @@
+-- Índices compuestos para los accesos por película/sala + horario
+-- y un índice de cobertura para leer el mapa de asientos sin tocar la tabla
+
+ALTER TABLE funciones
+    ADD INDEX idx_funciones_pelicula_horario (id_pelicula, horario),
+    ADD INDEX idx_funciones_sala_horario (id_sala, horario),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE asientos
+    ADD INDEX idx_asientos_mapa (id_funcion, numero_asiento, estado),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE boletos
+    ADD INDEX idx_boletos_usuario_estado (id_usuario, estado),
+    ALGORITHM=INPLACE, LOCK=NONE;
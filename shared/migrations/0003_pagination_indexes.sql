@@ -0,0 +1,12 @@
+-- Índices para paginar por cursor (keyset) los listados de películas y
+-- productos en el mismo orden del ORDER BY; InnoDB agrega la clave primaria
+-- al final de cada índice secundario, que sirve de desempate
+
+ALTER TABLE peliculas
+    ADD INDEX idx_peliculas_fecha (fecha_creacion),
+    ADD INDEX idx_peliculas_genero_fecha (genero, fecha_creacion),
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE productos
+    ADD INDEX idx_productos_categoria_nombre (categoria, nombre),
+    ALGORITHM=INPLACE, LOCK=NONE;
@@ -0,0 +1,12 @@
+-- Estado del procesamiento de imágenes en segundo plano y URLs de sus variantes
+-- (miniatura, tarjeta, detalle en JPEG/WebP/AVIF); NULL = imagen anterior sin variantes
+
+ALTER TABLE peliculas
+    ADD COLUMN imagen_estado ENUM('pendiente', 'listo', 'error') NULL,
+    ADD COLUMN imagen_variantes JSON NULL,
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+ALTER TABLE productos
+    ADD COLUMN imagen_estado ENUM('pendiente', 'listo', 'error') NULL,
+    ADD COLUMN imagen_variantes JSON NULL,
+    ALGORITHM=INPLACE, LOCK=NONE;
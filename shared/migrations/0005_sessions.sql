@@ -0,0 +1,21 @@
+-- Sesiones con refresh tokens rotativos (shared/sessions.py): solo se guarda
+-- el SHA-256 del token; la familia agrupa las rotaciones de una misma sesión
+
+CREATE TABLE IF NOT EXISTS sesiones (
+    id_sesion BIGINT PRIMARY KEY AUTO_INCREMENT,
+    id_usuario INT NOT NULL,
+    familia CHAR(32) NOT NULL,
+    token_hash BINARY(32) NOT NULL,
+    correo VARCHAR(100) NOT NULL,
+    nombre VARCHAR(100) NOT NULL,
+    rol VARCHAR(50) NOT NULL,
+    fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    fecha_expiracion DATETIME NOT NULL,
+    fecha_rotacion DATETIME NULL,
+    fecha_revocacion DATETIME NULL,
+    UNIQUE KEY idx_sesiones_token (token_hash),
+    KEY idx_sesiones_familia (familia),
+    KEY idx_sesiones_usuario (id_usuario),
+    KEY idx_sesiones_expiracion (fecha_expiracion),
+    FOREIGN KEY (id_usuario) REFERENCES usuarios(id_usuario) ON DELETE CASCADE
+);
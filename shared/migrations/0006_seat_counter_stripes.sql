@@ -0,0 +1,14 @@
+-- Contador de disponibles y versión del mapa repartidos en franjas por función:
+-- cada reserva, compra o liberación suma en una franja al azar en lugar de
+-- actualizar la fila de `funciones`, así las reservas concurrentes de una
+-- misma función no hacen cola sobre un único lock de fila.
+-- Valor efectivo = columna de `funciones` + suma de las franjas.
+
+CREATE TABLE IF NOT EXISTS funciones_contadores (
+    id_funcion INT NOT NULL,
+    franja TINYINT UNSIGNED NOT NULL,
+    delta_disponibles INT NOT NULL DEFAULT 0,
+    version INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (id_funcion, franja),
+    FOREIGN KEY (id_funcion) REFERENCES funciones(id_funcion) ON DELETE CASCADE
+);
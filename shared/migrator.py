@@ -0,0 +1,221 @@
+"""Ejecutor de migraciones de esquema versionadas
+
+Las migraciones son archivos `NNNN_descripcion.sql` en `shared/migrations/`
+y se aplican en orden. Las aplicadas se registran en `schema_migrations`.
+Se ejecutan al arrancar un servicio (si DB_AUTO_MIGRATE=true) o a mano:
+
+    python shared/migrator.py status
+    python shared/migrator.py upgrade [--dry-run]
+"""
+import hashlib
+import logging
+import os
+import re
+import sys
+import time
+from typing import List, Optional
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from shared.database import db_manager
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+MIGRATION_FILE_RE = re.compile(r'^(\d{4})_([\w-]+)\.sql$')
+
+# Lock con nombre para que solo un servicio migre a la vez
+MIGRATION_LOCK = 'cine_schema_migrations'
+MIGRATION_LOCK_TIMEOUT = int(os.getenv('DB_MIGRATION_LOCK_TIMEOUT', '60'))
+
+# Tiempo máximo esperando un metadata lock antes de abortar un DDL,
+# para no dejar en cola el tráfico de la tabla afectada
+DDL_LOCK_WAIT_TIMEOUT = int(os.getenv('DB_MIGRATION_LOCK_WAIT_TIMEOUT', '10'))
+
+AUTO_MIGRATE = os.getenv('DB_AUTO_MIGRATE', 'false').lower() == 'true'
+
+CREATE_TRACKING_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version VARCHAR(10) PRIMARY KEY,
+    nombre VARCHAR(200) NOT NULL,
+    checksum CHAR(64) NULL,
+    duracion_ms INT NULL,
+    fecha_aplicacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+ONLINE_INDEX_RE = re.compile(r'^\s*ALTER\s+TABLE\b.*\b(ADD|DROP|RENAME)\s+(UNIQUE\s+)?(INDEX|KEY)\b', re.I | re.S)
+CREATE_INDEX_RE = re.compile(r'^\s*CREATE\s+(UNIQUE\s+)?INDEX\b', re.I)
+
+class Migration:
+    """Archivo de migración pendiente o aplicado"""
+
+    def __init__(self, version: str, name: str, path: str):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path, 'r', encoding='utf-8') as f:
+            self.sql = f.read()
+        self.checksum = hashlib.sha256(self.sql.encode('utf-8')).hexdigest()
+
+    def statements(self) -> List[str]:
+        """Sentencias del archivo, sin comentarios y con opciones de DDL en línea"""
+        lines = [line for line in self.sql.splitlines() if not line.strip().startswith('--')]
+        statements = [stmt.strip() for stmt in '\n'.join(lines).split(';')]
+        return [with_online_ddl(stmt) for stmt in statements if stmt]
+
+def with_online_ddl(statement: str) -> str:
+    """Agregar ALGORITHM=INPLACE, LOCK=NONE a los cambios de índices que no lo indiquen
+
+    Así las altas y bajas de índices no bloquean escrituras sobre tablas
+    calientes como `asientos` o `boletos`.
+    """
+    if re.search(r'\bALGORITHM\s*=', statement, re.I):
+        return statement
+    if ONLINE_INDEX_RE.match(statement):
+        return f"{statement},\n    ALGORITHM=INPLACE, LOCK=NONE"
+    if CREATE_INDEX_RE.match(statement):
+        return f"{statement} ALGORITHM=INPLACE LOCK=NONE"
+    return statement
+
+def discover_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Migraciones disponibles ordenadas por versión"""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE_RE.match(filename)
+        if match:
+            migrations.append(Migration(match.group(1), match.group(2), os.path.join(directory, filename)))
+    return migrations
+
+def applied_versions(cursor) -> dict:
+    """Versiones registradas en schema_migrations con su checksum"""
+    cursor.execute("SELECT version, checksum FROM schema_migrations")
+    return {row['version']: row['checksum'] for row in cursor.fetchall()}
+
+def migration_status() -> List[dict]:
+    """Estado (aplicada/pendiente) de cada migración"""
+    connection = db_manager.get_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(CREATE_TRACKING_TABLE)
+        applied = applied_versions(cursor)
+    finally:
+        cursor.close()
+        connection.close()
+
+    status = []
+    for migration in discover_migrations():
+        checksum = applied.get(migration.version, False)
+        status.append({
+            "version": migration.version,
+            "nombre": migration.name,
+            "aplicada": migration.version in applied,
+            "modificada": bool(checksum) and checksum != migration.checksum
+        })
+    return status
+
+def run_migrations(dry_run: bool = False, skip_if_locked: bool = False) -> Optional[List[str]]:
+    """Aplicar las migraciones pendientes en orden
+
+    Toma un lock con nombre para que varios servicios arrancando a la vez no
+    migren en paralelo. Si otro proceso lo retiene más de
+    DB_MIGRATION_LOCK_TIMEOUT segundos (por ejemplo, durante un índice
+    largo), con `skip_if_locked` se devuelve None sin migrar: ese proceso
+    ya está aplicándolas. Cada migración se registra al terminar; MySQL
+    confirma los DDL de forma implícita, por lo que una migración fallida
+    se detiene ahí y debe corregirse antes de reintentar.
+    """
+    connection = db_manager.get_connection()
+    cursor = connection.cursor(dictionary=True)
+    applied_now = []
+    locked = False
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s) as locked", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT))
+        locked = cursor.fetchall()[0]['locked'] == 1
+        if not locked:
+            if skip_if_locked:
+                logger.warning(
+                    f"Otro proceso está aplicando migraciones (lock retenido más de {MIGRATION_LOCK_TIMEOUT} s); "
+                    f"se continúa sin migrar"
+                )
+                return None
+            raise RuntimeError("No se pudo obtener el lock de migraciones")
+
+        cursor.execute(CREATE_TRACKING_TABLE)
+        cursor.execute("SET SESSION lock_wait_timeout = %s", (DDL_LOCK_WAIT_TIMEOUT,))
+        applied = applied_versions(cursor)
+
+        for migration in discover_migrations():
+            if migration.version in applied:
+                if applied[migration.version] and applied[migration.version] != migration.checksum:
+                    logger.warning(f"La migración {migration.version} fue modificada después de aplicarse")
+                continue
+
+            logger.info(f"Aplicando migración {migration.version}_{migration.name}")
+            start = time.perf_counter()
+            for statement in migration.statements():
+                if dry_run:
+                    print(f"{statement};\n")
+                    continue
+                cursor.execute(statement)
+                if cursor.with_rows:
+                    cursor.fetchall()
+                connection.commit()
+
+            if not dry_run:
+                cursor.execute(
+                    """INSERT INTO schema_migrations (version, nombre, checksum, duracion_ms)
+                       VALUES (%s, %s, %s, %s)""",
+                    (migration.version, migration.name, migration.checksum,
+                     int((time.perf_counter() - start) * 1000))
+                )
+                connection.commit()
+            applied_now.append(migration.version)
+
+        return applied_now
+    except Exception as e:
+        logger.error(f"Error aplicando migraciones: {e}")
+        connection.rollback()
+        raise
+    finally:
+        if locked:
+            cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+            cursor.fetchall()
+        cursor.close()
+        connection.close()
+
+def run_startup_migrations() -> Optional[List[str]]:
+    """Aplicar migraciones al arrancar un servicio si DB_AUTO_MIGRATE=true
+
+    Espera (con reintentos) a que MySQL acepte conexiones y no aborta el
+    arranque si otro servicio tiene el lock de migraciones.
+    """
+    if not AUTO_MIGRATE:
+        return None
+    db_manager.wait_until_ready()
+    applied = run_migrations(skip_if_locked=True)
+    if applied:
+        logger.info(f"Migraciones aplicadas: {', '.join(applied)}")
+    return applied
+
+def main():
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Migraciones de esquema de CineMagic")
+    parser.add_argument("command", choices=["status", "upgrade"])
+    parser.add_argument("--dry-run", action="store_true", help="Mostrar las sentencias sin ejecutarlas")
+    args = parser.parse_args()
+
+    if args.command == "status":
+        for row in migration_status():
+            state = "aplicada" if row["aplicada"] else "pendiente"
+            if row["modificada"]:
+                state += " (modificada)"
+            print(f"{row['version']}  {row['nombre']:<40} {state}")
+    else:
+        applied = run_migrations(dry_run=args.dry_run)
+        print(f"Migraciones aplicadas: {', '.join(applied) if applied else 'ninguna'}")
+
+if __name__ == "__main__":
+    main()
@@ -37,6 +37,9 @@ class UserLogin(BaseModel):
     correo: EmailStr
     contrasena: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class MovieBase(BaseModel):
     titulo: str
     director: str
@@ -58,6 +61,8 @@ class MovieCreate(MovieBase):
 class MovieResponse(MovieBase):
     id_pelicula: int
     imagen_url: Optional[str] = None
+    imagen_estado: Optional[str] = None
+    imagen_variantes: Optional[dict] = None
     trailer_url: Optional[str] = None
     fecha_creacion: datetime
 
@@ -87,6 +92,18 @@ class ShowtimeBase(BaseModel):
             raise ValueError('El precio debe ser mayor a 0')
         return v
 
+class ShowtimeBulkRequest(BaseModel):
+    funciones: List[ShowtimeBase]
+    omitir_conflictos: bool = False
+    
+    @validator('funciones')
+    def validate_showtimes(cls, v):
+        if not v:
+            raise ValueError('Debe indicar al menos una función')
+        if len(v) > 5000:
+            raise ValueError('No se pueden programar más de 5000 funciones por solicitud')
+        return v
+
 class ShowtimeResponse(ShowtimeBase):
     id_funcion: int
     pelicula_titulo: str
@@ -118,6 +135,8 @@ class ProductCreate(ProductBase):
 class ProductResponse(ProductBase):
     id_producto: int
     imagen_url: Optional[str] = None
+    imagen_estado: Optional[str] = None
+    imagen_variantes: Optional[dict] = None
     fecha_creacion: datetime
 
 class TicketBase(BaseModel):
@@ -135,6 +154,18 @@ class TicketResponse(TicketBase):
     estado: str
     codigo_boleto: Optional[str] = None
 
+class SeatHoldRequest(BaseModel):
+    id_funcion: int
+    asientos: List[int]
+    
+    @validator('asientos')
+    def validate_seats(cls, v):
+        if not v:
+            raise ValueError('Debe indicar al menos un asiento')
+        if len(set(v)) != len(v):
+            raise ValueError('Hay asientos repetidos')
+        return v
+
 class PurchaseRequest(BaseModel):
     id_usuario: int
     items: List[dict]  # [{"type": "ticket", "id_funcion": 1, "asiento": 5}, {"type": "product", "id_producto": 1, "cantidad": 2}]
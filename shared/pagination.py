@@ -0,0 +1,85 @@
+"""Paginación por cursor (keyset) para los listados
+
+El cursor es opaco para el cliente: codifica en base64 la clave de orden y
+el id de la última fila de la página. La siguiente página se pide con
+`WHERE (clave, id) > (última clave, último id)` en lugar de OFFSET, así el
+costo no crece con la profundidad y las filas no se corren entre páginas
+cuando hay inserciones concurrentes.
+
+Uso en un endpoint: `?cursor=` (vacío) pide la primera página en modo
+cursor; cada respuesta trae la cabecera `X-Next-Cursor` mientras haya más
+páginas. Sin `cursor` se mantiene la paginación por `skip`/`limit`.
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"dec": str(value)}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+        if "dec" in value:
+            return Decimal(value["dec"])
+    return value
+
+def encode_cursor(kind: str, values: Sequence) -> str:
+    """Cursor opaco para la clave de orden `values` de un listado `kind`"""
+    payload = json.dumps([kind, [_encode_value(value) for value in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str, kind: str, size: int) -> Optional[list]:
+    """Valores de la clave de orden; None para la primera página (cursor vacío)
+
+    Lanza 400 si el cursor no es válido o pertenece a otro listado.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_kind, values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values = [_decode_value(value) for value in values]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if cursor_kind != kind or len(values) != size:
+        raise HTTPException(status_code=400, detail="Cursor inválido para este listado")
+    return values
+
+def keyset_condition(columns: Sequence[str], values: Sequence, descending: bool = False) -> Tuple[str, tuple]:
+    """Condición SQL "fila posterior a `values`" en el orden de `columns`
+
+    Se expande como (a > %s) OR (a = %s AND b > %s) ... en lugar de una
+    comparación de tuplas para que MySQL use el índice en cualquier versión.
+    """
+    operator = '<' if descending else '>'
+    clauses = []
+    params = []
+    for position, column in enumerate(columns):
+        parts = [f"{previous} = %s" for previous in columns[:position]]
+        parts.append(f"{column} {operator} %s")
+        clauses.append("(" + " AND ".join(parts) + ")")
+        params.extend(values[:position])
+        params.append(values[position])
+    return "(" + " OR ".join(clauses) + ")", tuple(params)
+
+def set_next_cursor(response: Response, kind: str, rows: List[dict], fields: Sequence[str], limit: int):
+    """Agregar X-Next-Cursor si la página vino completa"""
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(kind, [last[field] for field in fields])
@@ -0,0 +1,136 @@
+"""Hash de contraseñas con scrypt en un pool de hilos acotado
+
+Un hash scrypt con los parámetros por defecto toma decenas de ms de CPU y
+16 MiB de memoria; calcularlo dentro del handler bloquearía el event loop
+del servicio en cada login. `hashlib.scrypt` libera el GIL, así que un
+pool de hilos usa varios núcleos sin el costo de procesos aparte.
+
+Formato guardado en `usuarios.contrasena` (cabe en VARCHAR(255)):
+
+    scrypt$n=16384,r=8,p=1$<sal base64>$<hash base64>
+
+Los hashes SHA-256 sin sal anteriores (64 caracteres hex) se siguen
+aceptando; al verificarlos, o si cambian los parámetros de costo, se
+devuelve el hash nuevo para guardarlo (rehash al iniciar sesión).
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+# Costo de scrypt: memoria = 128 * n * r bytes por hash (16 MiB por defecto)
+SCRYPT_N = int(os.getenv('PASSWORD_SCRYPT_N', '16384'))
+SCRYPT_R = int(os.getenv('PASSWORD_SCRYPT_R', '8'))
+SCRYPT_P = int(os.getenv('PASSWORD_SCRYPT_P', '1'))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(min(4, os.cpu_count() or 1))))
+# Hashes esperando turno antes de responder 503 (protege ante ráfagas de logins)
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', '64'))
+
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+SCRYPT_RE = re.compile(r"scrypt\$n=(\d+),r=(\d+),p=(\d+)\$([A-Za-z0-9+/=]+)\$([A-Za-z0-9+/=]+)")
+LEGACY_SHA256_RE = re.compile(r"[0-9a-f]{64}")
+
+def scrypt_hash(password: str, n: int, r: int, p: int, salt: Optional[bytes] = None) -> str:
+    """Hash en el formato guardado (se ejecuta en el pool)"""
+    salt = salt or os.urandom(SALT_BYTES)
+    key = hashlib.scrypt(
+        password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+        maxmem=128 * r * (n + p) + 1024 * 1024, dklen=KEY_BYTES
+    )
+    return (f"scrypt$n={n},r={r},p={p}$"
+            f"{base64.b64encode(salt).decode('ascii')}${base64.b64encode(key).decode('ascii')}")
+
+def check_password(password: str, stored: str) -> bool:
+    """Comparar en tiempo constante con un hash scrypt o SHA-256 heredado"""
+    match = SCRYPT_RE.fullmatch(stored or '')
+    if match:
+        n, r, p = (int(value) for value in match.group(1, 2, 3))
+        salt = base64.b64decode(match.group(4))
+        return hmac.compare_digest(scrypt_hash(password, n, r, p, salt), stored)
+    if LEGACY_SHA256_RE.fullmatch(stored or ''):
+        return hmac.compare_digest(hashlib.sha256(password.encode('utf-8')).hexdigest(), stored)
+    return False
+
+class PasswordHasher:
+    """Hash y verificación de contraseñas fuera del event loop"""
+
+    def __init__(self, n: int = SCRYPT_N, r: int = SCRYPT_R, p: int = SCRYPT_P,
+                 workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_QUEUE):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.workers = workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.pending = 0
+        self.hashed = 0
+        self.verified = 0
+        self.rehashed = 0
+        self.rejected = 0
+        # Hash de referencia para igualar el tiempo cuando el usuario no existe
+        self.dummy_hash = scrypt_hash('', n, r, p)
+
+    @property
+    def prefix(self) -> str:
+        return f"scrypt$n={self.n},r={self.r},p={self.p}$"
+
+    def needs_rehash(self, stored: str) -> bool:
+        """True si el hash es SHA-256 heredado o usa otros parámetros de costo"""
+        return not stored.startswith(self.prefix)
+
+    async def _run(self, func, *args):
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Servicio ocupado, intenta de nuevo",
+                                headers={"Retry-After": "1"})
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """Hash nuevo con los parámetros actuales"""
+        hashed = await self._run(scrypt_hash, password, self.n, self.r, self.p)
+        self.hashed += 1
+        return hashed
+
+    async def verify(self, password: str, stored: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Devuelve (válida, hash nuevo a guardar o None)
+
+        Con `stored` = None (usuario inexistente) se calcula igual un hash
+        para que la respuesta no revele si el correo está registrado.
+        """
+        self.verified += 1
+        valid = await self._run(check_password, password, stored or self.dummy_hash)
+        if not valid or stored is None:
+            return False, None
+        if self.needs_rehash(stored):
+            self.rehashed += 1
+            return True, await self.hash(password)
+        return True, None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self) -> dict:
+        return {
+            "algorithm": "scrypt",
+            "params": {"n": self.n, "r": self.r, "p": self.p},
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "pending": self.pending,
+            "hashed": self.hashed,
+            "verified": self.verified,
+            "rehashed": self.rehashed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,248 @@
+"""Límites de peticiones con GCRA (generic cell rate algorithm)
+
+GCRA es un token bucket que guarda un solo número por clave: el "tiempo
+teórico de llegada" (TAT). Cada petición lo adelanta `period / count`
+segundos; si quedaría más de `burst` intervalos por delante del reloj, se
+rechaza y la diferencia es el `Retry-After`. No hay temporizadores ni
+recargas: una clave cuyo TAT ya pasó equivale a una clave nueva y se puede
+descartar en cualquier momento.
+
+Backends (RATE_LIMIT_BACKEND):
+    memory  OrderedDict acotado en el proceso (por defecto); cada réplica
+            cuenta por separado
+    redis   script Lua atómico en RATE_LIMIT_REDIS_URL, compartido entre
+            réplicas del gateway. Requiere el paquete `redis`.
+    none    sin límites
+
+Si el backend falla se deja pasar la petición (se registra el error).
+"""
+import ipaddress
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Union
+
+from fastapi import HTTPException, Request
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory').lower()
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '100000'))
+RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+RATE_LIMIT_PREFIX = os.getenv('RATE_LIMIT_PREFIX', 'cine:rl')
+# Proxies propios (IPs o redes CIDR separadas por comas, por ejemplo el gateway).
+# Solo si la conexión viene de uno de ellos la IP del cliente se toma de la
+# última entrada de X-Forwarded-For; vacío = nunca se confía en el encabezado
+RATE_LIMIT_TRUSTED_PROXIES = os.getenv('RATE_LIMIT_TRUSTED_PROXIES', '')
+
+# Claves vencidas que se revisan por petición para liberarlas (costo O(1))
+EVICTIONS_PER_CALL = 2
+
+class RateLimit:
+    """`count` peticiones cada `period` segundos, con ráfagas de hasta `burst`"""
+
+    def __init__(self, name: str, count: int, period: float, burst: Optional[int] = None):
+        self.name = name
+        self.count = count
+        self.period = period
+        self.burst = burst or count
+        self.emission = period / count
+        self.tolerance = self.emission * self.burst
+
+    @classmethod
+    def parse(cls, name: str, spec: str) -> Optional["RateLimit"]:
+        """Límite desde texto `count/period` (por ejemplo "30/60"); vacío o "0" lo desactiva"""
+        spec = spec.strip()
+        if not spec or spec == '0':
+            return None
+        count, _, period = spec.partition('/')
+        return cls(name, int(count), float(period or 1))
+
+    def describe(self) -> str:
+        return f"{self.count}/{self.period:g}s"
+
+class MemoryBackend:
+    """TAT por clave en un OrderedDict acotado (el más viejo primero)"""
+
+    name = 'memory'
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self.tats: OrderedDict = OrderedDict()
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    async def acquire(self, key: str, limit: RateLimit, consume: bool) -> float:
+        now = time.monotonic()
+        with self.lock:
+            self._evict(now)
+            tat = max(self.tats.get(key, now), now)
+            new_tat = tat + limit.emission
+            allow_at = new_tat - limit.tolerance
+            if now < allow_at:
+                return allow_at - now
+            if consume:
+                self.tats[key] = new_tat
+                self.tats.move_to_end(key)
+                while len(self.tats) > self.max_keys:
+                    self.tats.popitem(last=False)
+                    self.evictions += 1
+            return 0.0
+
+    def _evict(self, now: float):
+        """Descartar claves cuyo TAT ya pasó (equivalen a una clave nueva)"""
+        for _ in range(EVICTIONS_PER_CALL):
+            if not self.tats:
+                return
+            key, tat = next(iter(self.tats.items()))
+            if tat > now:
+                return
+            del self.tats[key]
+
+    def size(self) -> int:
+        return len(self.tats)
+
+# El reloj es el de Redis para que todas las réplicas usen el mismo
+GCRA_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local emission = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + emission
+local allow_at = new_tat - tolerance
+if now < allow_at then return tostring(allow_at - now) end
+if ARGV[3] == '1' then
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+end
+return '0'
+"""
+
+class RedisBackend:
+    """TAT por clave en Redis; la clave expira cuando el TAT queda atrás"""
+
+    name = 'redis'
+
+    def __init__(self, url: str, prefix: str):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.prefix = prefix
+        self.script = self.client.register_script(GCRA_SCRIPT)
+        self.evictions = 0
+
+    async def acquire(self, key: str, limit: RateLimit, consume: bool) -> float:
+        result = await self.script(
+            keys=[f"{self.prefix}:{key}"],
+            args=[limit.emission, limit.tolerance, '1' if consume else '0']
+        )
+        return float(result)
+
+    def size(self) -> Optional[int]:
+        return None
+
+class RateLimiter:
+    """Aplica límites por clave (IP, correo, ...) y cuenta los rechazos"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.allowed = 0
+        self.limited = 0
+        self.errors = 0
+        self.limited_by: dict = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def retry_after(self, limit: Optional[RateLimit], key: str, consume: bool = True) -> float:
+        """Segundos a esperar (0 si se permite); con `consume` la petición cuenta"""
+        if not self.enabled or limit is None or not key:
+            return 0.0
+        try:
+            wait = await self.backend.acquire(f"{limit.name}:{key}", limit, consume)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Error en el límite de peticiones ({limit.name}): {e}")
+            return 0.0
+        if wait > 0:
+            self.limited += 1
+            self.limited_by[limit.name] = self.limited_by.get(limit.name, 0) + 1
+        elif consume:
+            self.allowed += 1
+        return wait
+
+    async def enforce(self, limit: Optional[RateLimit], key: str, consume: bool = True):
+        """Lanzar 429 con Retry-After si `key` superó el límite"""
+        wait = await self.retry_after(limit, key, consume)
+        if wait > 0:
+            raise too_many_requests(wait)
+
+    def metrics(self, *limits: Optional[RateLimit]) -> dict:
+        return {
+            "backend": self.backend.name if self.enabled else "none",
+            "limits": {limit.name: limit.describe() for limit in limits if limit is not None},
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "limited_by": self.limited_by,
+            "errors": self.errors,
+            "keys": self.backend.size() if self.enabled else 0,
+            "evictions": self.backend.evictions if self.enabled else 0,
+        }
+
+def too_many_requests(wait: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail="Demasiados intentos, intenta de nuevo más tarde",
+        headers={"Retry-After": str(max(1, math.ceil(wait)))}
+    )
+
+def parse_networks(spec: str) -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    """Redes desde texto `ip[/prefijo], ...`; las entradas inválidas se ignoran"""
+    networks = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+        except ValueError:
+            logger.warning(f"Proxy de confianza inválido en RATE_LIMIT_TRUSTED_PROXIES: {entry}")
+    return networks
+
+trusted_proxies = parse_networks(RATE_LIMIT_TRUSTED_PROXIES)
+
+def is_trusted_proxy(host: str) -> bool:
+    if not trusted_proxies or not host:
+        return False
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in trusted_proxies)
+
+def client_ip(request: Request) -> str:
+    """IP del cliente; la de X-Forwarded-For solo si la conexión viene de un proxy de confianza"""
+    peer = request.client.host if request.client else ''
+    if is_trusted_proxy(peer):
+        forwarded = request.headers.get('x-forwarded-for')
+        if forwarded:
+            return forwarded.split(',')[-1].strip()
+    return peer
+
+def build_rate_limiter() -> RateLimiter:
+    """Crear el limitador según RATE_LIMIT_BACKEND"""
+    if RATE_LIMIT_BACKEND == 'none':
+        return RateLimiter(None)
+    if RATE_LIMIT_BACKEND == 'redis':
+        try:
+            return RateLimiter(RedisBackend(RATE_LIMIT_REDIS_URL, RATE_LIMIT_PREFIX))
+        except ImportError:
+            logger.warning("Paquete redis no instalado; se usan límites en memoria")
+    return RateLimiter(MemoryBackend(RATE_LIMIT_MAX_KEYS))
+
+rate_limiter = build_rate_limiter()
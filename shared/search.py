@@ -0,0 +1,284 @@
+"""Índice invertido en memoria para búsqueda de películas
+
+Normaliza acentos y mayúsculas ("Corazón" -> "corazon"), ordena por BM25
+con pesos por campo y tolera búsquedas parciales:
+
+- el término exacto puntúa completo;
+- los términos que empiezan con la palabra buscada ("pira" -> "piratas")
+  puntúan con `PREFIX_FACTOR`;
+- si una palabra de 4+ letras no aparece, se prueban los términos a una
+  edición de distancia ("matrx" -> "matrix") con `FUZZY_FACTOR`.
+
+Se actualiza de forma incremental con `upsert` y `remove`.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9ñ]+")
+
+# Palabras demasiado frecuentes para aportar a la relevancia
+STOPWORDS = frozenset({
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'la', 'las', 'lo', 'los',
+    'o', 'para', 'por', 'que', 'se', 'sin', 'su', 'un', 'una', 'y',
+    'the', 'of', 'and',
+})
+
+# Peso de cada campo en la frecuencia del término
+FIELD_WEIGHTS = {
+    'titulo': 3.0,
+    'director': 1.5,
+    'genero': 1.0,
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_FACTOR = 0.7
+FUZZY_FACTOR = 0.5
+MIN_PREFIX_LENGTH = 2
+MIN_FUZZY_LENGTH = 4
+
+def fold(text: str) -> str:
+    """Minúsculas y sin acentos (la ñ se conserva)"""
+    text = text.lower().replace('ñ', '\0')
+    decomposed = unicodedata.normalize('NFKD', text)
+    folded = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return folded.replace('\0', 'ñ')
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Palabras normalizadas de un texto, sin palabras vacías"""
+    if not text:
+        return []
+    return [token for token in TOKEN_RE.findall(fold(text)) if token not in STOPWORDS]
+
+def deletes(term: str) -> Set[str]:
+    """Variantes del término con una letra menos"""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+def within_one_edit(a: str, b: str) -> bool:
+    """Distancia de edición <= 1 (incluye transponer dos letras vecinas)"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diff = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diff) == 1:
+            return True
+        return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    if len(a) > len(b):
+        a, b = b, a
+    return any(b[:i] + b[i + 1:] == a for i in range(len(b)))
+
+class SearchIndex:
+    """Índice invertido BM25 sobre documentos con campos de texto
+
+    Guarda también el documento completo para responder sin consultar la
+    base. Es seguro para lecturas y escrituras desde varios hilos; la
+    reconstrucción completa se arma sin tomar el lock y solo lo toma para
+    reemplazar las estructuras, así no frena las búsquedas.
+    """
+
+    def __init__(self, id_field: str, fields: Dict[str, float] = FIELD_WEIGHTS):
+        self.id_field = id_field
+        self.fields = fields
+        self.documents: Dict[int, dict] = {}
+        self.doc_terms: Dict[int, Dict[str, float]] = {}
+        self.doc_lengths: Dict[int, float] = {}
+        self.total_length = 0.0
+        self.postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self.vocabulary: List[str] = []
+        self.delete_map: Dict[str, Set[str]] = defaultdict(set)
+        self.lock = threading.RLock()
+        # Cambios recibidos mientras se reconstruye; se reaplican al reemplazar
+        self.pending: Optional[List[Tuple[str, object]]] = None
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def build(self, rows: Iterable[dict]):
+        """Reconstruir el índice completo"""
+        with self.lock:
+            self.pending = []
+        fresh = SearchIndex(self.id_field, self.fields)
+        try:
+            for row in rows:
+                fresh._add(row)
+            fresh.vocabulary = sorted(fresh.postings)
+        except BaseException:
+            with self.lock:
+                self.pending = None
+            raise
+
+        with self.lock:
+            for action, value in self.pending:
+                if action == 'upsert':
+                    fresh.upsert(value)
+                else:
+                    fresh.remove(value)
+            self.pending = None
+            self.documents = fresh.documents
+            self.doc_terms = fresh.doc_terms
+            self.doc_lengths = fresh.doc_lengths
+            self.total_length = fresh.total_length
+            self.postings = fresh.postings
+            self.vocabulary = fresh.vocabulary
+            self.delete_map = fresh.delete_map
+
+    def upsert(self, row: dict):
+        """Agregar o reemplazar un documento"""
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append(('upsert', row))
+            orphaned = set(self._remove(row[self.id_field]))
+            new_terms = set(self._add(row))
+            self._drop_from_vocabulary(orphaned - new_terms)
+            for term in new_terms - orphaned:
+                bisect.insort(self.vocabulary, term)
+
+    def remove(self, doc_id: int):
+        """Quitar un documento del índice"""
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append(('remove', doc_id))
+            self._drop_from_vocabulary(self._remove(doc_id))
+
+    def _drop_from_vocabulary(self, terms: Iterable[str]):
+        for term in terms:
+            position = bisect.bisect_left(self.vocabulary, term)
+            if position < len(self.vocabulary) and self.vocabulary[position] == term:
+                del self.vocabulary[position]
+
+    def get(self, doc_id: int) -> Optional[dict]:
+        return self.documents.get(doc_id)
+
+    def _add(self, row: dict) -> List[str]:
+        """Indexar un documento; devuelve los términos nuevos del vocabulario"""
+        doc_id = row[self.id_field]
+        weights: Dict[str, float] = defaultdict(float)
+        for field, weight in self.fields.items():
+            for token in tokenize(row.get(field)):
+                weights[token] += weight
+
+        new_terms = []
+        for term, weight in weights.items():
+            if term not in self.postings:
+                new_terms.append(term)
+                for variant in deletes(term):
+                    self.delete_map[variant].add(term)
+            self.postings[term][doc_id] = weight
+
+        length = sum(weights.values())
+        self.documents[doc_id] = row
+        self.doc_terms[doc_id] = dict(weights)
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+        return new_terms
+
+    def _remove(self, doc_id: int) -> List[str]:
+        """Desindexar un documento; devuelve los términos que quedaron sin uso"""
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return []
+        self.documents.pop(doc_id, None)
+        self.total_length -= self.doc_lengths.pop(doc_id, 0.0)
+
+        orphaned = []
+        for term in terms:
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+                orphaned.append(term)
+                for variant in deletes(term):
+                    variants = self.delete_map.get(variant)
+                    if variants is not None:
+                        variants.discard(term)
+                        if not variants:
+                            del self.delete_map[variant]
+        return orphaned
+
+    def expand(self, token: str) -> List[Tuple[str, float]]:
+        """Términos del vocabulario que cubren una palabra buscada, con su factor"""
+        matches = {}
+        if token in self.postings:
+            matches[token] = 1.0
+
+        if len(token) >= MIN_PREFIX_LENGTH:
+            position = bisect.bisect_left(self.vocabulary, token)
+            while position < len(self.vocabulary) and self.vocabulary[position].startswith(token):
+                term = self.vocabulary[position]
+                matches.setdefault(term, PREFIX_FACTOR)
+                position += 1
+
+        if not matches and len(token) >= MIN_FUZZY_LENGTH:
+            candidates = set(self.delete_map.get(token, ()))
+            for variant in deletes(token):
+                if variant in self.postings:
+                    candidates.add(variant)
+                candidates.update(self.delete_map.get(variant, ()))
+            for term in candidates:
+                if within_one_edit(token, term):
+                    matches[term] = FUZZY_FACTOR
+        return list(matches.items())
+
+    def search(self, query: str, limit: int = 20, skip: int = 0,
+               after: Optional[Tuple[float, int]] = None) -> List[Tuple[int, float]]:
+        """Documentos ordenados por relevancia como (id, puntaje)
+
+        Con `after` = (puntaje, id) de la última fila vista se devuelven los
+        siguientes en el mismo orden (paginación por cursor).
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        with self.lock:
+            total_docs = len(self.documents)
+            if total_docs == 0:
+                return []
+            avg_length = self.total_length / total_docs or 1.0
+            lengths = self.doc_lengths
+            # norm = k1 * (1 - b + b * dl / avgdl) = base + slope * dl
+            base = BM25_K1 * (1 - BM25_B)
+            slope = BM25_K1 * BM25_B / avg_length
+            scores: Dict[int, float] = defaultdict(float)
+
+            for token in tokens:
+                expanded = self.expand(token)
+                # Por palabra buscada se toma la mejor coincidencia de cada documento
+                target = scores if len(expanded) == 1 else {}
+                for term, factor in expanded:
+                    postings = self.postings[term]
+                    df = len(postings)
+                    weight = factor * math.log(1 + (total_docs - df + 0.5) / (df + 0.5)) * (BM25_K1 + 1)
+                    if target is scores:
+                        for doc_id, tf in postings.items():
+                            scores[doc_id] += weight * tf / (tf + base + slope * lengths[doc_id])
+                        continue
+                    for doc_id, tf in postings.items():
+                        score = weight * tf / (tf + base + slope * lengths[doc_id])
+                        if score > target.get(doc_id, 0.0):
+                            target[doc_id] = score
+                if target is not scores:
+                    for doc_id, score in target.items():
+                        scores[doc_id] += score
+
+        items = scores.items()
+        if after is not None:
+            after_key = (after[0], after[1])
+            items = [(doc_id, score) for doc_id, score in items if (score, doc_id) < after_key]
+        ranked = heapq.nlargest(skip + limit, items, key=lambda item: (item[1], item[0]))
+        return ranked[skip:skip + limit]
+
+    def search_documents(self, query: str, limit: int = 20, skip: int = 0) -> List[dict]:
+        """Documentos completos ordenados por relevancia"""
+        return [self.documents[doc_id] for doc_id, _ in self.search(query, limit, skip)
+                if doc_id in self.documents]
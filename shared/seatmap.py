@@ -0,0 +1,144 @@
+import asyncio
+import base64
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+# Estados de asiento codificados en 2 bits
+SEAT_STATES = ['disponible', 'ocupado', 'reservado']
+STATE_CODES = {state: code for code, state in enumerate(SEAT_STATES)}
+BITS_PER_SEAT = 2
+SEATS_PER_BYTE = 8 // BITS_PER_SEAT
+
+class SeatMap:
+    """Mapa de asientos de una función empaquetado a 2 bits por asiento
+
+    El asiento `n` ocupa los bits correspondientes a la posición `n - 1`.
+    Cada cambio observado se guarda en un historial acotado para poder
+    responder solo con los asientos modificados desde una versión.
+    """
+
+    def __init__(self, total_seats: int, version: int = 0, history_size: int = 256):
+        self.total_seats = total_seats
+        self.version = version
+        self.data = bytearray((total_seats + SEATS_PER_BYTE - 1) // SEATS_PER_BYTE)
+        self.history_size = history_size
+        self.changes = deque()  # (versión, asiento, código)
+        self.history_floor = version  # versión más antigua desde la que hay delta completo
+        self.checked_at = 0.0
+
+    def get(self, seat: int) -> int:
+        """Código de estado del asiento"""
+        index = seat - 1
+        shift = (index % SEATS_PER_BYTE) * BITS_PER_SEAT
+        return (self.data[index // SEATS_PER_BYTE] >> shift) & 0b11
+
+    def set(self, seat: int, code: int):
+        """Fijar el código de estado del asiento"""
+        index = seat - 1
+        shift = (index % SEATS_PER_BYTE) * BITS_PER_SEAT
+        byte = self.data[index // SEATS_PER_BYTE]
+        self.data[index // SEATS_PER_BYTE] = (byte & ~(0b11 << shift)) | (code << shift)
+
+    @classmethod
+    def from_rows(cls, rows: List[dict], version: int = 0) -> "SeatMap":
+        """Construir el mapa a partir de filas (numero_asiento, estado)"""
+        total = max((row['numero_asiento'] for row in rows), default=0)
+        seat_map = cls(total, version)
+        for row in rows:
+            seat_map.set(row['numero_asiento'], STATE_CODES.get(row['estado'], 0))
+        return seat_map
+
+    def apply(self, other: "SeatMap"):
+        """Incorporar un mapa más reciente registrando los asientos que cambiaron"""
+        if other.total_seats != self.total_seats:
+            # Cambió la capacidad: no hay delta posible
+            self.total_seats = other.total_seats
+            self.data = other.data
+            self.changes.clear()
+            self.history_floor = other.version
+        else:
+            for seat in range(1, self.total_seats + 1):
+                code = other.get(seat)
+                if code != self.get(seat):
+                    self.set(seat, code)
+                    self.changes.append((other.version, seat, code))
+            while len(self.changes) > self.history_size:
+                self.history_floor = self.changes.popleft()[0]
+        self.version = other.version
+
+    def changes_since(self, version: int) -> Optional[List[Tuple[int, int]]]:
+        """Asientos modificados después de `version`
+
+        Devuelve None si el historial ya no cubre esa versión y el cliente
+        debe pedir el mapa completo.
+        """
+        if version == self.version:
+            return []
+        if version > self.version or version < self.history_floor:
+            return None
+
+        latest = {}
+        for change_version, seat, code in self.changes:
+            if change_version > version:
+                latest[seat] = code
+        return sorted(latest.items())
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.data)
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.data).decode('ascii')
+
+    def count(self, code: int) -> int:
+        """Cantidad de asientos con el estado indicado"""
+        return sum(1 for seat in range(1, self.total_seats + 1) if self.get(seat) == code)
+
+class SeatMapCache:
+    """Caché en memoria de mapas de asientos por función
+
+    Cada función guarda su `version_asientos`; el mapa solo se recarga de
+    la base de datos cuando esa versión cambia. La versión se consulta como
+    máximo una vez cada `check_interval` segundos por función.
+    """
+
+    def __init__(self, loader, version_loader, check_interval: float = 1.0):
+        self.loader = loader                  # async (id_funcion) -> (filas, versión)
+        self.version_loader = version_loader  # async (id_funcion) -> versión o None
+        self.check_interval = check_interval
+        self.maps: Dict[int, SeatMap] = {}
+        self.locks: Dict[int, asyncio.Lock] = {}
+
+    async def get(self, showtime_id: int) -> Optional[SeatMap]:
+        """Obtener el mapa vigente de una función (None si no existe)"""
+        seat_map = self.maps.get(showtime_id)
+        if seat_map and time.monotonic() - seat_map.checked_at < self.check_interval:
+            return seat_map
+
+        lock = self.locks.setdefault(showtime_id, asyncio.Lock())
+        async with lock:
+            seat_map = self.maps.get(showtime_id)
+            if seat_map and time.monotonic() - seat_map.checked_at < self.check_interval:
+                return seat_map
+
+            version = await self.version_loader(showtime_id)
+            if version is None:
+                self.invalidate(showtime_id)
+                return None
+
+            if seat_map is None or seat_map.version != version:
+                rows, version = await self.loader(showtime_id)
+                fresh = SeatMap.from_rows(rows, version)
+                if seat_map is None:
+                    seat_map = fresh
+                    self.maps[showtime_id] = seat_map
+                else:
+                    seat_map.apply(fresh)
+
+            seat_map.checked_at = time.monotonic()
+            return seat_map
+
+    def invalidate(self, showtime_id: int):
+        """Descartar el mapa de una función"""
+        self.maps.pop(showtime_id, None)
+        self.locks.pop(showtime_id, None)
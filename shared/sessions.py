@@ -0,0 +1,143 @@
+"""Sesiones con refresh tokens rotativos
+
+Al iniciar sesión se entrega, junto al access token (JWT de 30 minutos),
+un refresh token opaco y aleatorio. En la tabla `sesiones` solo se guarda
+su SHA-256 (índice único), los claims del usuario y la familia de la sesión.
+Renovar es una búsqueda por ese índice y un INSERT: no se lee `usuarios`
+ni se calcula el hash de la contraseña.
+
+Rotación: cada refresh token sirve una sola vez; al usarlo se marca como
+rotado y se emite otro de la misma familia. Si llega uno ya rotado (robado
+y reutilizado) se revoca toda la familia. Cerrar sesión revoca la familia;
+cambiar el rol o borrar al usuario revoca todas sus sesiones. Los access
+tokens ya emitidos siguen valiendo hasta su `exp`.
+"""
+import hashlib
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Tuple
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv('REFRESH_TOKEN_EXPIRE_DAYS', '14'))
+REFRESH_TOKEN_BYTES = 32
+
+def refresh_token_hash(token: str) -> bytes:
+    return hashlib.sha256(token.encode('utf-8')).digest()
+
+class SessionStore:
+    """Sesiones en la tabla `sesiones`; `db` es el gestor de base de datos del servicio"""
+
+    def __init__(self, db, expire_days: int = REFRESH_TOKEN_EXPIRE_DAYS):
+        self.db = db
+        self.expire = timedelta(days=expire_days)
+        self.created = 0
+        self.rotated = 0
+        self.rejected = 0
+        self.reused = 0
+
+    def _insert(self, tx, claims: dict, family: str, now: datetime) -> str:
+        token = secrets.token_urlsafe(REFRESH_TOKEN_BYTES)
+        tx.execute(
+            """INSERT INTO sesiones (id_usuario, familia, token_hash, correo, nombre, rol, fecha_expiracion)
+               VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+            (claims['id_usuario'], family, refresh_token_hash(token), claims['correo'],
+             claims['nombre'], claims['rol'], now + self.expire)
+        )
+        return token
+
+    def create(self, user: dict) -> str:
+        """Abrir una sesión nueva para `user` (id_usuario, correo, nombre, rol)"""
+        with self.db.transaction() as tx:
+            token = self._insert(tx, user, secrets.token_hex(16), datetime.utcnow())
+        self.created += 1
+        return token
+
+    def rotate(self, token: str) -> Tuple[dict, str]:
+        """Canjear un refresh token por otro; devuelve (claims, refresh token nuevo)
+
+        Lanza 401 si no existe, venció, fue revocado o ya se había usado.
+        """
+        now = datetime.utcnow()
+        claims = None
+        new_token = None
+        reused = False
+        with self.db.transaction() as tx:
+            rows = tx.execute(
+                """SELECT id_sesion, id_usuario, familia, correo, nombre, rol,
+                          fecha_expiracion, fecha_rotacion, fecha_revocacion
+                   FROM sesiones WHERE token_hash = %s FOR UPDATE""",
+                (refresh_token_hash(token),)
+            )
+            session = rows[0] if rows else None
+            active = (session is not None and session['fecha_revocacion'] is None
+                      and session['fecha_expiracion'] > now)
+            if active and session['fecha_rotacion'] is not None:
+                # Reutilización de un token ya canjeado: se invalida toda la familia
+                tx.execute(
+                    "UPDATE sesiones SET fecha_revocacion = %s WHERE familia = %s AND fecha_revocacion IS NULL",
+                    (now, session['familia'])
+                )
+                reused = True
+            elif active:
+                tx.execute("UPDATE sesiones SET fecha_rotacion = %s WHERE id_sesion = %s", (now, session['id_sesion']))
+                claims = {
+                    "id_usuario": session['id_usuario'],
+                    "correo": session['correo'],
+                    "nombre": session['nombre'],
+                    "rol": session['rol']
+                }
+                new_token = self._insert(tx, claims, session['familia'], now)
+
+        if reused:
+            self.reused += 1
+            logger.warning(f"Refresh token reutilizado; sesión revocada para usuario {session['id_usuario']}")
+        if new_token is None:
+            self.rejected += 1
+            raise HTTPException(status_code=401, detail="Sesión inválida o expirada")
+        self.rotated += 1
+        return claims, new_token
+
+    def revoke(self, token: str) -> bool:
+        """Cerrar la sesión de un refresh token (toda su familia)"""
+        rows = self.db.execute_query(
+            "SELECT familia FROM sesiones WHERE token_hash = %s",
+            (refresh_token_hash(token),)
+        )
+        if not rows:
+            return False
+        self.db.execute_query(
+            "UPDATE sesiones SET fecha_revocacion = %s WHERE familia = %s AND fecha_revocacion IS NULL",
+            (datetime.utcnow(), rows[0]['familia']),
+            fetch=False
+        )
+        return True
+
+    def revoke_user(self, user_id: int) -> int:
+        """Revocar todas las sesiones activas de un usuario"""
+        return self.db.execute_query(
+            "UPDATE sesiones SET fecha_revocacion = %s WHERE id_usuario = %s AND fecha_revocacion IS NULL",
+            (datetime.utcnow(), user_id),
+            fetch=False
+        )
+
+    def purge_expired(self) -> int:
+        """Borrar sesiones vencidas"""
+        return self.db.execute_query(
+            "DELETE FROM sesiones WHERE fecha_expiracion < %s",
+            (datetime.utcnow(),),
+            fetch=False
+        )
+
+    def metrics(self) -> dict:
+        return {
+            "created": self.created,
+            "rotated": self.rotated,
+            "rejected": self.rejected,
+            "reused": self.reused,
+            "expire_days": self.expire.days,
+        }
@@ -0,0 +1,98 @@
+"""Queries de lectura de funciones compartidas por el servicio de salas
+
+El servicio las ejecuta y scripts/check_query_plans.py corre EXPLAIN sobre
+las mismas sentencias, así la verificación de planes no se desfasa del
+código que realmente llega a la base.
+"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from shared.pagination import keyset_condition
+
+# Contador y versión efectivos de la función `f`: la columna de `funciones`
+# más lo acumulado en sus franjas de `funciones_contadores`
+AVAILABLE_SEATS_SQL = """f.asientos_disponibles + CAST(COALESCE(
+                   (SELECT SUM(c.delta_disponibles) FROM funciones_contadores c
+                    WHERE c.id_funcion = f.id_funcion), 0) AS SIGNED)"""
+
+SEAT_VERSION_SQL = """SELECT f.version_asientos + CAST(COALESCE(
+                   (SELECT SUM(c.version) FROM funciones_contadores c
+                    WHERE c.id_funcion = f.id_funcion), 0) AS SIGNED) as version_asientos
+               FROM funciones f WHERE f.id_funcion = %s"""
+
+SHOWTIMES_SQL = f"""
+        SELECT f.id_funcion, f.id_pelicula, f.id_sala, f.horario, f.precio,
+               p.titulo as pelicula_titulo, s.nombre as sala_nombre,
+               {AVAILABLE_SEATS_SQL} as asientos_disponibles
+        FROM funciones f
+        JOIN peliculas p ON f.id_pelicula = p.id_pelicula
+        JOIN salas s ON f.id_sala = s.id_sala
+        WHERE f.horario > NOW()
+        """
+
+SHOWTIME_BY_ID_SQL = f"""SELECT f.id_funcion, f.id_pelicula, f.id_sala, f.horario, f.precio,
+                      p.titulo as pelicula_titulo, s.nombre as sala_nombre,
+                      {AVAILABLE_SEATS_SQL} as asientos_disponibles
+               FROM funciones f
+               JOIN peliculas p ON f.id_pelicula = p.id_pelicula
+               JOIN salas s ON f.id_sala = s.id_sala
+               WHERE f.id_funcion = %s"""
+
+SCHEDULE_SQL = f"""SELECT f.id_funcion, f.horario, f.precio,
+                      p.titulo, p.duracion, p.clasificacion, p.imagen_url,
+                      s.nombre as sala, s.tipo as sala_tipo,
+                      {AVAILABLE_SEATS_SQL} as asientos_disponibles
+               FROM funciones f
+               JOIN peliculas p ON f.id_pelicula = p.id_pelicula
+               JOIN salas s ON f.id_sala = s.id_sala
+               WHERE f.horario >= %s AND f.horario < %s
+               ORDER BY f.horario"""
+
+ROOM_TIMELINES_SQL = """SELECT f.id_funcion, f.id_sala, f.horario, p.duracion
+               FROM funciones f
+               JOIN peliculas p ON f.id_pelicula = p.id_pelicula
+               WHERE f.horario > NOW() - INTERVAL 1 DAY"""
+
+def room_timelines_query(room_ids: List[int]) -> Tuple[str, tuple]:
+    """Funciones vigentes de algunas salas (recarga parcial del índice)"""
+    return (
+        ROOM_TIMELINES_SQL + f" AND f.id_sala IN ({', '.join(['%s'] * len(room_ids))})",
+        tuple(room_ids)
+    )
+
+SEAT_MAP_SQL = "SELECT numero_asiento, estado FROM asientos WHERE id_funcion = %s"
+
+def showtimes_query(movie_id: Optional[int] = None, theater_id: Optional[int] = None,
+                    day: Optional[Tuple[datetime, datetime]] = None, after: Optional[List] = None,
+                    limit: int = 50, skip: int = 0) -> Tuple[str, tuple]:
+    """Listado de funciones futuras con filtros, ordenado por (horario, id)
+
+    `day` es el rango [inicio, fin) de un día y `after` la clave
+    (horario, id_funcion) de un cursor.
+    """
+    query = SHOWTIMES_SQL
+    params = []
+
+    if movie_id:
+        query += " AND f.id_pelicula = %s"
+        params.append(movie_id)
+
+    if theater_id:
+        query += " AND f.id_sala = %s"
+        params.append(theater_id)
+
+    if day:
+        query += " AND f.horario >= %s AND f.horario < %s"
+        params.extend(day)
+
+    if after is not None:
+        condition, condition_params = keyset_condition(["f.horario", "f.id_funcion"], after)
+        query += " AND " + condition
+        params.extend(condition_params)
+
+    query += """
+        ORDER BY f.horario, f.id_funcion
+        LIMIT %s OFFSET %s
+        """
+    params.extend([limit, skip])
+    return query, tuple(params)
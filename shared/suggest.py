@@ -0,0 +1,212 @@
+"""Autocompletado de películas con un trie de prefijos
+
+Cada nodo del trie guarda las K mejores sugerencias de su subárbol, así una
+consulta solo recorre tantos nodos como letras tenga el prefijo. Se indexa
+el texto completo y cada palabra (no vacía) en que empieza, para que
+"reload" sugiera "Matrix Reloaded". Títulos, directores y géneros se
+normalizan igual que en la búsqueda (sin acentos ni mayúsculas).
+"""
+import bisect
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from shared.search import STOPWORDS, fold
+
+SUGGEST_MAX_K = 10
+
+# Prioridad de cada tipo de sugerencia (mayor primero)
+KIND_WEIGHTS = {
+    'titulo': 3,
+    'director': 2,
+    'genero': 1,
+}
+
+NON_WORD_RE = re.compile(r"[^a-z0-9ñ]+")
+
+def normalize(text: str) -> str:
+    """Texto sin acentos, en minúsculas y con un solo espacio entre palabras"""
+    return NON_WORD_RE.sub(' ', fold(text)).strip()
+
+def prefix_keys(normalized: str) -> List[str]:
+    """Claves a indexar: el texto completo y desde cada palabra no vacía"""
+    words = normalized.split(' ')
+    keys = [normalized]
+    for position in range(1, len(words)):
+        if words[position] not in STOPWORDS:
+            keys.append(' '.join(words[position:]))
+    return keys
+
+class _Node:
+    __slots__ = ('children', 'terminal', 'top')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.terminal: set = set()
+        self.top: list = []
+
+class Suggestion:
+    __slots__ = ('key', 'text', 'kind', 'movie_id', 'rank', 'refs')
+
+    def __init__(self, key, text: str, kind: str, movie_id: Optional[int]):
+        self.key = key
+        self.text = text
+        self.kind = kind
+        self.movie_id = movie_id
+        self.rank = (-KIND_WEIGHTS[kind], len(text), normalize(text))
+        self.refs = 0
+
+    def to_dict(self) -> dict:
+        result = {"texto": self.text, "tipo": self.kind}
+        if self.movie_id is not None:
+            result["id_pelicula"] = self.movie_id
+        return result
+
+class PrefixTrie:
+    """Trie con las K mejores sugerencias precalculadas en cada nodo"""
+
+    def __init__(self, k: int = SUGGEST_MAX_K):
+        self.k = k
+        self.root = _Node()
+        self.suggestions: Dict[Tuple, Suggestion] = {}
+
+    def _rank(self, sid) -> tuple:
+        return self.suggestions[sid].rank
+
+    def insert(self, sid, keys: List[str]):
+        """Registrar una sugerencia bajo cada una de sus claves"""
+        rank = self._rank(sid)
+        for key in keys:
+            node = self.root
+            for char in key:
+                node = node.children.setdefault(char, _Node())
+                if sid not in node.top:
+                    if len(node.top) < self.k or rank < self._rank(node.top[-1]):
+                        bisect.insort(node.top, sid, key=self._rank)
+                        del node.top[self.k:]
+            node.terminal.add(sid)
+
+    def remove(self, sid, keys: List[str]):
+        """Quitar una sugerencia y recalcular los nodos afectados de abajo hacia arriba"""
+        affected: Dict[int, Tuple[int, _Node, _Node, str]] = {}
+        for key in keys:
+            node = self.root
+            path = []
+            for char in key:
+                child = node.children.get(char)
+                if child is None:
+                    break
+                path.append((node, char, child))
+                node = child
+            else:
+                node.terminal.discard(sid)
+            for depth, (parent, char, child) in enumerate(path):
+                affected[id(child)] = (depth, parent, child, char)
+
+        for depth, parent, node, char in sorted(affected.values(), key=lambda item: -item[0]):
+            candidates = {s for s in node.terminal if s != sid}
+            for child in node.children.values():
+                candidates.update(s for s in child.top if s != sid)
+            node.top = sorted(candidates, key=self._rank)[:self.k]
+            if not node.top and not node.children and not node.terminal:
+                parent.children.pop(char, None)
+
+    def lookup(self, prefix: str, k: int) -> List[Suggestion]:
+        """Mejores `k` sugerencias que empiezan con `prefix` (ya normalizado)"""
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [self.suggestions[sid] for sid in node.top[:k]]
+
+class MovieSuggester:
+    """Sugerencias de títulos, directores y géneros del catálogo
+
+    Directores y géneros se comparten entre películas: se cuentan las
+    referencias y la sugerencia se quita cuando ninguna película la usa.
+    La reconstrucción completa arma un trie nuevo sin tomar el lock y solo
+    lo toma para reemplazarlo.
+    """
+
+    FIELDS = (('titulo', 'titulo'), ('director', 'director'), ('genero', 'genero'))
+
+    def __init__(self, k: int = SUGGEST_MAX_K):
+        self.k = k
+        self.trie = PrefixTrie(k)
+        self.movies: Dict[int, List[Tuple]] = {}
+        self.lock = threading.RLock()
+        # Cambios recibidos mientras se reconstruye; se reaplican al reemplazar
+        self.pending: Optional[List[Tuple[str, object]]] = None
+
+    def build(self, rows: List[dict]):
+        """Reconstruir las sugerencias desde todas las películas"""
+        with self.lock:
+            self.pending = []
+        fresh = MovieSuggester(self.k)
+        try:
+            for row in rows:
+                fresh._add(row)
+        except BaseException:
+            with self.lock:
+                self.pending = None
+            raise
+
+        with self.lock:
+            for action, value in self.pending:
+                if action == 'upsert':
+                    fresh.upsert(value)
+                else:
+                    fresh.remove(value)
+            self.pending = None
+            self.trie = fresh.trie
+            self.movies = fresh.movies
+
+    def upsert(self, row: dict):
+        """Agregar o actualizar las sugerencias de una película"""
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append(('upsert', row))
+            self._remove(row['id_pelicula'])
+            self._add(row)
+
+    def remove(self, movie_id: int):
+        """Quitar las sugerencias de una película"""
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append(('remove', movie_id))
+            self._remove(movie_id)
+
+    def suggest(self, prefix: str, k: int = SUGGEST_MAX_K) -> List[dict]:
+        """Sugerencias para lo que el usuario lleva escrito"""
+        normalized = normalize(prefix)
+        if not normalized:
+            return []
+        with self.lock:
+            return [suggestion.to_dict() for suggestion in self.trie.lookup(normalized, min(k, self.k))]
+
+    def _add(self, row: dict):
+        movie_id = row['id_pelicula']
+        sids = []
+        for field, kind in self.FIELDS:
+            text = (row.get(field) or '').strip()
+            normalized = normalize(text)
+            if not normalized:
+                continue
+            sid = (kind, movie_id) if kind == 'titulo' else (kind, normalized)
+            suggestion = self.trie.suggestions.get(sid)
+            if suggestion is None:
+                suggestion = Suggestion(sid, text, kind, movie_id if kind == 'titulo' else None)
+                self.trie.suggestions[sid] = suggestion
+                self.trie.insert(sid, prefix_keys(normalized))
+            suggestion.refs += 1
+            sids.append(sid)
+        self.movies[movie_id] = sids
+
+    def _remove(self, movie_id: int):
+        for sid in self.movies.pop(movie_id, []):
+            suggestion = self.trie.suggestions[sid]
+            suggestion.refs -= 1
+            if suggestion.refs == 0:
+                self.trie.remove(sid, prefix_keys(suggestion.rank[2]))
+                del self.trie.suggestions[sid]
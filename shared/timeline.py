@@ -0,0 +1,238 @@
+from datetime import datetime, timedelta
+from typing import Dict, Hashable, List, Optional, Tuple
+
+class _Node:
+    __slots__ = ('start', 'end', 'key', 'left', 'right', 'height', 'max_end')
+
+    def __init__(self, start, end, key):
+        self.start = start
+        self.end = end
+        self.key = key
+        self.left = None
+        self.right = None
+        self.height = 1
+        self.max_end = end
+
+def _height(node) -> int:
+    return node.height if node else 0
+
+def _update(node):
+    node.height = 1 + max(_height(node.left), _height(node.right))
+    node.max_end = node.end
+    if node.left and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+
+def _rotate_right(node):
+    pivot = node.left
+    node.left = pivot.right
+    pivot.right = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+def _rotate_left(node):
+    pivot = node.right
+    node.right = pivot.left
+    pivot.left = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+def _balance(node):
+    _update(node)
+    factor = _height(node.left) - _height(node.right)
+    if factor > 1:
+        if _height(node.left.left) < _height(node.left.right):
+            node.left = _rotate_left(node.left)
+        return _rotate_right(node)
+    if factor < -1:
+        if _height(node.right.right) < _height(node.right.left):
+            node.right = _rotate_right(node.right)
+        return _rotate_left(node)
+    return node
+
+class IntervalTree:
+    """Árbol de intervalos semiabiertos [inicio, fin) balanceado (AVL)
+
+    Los nodos se ordenan por (inicio, clave) y cada uno guarda el fin máximo
+    de su subárbol, lo que permite descartar ramas completas al buscar
+    solapamientos. Inserción, borrado y búsqueda del primer solapamiento son
+    O(log n).
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def insert(self, start, end, key: Hashable):
+        """Agregar el intervalo [start, end) identificado por `key`"""
+        def insert_at(node):
+            if node is None:
+                return _Node(start, end, key)
+            if (start, key) < (node.start, node.key):
+                node.left = insert_at(node.left)
+            else:
+                node.right = insert_at(node.right)
+            return _balance(node)
+
+        self.root = insert_at(self.root)
+        self.size += 1
+
+    def remove(self, start, key: Hashable) -> bool:
+        """Quitar el intervalo que empieza en `start` con la clave `key`"""
+        removed = False
+
+        def pop_min(node):
+            if node.left is None:
+                return node.right, node
+            node.left, smallest = pop_min(node.left)
+            return _balance(node), smallest
+
+        def remove_at(node):
+            nonlocal removed
+            if node is None:
+                return None
+            if (start, key) < (node.start, node.key):
+                node.left = remove_at(node.left)
+            elif (start, key) > (node.start, node.key):
+                node.right = remove_at(node.right)
+            else:
+                removed = True
+                if node.left is None:
+                    return node.right
+                if node.right is None:
+                    return node.left
+                node.right, successor = pop_min(node.right)
+                successor.left = node.left
+                successor.right = node.right
+                node = successor
+            return _balance(node)
+
+        self.root = remove_at(self.root)
+        if removed:
+            self.size -= 1
+        return removed
+
+    def first_overlap(self, start, end) -> Optional[Tuple]:
+        """Intervalo solapado con [start, end) de menor inicio, o None"""
+        node = self.root
+        found = None
+        while node is not None:
+            if node.left is not None and node.left.max_end > start:
+                # Puede haber un solapamiento con inicio menor a la izquierda
+                if node.start < end and node.end > start:
+                    found = node
+                node = node.left
+                continue
+            if node.start < end and node.end > start:
+                return (node.start, node.end, node.key)
+            if node.start >= end:
+                break
+            node = node.right
+        return (found.start, found.end, found.key) if found else None
+
+    def overlapping(self, start, end) -> List[Tuple]:
+        """Todos los intervalos que se solapan con [start, end), en orden"""
+        result = []
+
+        def visit(node):
+            if node is None or node.max_end <= start:
+                return
+            visit(node.left)
+            if node.start < end and node.end > start:
+                result.append((node.start, node.end, node.key))
+            if node.start < end:
+                visit(node.right)
+
+        visit(self.root)
+        return result
+
+class RoomTimelines:
+    """Índice en memoria de la ocupación de cada sala
+
+    Cada función ocupa la sala desde su horario hasta que termina la
+    película más el tiempo de limpieza. Permite consultar conflictos y el
+    siguiente horario libre de una sala en tiempo logarítmico.
+    """
+
+    def __init__(self, cleaning_buffer: timedelta):
+        self.cleaning_buffer = cleaning_buffer
+        self.rooms: Dict[int, IntervalTree] = {}
+        self.showtimes: Dict[Hashable, Tuple[int, datetime, datetime]] = {}
+
+    def occupied_until(self, start: datetime, duration_minutes: int) -> datetime:
+        """Fin de la ocupación de una función (película + limpieza)"""
+        return start + timedelta(minutes=duration_minutes) + self.cleaning_buffer
+
+    def load(self, rows: List[dict]):
+        """Reconstruir el índice desde filas (id_funcion, id_sala, horario, duracion)"""
+        self.rooms = {}
+        self.showtimes = {}
+        for row in rows:
+            self.add(row['id_funcion'], row['id_sala'], row['horario'], row['duracion'])
+
+    def load_rooms(self, room_ids: List[int], rows: List[dict]):
+        """Reemplazar solo las salas indicadas con filas leídas de la base"""
+        rooms = set(room_ids)
+        for room_id in rooms:
+            self.rooms.pop(room_id, None)
+        self.showtimes = {key: entry for key, entry in self.showtimes.items() if entry[0] not in rooms}
+        for row in rows:
+            self.add(row['id_funcion'], row['id_sala'], row['horario'], row['duracion'])
+
+    def add(self, showtime_id: Hashable, room_id: int, start: datetime, duration_minutes: int):
+        """Registrar una función en la línea de tiempo de su sala"""
+        self.remove(showtime_id)
+        end = self.occupied_until(start, duration_minutes)
+        self.rooms.setdefault(room_id, IntervalTree()).insert(start, end, showtime_id)
+        self.showtimes[showtime_id] = (room_id, start, end)
+
+    def remove(self, showtime_id: Hashable) -> bool:
+        """Quitar una función del índice"""
+        entry = self.showtimes.pop(showtime_id, None)
+        if entry is None:
+            return False
+        room_id, start, _ = entry
+        self.rooms[room_id].remove(start, showtime_id)
+        return True
+
+    def conflicts(self, room_id: int, start: datetime, duration_minutes: int,
+                  exclude: Optional[Hashable] = None) -> List[Hashable]:
+        """Funciones de la sala que se cruzan con una función propuesta"""
+        tree = self.rooms.get(room_id)
+        if tree is None:
+            return []
+        end = self.occupied_until(start, duration_minutes)
+        return [key for _, _, key in tree.overlapping(start, end) if key != exclude]
+
+    def has_conflict(self, room_id: int, start: datetime, duration_minutes: int,
+                     exclude: Optional[Hashable] = None) -> bool:
+        """Indica si la función propuesta choca con alguna existente"""
+        if exclude is None:
+            tree = self.rooms.get(room_id)
+            if tree is None:
+                return False
+            return tree.first_overlap(start, self.occupied_until(start, duration_minutes)) is not None
+        return bool(self.conflicts(room_id, start, duration_minutes, exclude))
+
+    def next_free_slot(self, room_id: int, after: datetime, duration_minutes: int) -> datetime:
+        """Primer horario >= `after` en que cabe una función de esa duración
+
+        Salta de fin en fin de las funciones que bloquean el hueco; cada salto
+        es una búsqueda O(log n).
+        """
+        tree = self.rooms.get(room_id)
+        start = after
+        if tree is None:
+            return start
+        length = self.occupied_until(start, duration_minutes) - start
+        while True:
+            blocking = tree.first_overlap(start, start + length)
+            if blocking is None:
+                return start
+            start = blocking[1]
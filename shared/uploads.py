@@ -0,0 +1,288 @@
+"""Escritura de archivos subidos en streaming y subidas reanudables
+
+`stream_upload` copia un `UploadFile` a disco por bloques: la memoria por
+subida es constante, el límite de tamaño se aplica a medida que llegan los
+bytes (se corta apenas se excede) y el SHA-256 se calcula en el mismo
+recorrido. Se escribe a un `.part` que solo se renombra al terminar.
+
+`ResumableUploads` implementa el núcleo del protocolo tus 1.0
+(creación, consulta del offset con HEAD, PATCH por offset y terminación)
+para trailers grandes: si la conexión se corta, el cliente pregunta el
+offset y continúa desde ahí. El estado vive junto a los datos en el
+directorio compartido de uploads, así cualquier réplica puede continuar
+una subida.
+"""
+import asyncio
+import base64
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import aiofiles
+from fastapi import HTTPException, UploadFile
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(1024 * 1024)))
+# Subidas reanudables sin actividad por más de este tiempo se descartan
+RESUMABLE_UPLOAD_TTL = int(os.getenv('RESUMABLE_UPLOAD_TTL', str(24 * 3600)))
+
+TUS_VERSION = '1.0.0'
+# Código de tus para "Checksum Mismatch"
+CHECKSUM_MISMATCH = 460
+# Otra petición (de este u otro proceso) está escribiendo la misma subida
+UPLOAD_LOCKED = 423
+
+async def stream_upload(file: UploadFile, path: str, max_size: int,
+                        chunk_size: int = UPLOAD_CHUNK_SIZE) -> Tuple[int, str]:
+    """Copiar `file` a `path` por bloques; devuelve (tamaño, sha256)
+
+    Lanza 413 en cuanto se supera `max_size` y no deja archivos a medias.
+    """
+    if file.size is not None and file.size > max_size:
+        raise HTTPException(status_code=413, detail="Archivo demasiado grande")
+
+    partial = path + '.part'
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(partial, 'wb') as f:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=413, detail="Archivo demasiado grande")
+                digest.update(chunk)
+                await f.write(chunk)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return size, digest.hexdigest()
+
+def parse_upload_metadata(header: Optional[str]) -> Dict[str, str]:
+    """Cabecera Upload-Metadata de tus: `clave base64,clave2 base64`"""
+    metadata = {}
+    if not header:
+        return metadata
+    for pair in header.split(','):
+        parts = pair.strip().split(' ', 1)
+        if not parts[0]:
+            continue
+        try:
+            metadata[parts[0]] = base64.b64decode(parts[1]).decode('utf-8') if len(parts) > 1 else ''
+        except Exception:
+            raise HTTPException(status_code=400, detail="Upload-Metadata inválido")
+    return metadata
+
+class ResumableUploads:
+    """Subidas reanudables estilo tus sobre un directorio compartido
+
+    Por cada subida hay `<id>.json` (longitud, metadatos, dueño, destino) y
+    `<id>.part` con los bytes recibidos; el offset es el tamaño de `.part`.
+    El SHA-256 se mantiene incremental en memoria mientras la subida sigue
+    en este proceso; si continúa en otro, se recalcula una vez desde disco.
+    Cada PATCH toma un `flock` exclusivo sobre `.part`, así dos réplicas no
+    escriben a la vez en la misma subida.
+    """
+
+    def __init__(self, state_dir: str, max_size: int):
+        self.state_dir = state_dir
+        self.max_size = max_size
+        # id -> (hash incremental, bytes cubiertos)
+        self.digests: Dict[str, Tuple] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+        os.makedirs(state_dir, exist_ok=True)
+
+    def _paths(self, upload_id: str) -> Tuple[str, str]:
+        try:
+            uuid.UUID(upload_id)
+        except ValueError:
+            raise HTTPException(status_code=404, detail="Subida no encontrada")
+        base = os.path.join(self.state_dir, upload_id)
+        return base + '.json', base + '.part'
+
+    def _write_state(self, upload_id: str, state: dict):
+        meta_path, _ = self._paths(upload_id)
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def create(self, length: int, metadata: Dict[str, str], owner: int, target_dir: str, target_url: str) -> str:
+        """Registrar una subida nueva; `target_*` es donde quedará el archivo"""
+        if length < 0:
+            raise HTTPException(status_code=400, detail="Upload-Length inválido")
+        if length > self.max_size:
+            raise HTTPException(status_code=413, detail="Archivo demasiado grande")
+        self.expire()
+
+        upload_id = str(uuid.uuid4())
+        _, data_path = self._paths(upload_id)
+        open(data_path, 'wb').close()
+        self._write_state(upload_id, {
+            "length": length,
+            "metadata": metadata,
+            "owner": owner,
+            "target_dir": target_dir,
+            "target_url": target_url,
+            "url": None,
+            "sha256": None,
+            "updated": time.time(),
+        })
+        return upload_id
+
+    def state(self, upload_id: str) -> Tuple[dict, int]:
+        """Estado y offset actual de una subida (404 si no existe)"""
+        meta_path, data_path = self._paths(upload_id)
+        try:
+            with open(meta_path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Subida no encontrada")
+        if state["url"] is not None:
+            return state, state["length"]
+        return state, os.path.getsize(data_path) if os.path.exists(data_path) else 0
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        """Agregar bytes en `offset` (PATCH); devuelve el nuevo offset"""
+        async with self.locks.setdefault(upload_id, asyncio.Lock()):
+            with self._file_lock(upload_id):
+                return await self._append(upload_id, offset, chunks)
+
+    @contextmanager
+    def _file_lock(self, upload_id: str):
+        """`flock` exclusivo sobre `.part`; 423 si otro proceso lo tiene"""
+        _, data_path = self._paths(upload_id)
+        try:
+            f = open(data_path, 'rb')
+        except FileNotFoundError:
+            state, _ = self.state(upload_id)
+            if state["url"] is not None:
+                raise HTTPException(status_code=409, detail="La subida ya está completa")
+            raise HTTPException(status_code=404, detail="Subida no encontrada")
+        try:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise HTTPException(status_code=UPLOAD_LOCKED, detail="La subida está recibiendo datos en otra conexión")
+            yield
+        finally:
+            # Cerrar el descriptor libera el lock
+            f.close()
+
+    async def _append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> int:
+        state, current = self.state(upload_id)
+        if state["url"] is not None:
+            raise HTTPException(status_code=409, detail="La subida ya está completa")
+        if offset != current:
+            raise HTTPException(status_code=409, detail=f"Offset incorrecto; el actual es {current}")
+
+        _, data_path = self._paths(upload_id)
+        digest, covered = self.digests.get(upload_id, (None, -1))
+        if covered != current:
+            digest = await asyncio.to_thread(self._digest_from_disk, data_path)
+
+        length = state["length"]
+        written = current
+        try:
+            async with aiofiles.open(data_path, 'ab') as f:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    if written + len(chunk) > length:
+                        raise HTTPException(status_code=413, detail="Se enviaron más bytes que Upload-Length")
+                    digest.update(chunk)
+                    await f.write(chunk)
+                    written += len(chunk)
+        finally:
+            # Los bytes ya escritos quedan: el cliente puede reanudar desde ahí
+            self.digests[upload_id] = (digest, written)
+            state["updated"] = time.time()
+            self._write_state(upload_id, state)
+
+        if written == length:
+            await asyncio.to_thread(self._finish, upload_id, state, digest.hexdigest())
+        return written
+
+    @staticmethod
+    def _digest_from_disk(path: str):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest
+
+    def _finish(self, upload_id: str, state: dict, sha256: str):
+        """Verificar el checksum declarado y mover el archivo a su destino"""
+        self.digests.pop(upload_id, None)
+        self.locks.pop(upload_id, None)
+        expected = state["metadata"].get("sha256")
+        if expected and expected.lower() != sha256:
+            self.terminate(upload_id)
+            raise HTTPException(status_code=CHECKSUM_MISMATCH, detail="El checksum no coincide")
+
+        _, data_path = self._paths(upload_id)
+        os.makedirs(state["target_dir"], exist_ok=True)
+        filename = os.path.basename(state["target_url"])
+        os.replace(data_path, os.path.join(state["target_dir"], filename))
+        state.update(url=state["target_url"], sha256=sha256, updated=time.time())
+        self._write_state(upload_id, state)
+        logger.info(f"Subida reanudable completa: {state['target_url']} ({state['length']} bytes, sha256 {sha256})")
+
+    def owned_state(self, upload_id: str, owner: int) -> Tuple[dict, int]:
+        """Como `state`, pero solo para el usuario que creó la subida"""
+        state, offset = self.state(upload_id)
+        if state["owner"] != owner:
+            raise HTTPException(status_code=404, detail="Subida no encontrada")
+        return state, offset
+
+    def claim(self, upload_id: str, owner: int, url_prefix: str) -> str:
+        """URL del archivo de una subida completa; la subida deja de existir
+
+        `url_prefix` valida que el archivo sea del tipo esperado (por ejemplo
+        un trailer y no una imagen).
+        """
+        state, _ = self.owned_state(upload_id, owner)
+        if state["url"] is None:
+            raise HTTPException(status_code=409, detail="La subida no está completa")
+        if not state["url"].startswith(url_prefix):
+            raise HTTPException(status_code=400, detail="La subida no corresponde a este archivo")
+        meta_path, _ = self._paths(upload_id)
+        os.remove(meta_path)
+        return state["url"]
+
+    def terminate(self, upload_id: str):
+        """Descartar una subida y sus datos (DELETE)"""
+        meta_path, data_path = self._paths(upload_id)
+        self.digests.pop(upload_id, None)
+        self.locks.pop(upload_id, None)
+        for path in (meta_path, data_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def expire(self):
+        """Descartar subidas abandonadas (y archivos completos nunca usados)"""
+        cutoff = time.time() - RESUMABLE_UPLOAD_TTL
+        for name in os.listdir(self.state_dir):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-len('.json')]
+            try:
+                state, _ = self.state(upload_id)
+            except HTTPException:
+                continue
+            if state["updated"] < cutoff:
+                if state["url"] is not None:
+                    completed = os.path.join(state["target_dir"], os.path.basename(state["url"]))
+                    if os.path.exists(completed):
+                        os.remove(completed)
+                self.terminate(upload_id)
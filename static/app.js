@@ -1,6 +1,7 @@
 // Global state
 let currentUser = null
 let authToken = null
+let refreshToken = null
 let cart = []
 let currentSection = "welcome"
 let selectedSeats = []
@@ -16,6 +17,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
   if (token && user) {
     authToken = token
+    refreshToken = localStorage.getItem("refreshToken")
     currentUser = JSON.parse(user)
     updateAuthUI()
   }
@@ -55,9 +57,11 @@ async function handleLogin(e) {
 
     if (response.ok) {
       authToken = data.access_token
+      refreshToken = data.refresh_token
       currentUser = data.user
 
       localStorage.setItem("authToken", authToken)
+      localStorage.setItem("refreshToken", refreshToken)
       localStorage.setItem("currentUser", JSON.stringify(currentUser))
 
       updateAuthUI()
@@ -107,13 +111,62 @@ async function handleRegister(e) {
   }
 }
 
+// Peticiones autenticadas: si el access token venció se renueva con el
+// refresh token (sin volver a iniciar sesión) y se reintenta una vez
+async function authFetch(url, options = {}) {
+  let response = await fetch(url, options)
+  if (response.status === 401 && refreshToken && (await refreshSession())) {
+    options.headers = { ...options.headers, Authorization: `Bearer ${authToken}` }
+    response = await fetch(url, options)
+  }
+  return response
+}
+
+// Una sola renovación aunque varias peticiones reciban 401 a la vez
+let refreshInFlight = null
+
+function refreshSession() {
+  if (!refreshInFlight) {
+    refreshInFlight = fetch(`${API_BASE}/auth/refresh`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ refresh_token: refreshToken }),
+    })
+      .then(async (response) => {
+        if (!response.ok) return false
+        const data = await response.json()
+        authToken = data.access_token
+        refreshToken = data.refresh_token
+        localStorage.setItem("authToken", authToken)
+        localStorage.setItem("refreshToken", refreshToken)
+        return true
+      })
+      .catch(() => false)
+      .finally(() => {
+        refreshInFlight = null
+      })
+  }
+  return refreshInFlight
+}
+
 function logout() {
+  if (refreshToken) {
+    // Revocar la sesión en el servidor; no hace falta esperar la respuesta
+    fetch(`${API_BASE}/auth/logout`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ refresh_token: refreshToken }),
+    }).catch(() => {})
+  }
+
   authToken = null
+  refreshToken = null
   currentUser = null
   cart = []
   selectedSeats = []
 
   localStorage.removeItem("authToken")
+  localStorage.removeItem("refreshToken")
   localStorage.removeItem("currentUser")
 
   updateAuthUI()
@@ -442,7 +495,7 @@ async function checkout() {
 
     const total = cart.reduce((sum, item) => sum + item.price * item.quantity, 0)
 
-    const response = await fetch(`${API_BASE}/tickets/purchase`, {
+    const response = await authFetch(`${API_BASE}/tickets/purchase`, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
@@ -558,7 +611,7 @@ async function loadAdminMovies() {
   content.innerHTML = '<div class="loading">Cargando...</div>'
 
   try {
-    const response = await fetch(`${API_BASE}/movies/`, {
+    const response = await authFetch(`${API_BASE}/movies/`, {
       headers: { Authorization: `Bearer ${authToken}` },
     })
     const movies = await response.json()
@@ -599,7 +652,7 @@ async function loadAdminTheaters() {
   content.innerHTML = '<div class="loading">Cargando...</div>'
 
   try {
-    const response = await fetch(`${API_BASE}/theaters/`, {
+    const response = await authFetch(`${API_BASE}/theaters/`, {
       headers: { Authorization: `Bearer ${authToken}` },
     })
     const theaters = await response.json()
@@ -640,7 +693,7 @@ async function loadAdminShowtimes() {
   content.innerHTML = '<div class="loading">Cargando...</div>'
 
   try {
-    const response = await fetch(`${API_BASE}/theaters/showtimes`, {
+    const response = await authFetch(`${API_BASE}/theaters/showtimes`, {
       headers: { Authorization: `Bearer ${authToken}` },
     })
     const showtimes = await response.json()
@@ -682,7 +735,7 @@ async function loadAdminProducts() {
   content.innerHTML = '<div class="loading">Cargando...</div>'
 
   try {
-    const response = await fetch(`${API_BASE}/products/`, {
+    const response = await authFetch(`${API_BASE}/products/`, {
       headers: { Authorization: `Bearer ${authToken}` },
     })
     const products = await response.json()
@@ -723,7 +776,7 @@ async function loadAdminUsers() {
   content.innerHTML = '<div class="loading">Cargando...</div>'
 
   try {
-    const response = await fetch(`${API_BASE}/auth/users`, {
+    const response = await authFetch(`${API_BASE}/auth/users`, {
       headers: { Authorization: `Bearer ${authToken}` },
     })
     const users = await response.json()
@@ -764,7 +817,7 @@ async function loadAdminReports() {
   content.innerHTML = '<div class="loading">Cargando...</div>'
 
   try {
-    const response = await fetch(`${API_BASE}/tickets/reports`, {
+    const response = await authFetch(`${API_BASE}/tickets/reports`, {
       headers: { Authorization: `Bearer ${authToken}` },
     })
     const reports = await response.json()
@@ -810,11 +863,40 @@ async function loadAdminReports() {
   }
 }
 
+// Seat map cache: { [showtimeId]: { version, codes } } (0 disponible, 1 ocupado, 2 reservado)
+const seatMaps = {}
+
+function decodeSeatMap(payload) {
+  const bytes = Uint8Array.from(atob(payload.mapa), (c) => c.charCodeAt(0))
+  const codes = new Uint8Array(payload.total_asientos)
+  for (let i = 0; i < codes.length; i++) {
+    codes[i] = (bytes[i >> 2] >> ((i & 3) * 2)) & 3
+  }
+  return { version: payload.version, codes }
+}
+
+async function loadSeatMap(showtimeId) {
+  const cached = seatMaps[showtimeId]
+  const query = cached ? `?since=${cached.version}` : ""
+  const response = await fetch(`${API_BASE}/theaters/showtimes/${showtimeId}/seatmap${query}`)
+  const payload = await response.json()
+
+  if (payload.cambios && cached) {
+    payload.cambios.forEach(([seat, code]) => {
+      cached.codes[seat - 1] = code
+    })
+    cached.version = payload.version
+  } else {
+    seatMaps[showtimeId] = decodeSeatMap(payload)
+  }
+
+  return Array.from(seatMaps[showtimeId].codes, (code, i) => ({ numero: i + 1, ocupado: code !== 0 }))
+}
+
 // Seat selection functionality
 async function selectShowtime(showtimeId) {
   try {
-    const response = await fetch(`${API_BASE}/theaters/showtimes/${showtimeId}/seats`)
-    const seats = await response.json()
+    const seats = await loadSeatMap(showtimeId)
 
     const modalBody = document.getElementById("modalBody")
     modalBody.innerHTML = `
@@ -988,7 +1070,7 @@ async function handleAddMovie(e) {
   }
 
   try {
-    const response = await fetch(`${API_BASE}/movies/`, {
+    const response = await authFetch(`${API_BASE}/movies/`, {
       method: "POST",
       headers: {
         Authorization: `Bearer ${authToken}`,
@@ -1071,7 +1153,7 @@ async function handleAddProduct(e) {
   }
 
   try {
-    const response = await fetch(`${API_BASE}/products/`, {
+    const response = await authFetch(`${API_BASE}/products/`, {
       method: "POST",
       headers: {
         Authorization: `Bearer ${authToken}`,
@@ -1098,7 +1180,7 @@ async function loadUserTickets() {
   grid.innerHTML = '<div class="loading">Cargando boletos...</div>'
 
   try {
-    const response = await fetch(`${API_BASE}/tickets/user/${currentUser.id_usuario}`, {
+    const response = await authFetch(`${API_BASE}/tickets/user/${currentUser.id_usuario}`, {
       headers: { Authorization: `Bearer ${authToken}` },
     })
     const tickets = await response.json()